@@ -0,0 +1,160 @@
+# fake_bot_api.py
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 8442684870, 'is_bot': True, 'first_name': 'Helper Pro', 'username': 'helper_pro_bot'}
+
+@dataclass
+class ApiCall:
+    """Запись одного вызова Bot API"""
+    method: str
+    chat_id: Optional[int]
+    timestamp: float
+    text: str = ''
+    rate_limited: bool = False
+
+class FakeBotAPI:
+    """Локальная замена Bot API: записывает вызовы и применяет лимиты Telegram"""
+
+    # Методы, которые считаются отправкой сообщения в чат
+    SEND_METHODS = ('sendmessage', 'sendphoto', 'senddocument', 'copymessage', 'forwardmessage')
+
+    def __init__(self, global_rate: int = 30, per_chat_rate: int = 1, latency: float = 0.03,
+                 jitter: float = 0.05):
+        self.global_rate = global_rate
+        self.per_chat_rate = per_chat_rate
+        self.jitter = jitter  # Допуск на сетевой разброс времени прихода запросов
+        self.latency = latency  # Имитация сетевой задержки Telegram
+        self.calls: List[ApiCall] = []
+        self._message_ids = itertools.count(1000)
+        self._global_window: Deque[float] = deque()
+        self._chat_windows: Dict[int, Deque[float]] = defaultdict(deque)
+
+    def _is_rate_limited(self, method: str, chat_id: Optional[int], now: float) -> bool:
+        """Скользящее окно в 1 секунду: глобально и на чат для отправок"""
+        window = self._global_window
+        while window and now - window[0] >= 1 - self.jitter:
+            window.popleft()
+        if len(window) >= self.global_rate:
+            return True
+
+        if chat_id is not None and method in self.SEND_METHODS:
+            chat_window = self._chat_windows[chat_id]
+            while chat_window and now - chat_window[0] >= 1 - self.jitter:
+                chat_window.popleft()
+            if len(chat_window) >= self.per_chat_rate:
+                return True
+            chat_window.append(now)
+
+        window.append(now)
+        return False
+
+    def _message(self, chat_id: int, text: str, message_id: Optional[int] = None) -> dict:
+        return {
+            'message_id': message_id or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': text,
+        }
+
+    def _result(self, method: str, params: dict):
+        chat_id = params.get('chat_id')
+        if method in ('sendmessage', 'copymessage', 'forwardmessage'):
+            return self._message(chat_id, params.get('text', ''))
+        if method == 'editmessagetext':
+            return self._message(chat_id, params.get('text', ''), int(params['message_id']))
+        if method == 'getme':
+            return BOT_USER
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        chat_id = params.get('chat_id')
+        chat_id = int(chat_id) if chat_id not in (None, '') else None
+        now = time.monotonic()
+        call = ApiCall(method, chat_id, time.time(), str(params.get('text', '')))
+        self.calls.append(call)
+
+        await asyncio.sleep(self.latency)
+        if self._is_rate_limited(method, chat_id, now):
+            call.rate_limited = True
+            return web.json_response({
+                'ok': False, 'error_code': 429,
+                'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1},
+            })
+
+        if 'chat_id' in params:
+            params['chat_id'] = chat_id
+        return web.json_response({'ok': True, 'result': self._result(method, params)})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+    def calls_by_chat(self) -> Dict[int, List[ApiCall]]:
+        grouped: Dict[int, List[ApiCall]] = defaultdict(list)
+        for call in self.calls:
+            if call.chat_id is not None:
+                grouped[call.chat_id].append(call)
+        return grouped
+
+class FakeBotAPIServer:
+    """Запуск FakeBotAPI в отдельном потоке со своим event loop"""
+
+    def __init__(self, api: FakeBotAPI, host: str = '127.0.0.1', port: int = 8899):
+        self.api = api
+        self.host = host
+        self.port = port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=10)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.api.app())
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, self.host, self.port).start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop)
+        future.result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    server_api = FakeBotAPI()
+    web.run_app(server_api.app(), host='127.0.0.1', port=8899)
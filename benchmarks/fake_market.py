@@ -0,0 +1,45 @@
+# fake_market.py
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+@dataclass
+class FakeAnalysis:
+    """Ответ в формате TradingView TA_Handler.get_analysis()"""
+    symbol: str
+    indicators: Dict[str, float] = field(default_factory=dict)
+
+class FakeMarketData:
+    """Провайдер котировок без сети: чередует маленькую и большую свечу разного цвета,
+    чтобы каждая вторая свеча давала ордерблок"""
+
+    def __init__(self, latency: float = 0.05, seed: int = 1):
+        self.latency = latency  # Имитация времени ответа TradingView
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._step: Dict[str, int] = {}
+
+    async def get_price(self, symbol: str, max_age: Optional[float] = None) -> FakeAnalysis:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+
+        step = self._step.get(symbol, 0)
+        self._step[symbol] = step + 1
+        base = 100.0 + self.random.uniform(-1, 1)
+        if step % 2 == 0:
+            open_, close = base + 0.5, base  # Маленькая красная
+        else:
+            open_, close = base, base + 2.0  # Большая зеленая
+
+        return FakeAnalysis(symbol, {
+            'open': open_,
+            'high': max(open_, close) + 0.2,
+            'low': min(open_, close) - 0.2,
+            'close': close,
+            'volume': 1000.0,
+        })
+
+    async def get_bar(self, symbol: str, timeframe: str) -> Dict[str, float]:
+        """Закрытый бар - та же синтетическая свеча"""
+        return (await self.get_price(symbol)).indicators
@@ -0,0 +1,322 @@
+# load_test.py
+"""Нагрузочный тест: синтетические пользователи проходят сценарии через настоящие роутеры,
+Bot API заменен локальным FakeBotAPI, котировки - FakeMarketData.
+
+Запуск: python -m benchmarks.load_test --users 1000
+"""
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import pytz
+
+from benchmarks.fake_bot_api import BOT_USER, FakeBotAPI, FakeBotAPIServer
+from benchmarks.fake_market import FakeMarketData
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# Сценарии пользователей: (тип апдейта, данные)
+FLOWS = {
+    'start': [('message', '/start'), ('callback', 'go')],
+    'settings': [('callback', 'settings'), ('callback', 'MSK'), ('callback', '1h')],
+    'calculate': [
+        ('message', '/calculate'), ('callback', 'long'),
+        ('message', '1000'), ('message', '100'), ('message', '95'),
+        ('message', '2'), ('message', '1'),
+    ],
+    'trade': [('message', '/trade'), ('wait', None), ('message', '/stop')],
+}
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Сводка по выборке в миллисекундах"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) * 1000,
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': ordered[-1] * 1000,
+    }
+
+class FastCandleClock:
+    """Свечи закрываются каждые period секунд вместо реального таймфрейма"""
+
+    def __init__(self, period: float):
+        self.period = period
+
+    async def get_time_to_candle_close(self, timeframe: str):
+        now = time.time() + 0.01
+        close = (now // self.period + 1) * self.period
+        return close - now, datetime.datetime.fromtimestamp(close, pytz.UTC)
+
+    def last_close_before(self, timestamp: float) -> float:
+        return (timestamp // self.period) * self.period
+
+class SimulatedUser:
+    """Пользователь, отправляющий апдейты в диспетчер"""
+
+    _update_ids = iter(range(1, 10 ** 9))
+
+    def __init__(self, user_id: int, dp, bot, latencies: Dict[str, List[float]],
+                 errors: Dict[str, int]):
+        self.user_id = user_id
+        self.dp = dp
+        self.bot = bot
+        self.latencies = latencies
+        self.errors = errors
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+        self.chat = {'id': user_id, 'type': 'private'}
+        self._message_id = 1
+
+    def _next_message(self, text: str, from_user: Optional[dict] = None) -> dict:
+        self._message_id += 1
+        return {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': self.chat,
+            'from': from_user or self.user,
+            'text': text,
+        }
+
+    def _update(self, kind: str, payload: str) -> dict:
+        update = {'update_id': next(self._update_ids)}
+        if kind == 'message':
+            update['message'] = self._next_message(payload)
+        else:
+            update['callback_query'] = {
+                'id': str(update['update_id']),
+                'from': self.user,
+                'chat_instance': str(self.user_id),
+                'data': payload,
+                'message': self._next_message('nav', BOT_USER),
+            }
+        return update
+
+    @staticmethod
+    def step_name(kind: str, payload: str) -> str:
+        if kind == 'callback':
+            return f'cb:{payload}'
+        return payload if payload.startswith('/') else 'text'
+
+    async def run(self, steps, trade_wait: float):
+        from aiogram.types import Update
+
+        for kind, payload in steps:
+            if kind == 'wait':
+                await asyncio.sleep(trade_wait)
+                continue
+            update = Update.model_validate(self._update(kind, payload), context={'bot': self.bot})
+            step = self.step_name(kind, payload)
+            started = time.perf_counter()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                # В polling aiogram только логирует ошибку обработчика, пользователь продолжает
+                self.errors[f'{step}: {type(e).__name__}'] += 1
+            self.latencies[step].append(time.perf_counter() - started)
+
+async def run_load(users: int, flows: List[str], ramp: float, candle_period: float,
+                   candles: int, api: FakeBotAPI) -> dict:
+    from run_bot import create_dispatcher
+    from config import bot
+    from services.analysis_service import analysis_service
+    from services.time_utils import time_service, timeframe_manager
+    from services.loop_monitor import LoopMonitor
+
+    market = FakeMarketData()
+    clock = FastCandleClock(candle_period)
+    analysis_service.fetch_price = market.get_price
+    analysis_service.fetch_bar = market.get_bar
+    time_service.get_time_to_candle_close = clock.get_time_to_candle_close
+
+    async def no_sync():
+        return None
+    time_service.sync_binance_time = no_sync
+    timeframe_manager.set_timeframe('5m')
+
+    dp = create_dispatcher()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    flow_users: Dict[str, List[int]] = defaultdict(list)
+    trade_wait = candle_period * candles + 0.5
+    rng = random.Random(7)
+
+    async def user_task(index: int):
+        flow = flows[index % len(flows)]
+        user_id = 100000 + index
+        flow_users[flow].append(user_id)
+        await asyncio.sleep(rng.uniform(0, ramp))
+        await SimulatedUser(user_id, dp, bot, latencies, errors).run(FLOWS[flow], trade_wait)
+
+    monitor = LoopMonitor(interval=0.05, threshold=0.25, window=10 ** 6)
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(user_task(index) for index in range(users)))
+    # Даем фоновым удалениям и отправкам завершиться
+    await asyncio.sleep(2)
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    await bot.session.close()
+
+    calls_by_chat = api.calls_by_chat()
+    api_calls = {}
+    for flow, user_ids in flow_users.items():
+        flow_calls = [call for user_id in user_ids for call in calls_by_chat.get(user_id, [])]
+        methods: Dict[str, int] = defaultdict(int)
+        for call in flow_calls:
+            methods[call.method] += 1
+        api_calls[flow] = {
+            'per_flow': len(flow_calls) / len(user_ids),
+            'methods': {method: count / len(user_ids) for method, count in sorted(methods.items())},
+        }
+
+    close_to_signal = [
+        call.timestamp - clock.last_close_before(call.timestamp)
+        for call in api.calls
+        if call.method == 'sendmessage' and 'ордерблок' in call.text and not call.rate_limited
+    ]
+
+    return {
+        'params': {'users': users, 'flows': flows, 'ramp': ramp,
+                   'candle_period': candle_period, 'candles': candles},
+        'elapsed_s': elapsed,
+        'handler_latency_ms': {step: percentiles(values) for step, values in sorted(latencies.items())},
+        'api_calls': api_calls,
+        'api_calls_total': len(api.calls),
+        'rate_limited_total': sum(1 for call in api.calls if call.rate_limited),
+        'handler_errors': dict(errors),
+        'close_to_signal_ms': percentiles(close_to_signal),
+        'provider_requests': market.requests,
+        'loop_lag_ms': percentiles(list(monitor.lags)),
+        'slow_callbacks': len(monitor.samples),
+    }
+
+def save_results(results: dict, name: str = 'load') -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(RESULTS_DIR, f'{name}_{stamp}.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    return path
+
+def previous_results(name: str = 'load', exclude: Optional[str] = None) -> Optional[dict]:
+    paths = sorted(path for path in glob.glob(os.path.join(RESULTS_DIR, f'{name}_*.json')) if path != exclude)
+    if not paths:
+        return None
+    with open(paths[-1], encoding='utf-8') as file:
+        return json.load(file)
+
+def compare(current: dict, previous: dict, threshold: float = 0.2) -> List[str]:
+    """Список регрессий p95 больше threshold относительно прошлого прогона"""
+    regressions = []
+    sections = [('handler_latency_ms', current['handler_latency_ms'], previous.get('handler_latency_ms', {}))]
+    sections.append(('close_to_signal_ms', {'all': current['close_to_signal_ms']},
+                     {'all': previous.get('close_to_signal_ms', {})}))
+    sections.append(('loop_lag_ms', {'all': current.get('loop_lag_ms', {})},
+                     {'all': previous.get('loop_lag_ms', {})}))
+    for section, now_stats, old_stats in sections:
+        for key, stats in now_stats.items():
+            old = old_stats.get(key, {})
+            if 'p95' in stats and old.get('p95'):
+                change = stats['p95'] / old['p95'] - 1
+                if change > threshold:
+                    regressions.append(f"{section}[{key}] p95 {old['p95']:.1f} → {stats['p95']:.1f} мс (+{change:.0%})")
+    for flow, stats in current['api_calls'].items():
+        old = previous.get('api_calls', {}).get(flow)
+        if old and stats['per_flow'] > old['per_flow'] * (1 + threshold):
+            regressions.append(f"api_calls[{flow}] {old['per_flow']:.1f} → {stats['per_flow']:.1f}")
+    return regressions
+
+def compare_stages(current: dict, previous: dict, threshold: float = 0.2) -> List[str]:
+    """Регрессии реплея: рост p95 стадий и падение пропускной способности"""
+    regressions = []
+    old_stages = previous.get('stage_latency_ms', {})
+    for stage, stats in current['stage_latency_ms'].items():
+        old = old_stages.get(stage, {})
+        if 'p95' in stats and old.get('p95'):
+            change = stats['p95'] / old['p95'] - 1
+            if change > threshold:
+                regressions.append(f"stage_latency_ms[{stage}] p95 {old['p95']:.2f} → {stats['p95']:.2f} мс (+{change:.0%})")
+    old_rate = previous.get('candles_per_s')
+    if old_rate and current['candles_per_s'] < old_rate * (1 - threshold):
+        regressions.append(f"candles_per_s {old_rate:.0f} → {current['candles_per_s']:.0f}")
+    return regressions
+
+def print_report(results: dict):
+    print(f"Пользователей: {results['params']['users']}, время: {results['elapsed_s']:.1f} с")
+    print("Задержка обработчиков (мс):")
+    for step, stats in results['handler_latency_ms'].items():
+        print(f"  {step:<14} n={stats['count']:<6} p50={stats['p50']:.1f} p95={stats['p95']:.1f} p99={stats['p99']:.1f}")
+    print("Вызовы API на сценарий:")
+    for flow, stats in results['api_calls'].items():
+        print(f"  {flow:<10} {stats['per_flow']:.1f}  {stats['methods']}")
+    print(f"Ответов 429: {results['rate_limited_total']} из {results['api_calls_total']}")
+    for error, count in results['handler_errors'].items():
+        print(f"Ошибка обработчика {error}: {count}")
+    lag = results['loop_lag_ms']
+    if lag['count']:
+        print(f"Задержка event loop (мс): p50={lag['p50']:.1f} p95={lag['p95']:.1f} p99={lag['p99']:.1f} max={lag['max']:.1f}, "
+              f"блокировок: {results['slow_callbacks']}")
+    signal = results['close_to_signal_ms']
+    if signal['count']:
+        print(f"Закрытие → сигнал (мс): n={signal['count']} p50={signal['p50']:.1f} p95={signal['p95']:.1f} p99={signal['p99']:.1f}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальном Bot API")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--flows', default=','.join(FLOWS))
+    parser.add_argument('--ramp', type=float, default=5.0, help="Разброс старта пользователей, с")
+    parser.add_argument('--candle-period', type=float, default=3.0)
+    parser.add_argument('--candles', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8899)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    api = FakeBotAPI()
+    server = FakeBotAPIServer(api, port=args.port)
+    server.start()
+    # config читает адрес Bot API при импорте
+    os.environ['BOT_API_URL'] = server.url
+
+    try:
+        results = asyncio.run(run_load(
+            args.users, args.flows.split(','), args.ramp,
+            args.candle_period, args.candles, api,
+        ))
+    finally:
+        server.stop()
+
+    print_report(results)
+    path = save_results(results)
+    previous = previous_results(exclude=path)
+    print(f"Результаты: {path}")
+    if previous:
+        regressions = compare(results, previous, args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ: {line}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+# replay.py
+"""Ускоренный реплей записанных свечей через настоящий конвейер
+analyze_group: получение → поиск ордерблока → доставка, на виртуальных часах.
+
+Запуск: python -m benchmarks.replay data/BTCUSDT_5m.csv --timeframe 5m
+        python -m benchmarks.replay --generate 2000 --timeframe 1d
+        python -m benchmarks.replay --store data/candles --symbols BTCUSDT --timeframe 1h
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from benchmarks.fake_market import FakeAnalysis
+from benchmarks.load_test import percentiles, previous_results, save_results, compare_stages
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RecordedCandle:
+    """Строка записанного потока OHLCV (timestamp - открытие свечи, мс)"""
+    timestamp: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+def load_ohlcv(path: str) -> List[RecordedCandle]:
+    """CSV с колонками timestamp,open,high,low,close,volume"""
+    with open(path, encoding='utf-8') as file:
+        return [
+            RecordedCandle(int(row['timestamp']), float(row['open']), float(row['high']),
+                           float(row['low']), float(row['close']), float(row['volume']))
+            for row in csv.DictReader(file)
+        ]
+
+def generate_ohlcv(count: int, period_minutes: int, start: int = 1735689600, seed: int = 1) -> List[RecordedCandle]:
+    """Синтетический поток со случайным блужданием (start - 2025-01-01 UTC)"""
+    rng = random.Random(seed)
+    candles, price = [], 100.0
+    for index in range(count):
+        open_ = price
+        close = max(1.0, open_ + rng.gauss(0, 1) * rng.choice((0.2, 1.0, 2.5)))
+        candles.append(RecordedCandle(
+            (start + index * period_minutes * 60) * 1000, open_,
+            max(open_, close) + abs(rng.gauss(0, 0.3)),
+            min(open_, close) - abs(rng.gauss(0, 0.3)),
+            close, rng.uniform(100, 1000),
+        ))
+        price = close
+    return candles
+
+def load_store(root: str, symbols: List[str], timeframe: str) -> Dict[str, List[RecordedCandle]]:
+    """Потоки из локального хранилища свечей (без запросов к провайдеру)"""
+    from services.candle_store import CandleStore
+
+    store = CandleStore()
+    store.open(root, writable=False)
+    try:
+        return {symbol: [RecordedCandle(int(r['timestamp']), float(r['open']), float(r['high']),
+                                        float(r['low']), float(r['close']), float(r['volume']))
+                         for r in store.range(symbol, timeframe)]
+                for symbol in symbols}
+    finally:
+        store.close()
+
+def save_ohlcv(path: str, candles: List[RecordedCandle]):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        for candle in candles:
+            writer.writerow([candle.timestamp, candle.open, candle.high, candle.low, candle.close, candle.volume])
+
+class ReplayProvider:
+    """Провайдер котировок: отдает свечу, закрывшуюся к текущему виртуальному времени"""
+
+    def __init__(self, streams: Dict[str, List[RecordedCandle]], period_seconds: int, clock, timer):
+        self.period_ms = period_seconds * 1000
+        self.clock = clock
+        self.timer = timer
+        self.by_close: Dict[str, Dict[int, RecordedCandle]] = {
+            symbol: {candle.timestamp + self.period_ms: candle for candle in candles}
+            for symbol, candles in streams.items()
+        }
+        self.served = 0
+
+    async def get_price(self, symbol: str, max_age: Optional[float] = None) -> Optional[FakeAnalysis]:
+        started = time.perf_counter()
+        close_ms = int(self.clock.time() * 1000) // self.period_ms * self.period_ms
+        candle = self.by_close.get(symbol, {}).get(close_ms)
+        await asyncio.sleep(0)
+        self.timer.record('ingest', time.perf_counter() - started)
+        if candle is None:
+            return None
+        self.served += 1
+        return FakeAnalysis(symbol, {
+            'open': candle.open, 'high': candle.high, 'low': candle.low,
+            'close': candle.close, 'volume': candle.volume,
+        })
+
+    async def get_bar(self, symbol: str, timeframe: str) -> Optional[Dict[str, float]]:
+        data = await self.get_price(symbol)
+        return data.indicators if data else None
+
+class StageTimer:
+    """Реальное время по стадиям и задержка от закрытия свечи до доставки"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.close_real: Dict[float, float] = {}  # Виртуальное закрытие → реальный момент
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def on_advance(self, virtual_now: float):
+        self.close_real.setdefault(virtual_now, time.perf_counter())
+
+class ReplayEngine:
+    """Прогон записанных потоков через analysis_service на VirtualClock"""
+
+    def __init__(self, streams: Dict[str, List[RecordedCandle]], timeframe: str, deliver_to: int = 1):
+        from services.analysis_service import analysis_service
+        from services.clock import VirtualClock
+        from services.instrument_registry import instrument_registry
+        from services.time_utils import time_service
+        from services.tracing import pipeline_tracer
+
+        unknown = [symbol for symbol in streams if symbol not in instrument_registry]
+        if unknown:
+            raise ValueError(f"Символов нет в базе инструментов: {sorted(unknown)}")
+
+        self.streams = streams
+        self.timeframe = timeframe
+        self.deliver_to = deliver_to
+        self.analysis = analysis_service
+        self.time_service = time_service
+        self.tracer = pipeline_tracer
+        self.period = time_service.timeframe_minutes[timeframe] * 60
+
+        first_open = min(candles[0].timestamp for candles in streams.values()) // 1000
+        last_close = max(candles[-1].timestamp for candles in streams.values()) // 1000 + self.period
+        # Старт за миг до закрытия первой свечи, чтобы конвейер сразу уснул до него
+        self.start = first_open + self.period - 1
+        # Конец за миг до следующего закрытия: успевает доставка после последнего сигнала
+        self.end = last_close + self.period - 1
+        self.clock = VirtualClock(self.start)
+        self.timer = StageTimer()
+        self.clock.on_advance = self.timer.on_advance
+        self.provider = ReplayProvider(streams, self.period, self.clock, self.timer)
+        self.signals = 0
+
+    def _instrument(self):
+        """Оборачивает стадии поиска и доставки замерами времени"""
+        analysis, timer, clock, period = self.analysis, self.timer, self.clock, self.period
+        detect = analysis.analyze_order_block
+        deliver = analysis.safe_send_message
+
+        def timed_detect(prev_candle, current_candle, min_body=None):
+            started = time.perf_counter()
+            signal = detect(prev_candle, current_candle, min_body)
+            timer.record('detect', time.perf_counter() - started)
+            return signal
+
+        async def timed_deliver(chat_id, text, parse_mode=None, **trace):
+            close = clock.time() // period * period
+            started = time.perf_counter()
+            ok = await deliver(chat_id, text, parse_mode, **trace)
+            finished = time.perf_counter()
+            timer.record('deliver', finished - started)
+            if close in timer.close_real:
+                timer.record('close_to_delivered', finished - timer.close_real[close])
+            self.signals += 1
+            return ok
+
+        analysis.analyze_order_block = timed_detect
+        analysis.safe_send_message = timed_deliver
+
+    async def run(self) -> dict:
+        analysis = self.analysis
+        previous_clock = self.time_service.clock
+        self._instrument()
+
+        self.time_service.set_clock(self.clock)
+        self.tracer.reset()
+        analysis.fetch_price = self.provider.get_price
+        analysis.fetch_bar = self.provider.get_bar
+
+        users = {symbol: self.deliver_to + index for index, symbol in enumerate(self.streams)}
+        tasks = []
+        for symbol, user_id in users.items():
+            analysis.active_analyses[user_id] = True
+            tasks.extend(analysis.subscribe(user_id, [symbol], self.timeframe))
+
+        started = time.perf_counter()
+        try:
+            await self.clock.run(tasks, self.end)
+        finally:
+            elapsed = time.perf_counter() - started
+            for user_id in users.values():
+                analysis.stop_analysis(user_id)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for user_id in users.values():
+                await analysis.cleanup_user_analysis(user_id)
+            # Убираем обертки экземпляра, возвращая методы класса
+            del analysis.analyze_order_block
+            del analysis.safe_send_message
+            del analysis.fetch_price
+            del analysis.fetch_bar
+            self.time_service.set_clock(previous_clock)
+
+        virtual = self.clock.now - self.start
+        return {
+            'params': {'timeframe': self.timeframe, 'symbols': list(self.streams),
+                       'candles': sum(len(candles) for candles in self.streams.values())},
+            'elapsed_s': elapsed,
+            'virtual_s': virtual,
+            'speedup': virtual / elapsed if elapsed else 0.0,
+            'candles_per_s': self.provider.served / elapsed if elapsed else 0.0,
+            'signals': self.signals,
+            'stage_latency_ms': {stage: percentiles(values) for stage, values in sorted(self.timer.samples.items())},
+            # Гистограммы самого сервиса (секунды, close_to_delivered - в виртуальном времени)
+            'pipeline': self.tracer.summary(),
+        }
+
+def print_report(results: dict):
+    print(f"Реплей {results['params']['timeframe']}: {results['params']['candles']} свечей, "
+          f"{results['elapsed_s']:.2f} с реального времени, ускорение x{results['speedup']:.0f}")
+    print(f"Пропускная способность: {results['candles_per_s']:.0f} свечей/с, сигналов: {results['signals']}")
+    for stage, stats in results['stage_latency_ms'].items():
+        if stats['count']:
+            print(f"  {stage:<20} n={stats['count']:<6} p50={stats['p50']:.2f} p95={stats['p95']:.2f} p99={stats['p99']:.2f} мс")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Реплей свечей на виртуальных часах")
+    parser.add_argument('files', nargs='*', help="CSV по символам, имя файла: SYMBOL_*.csv")
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--generate', type=int, default=0, help="Сгенерировать N свечей на символ")
+    parser.add_argument('--symbols', default='BTCUSDT,ETHUSDT')
+    parser.add_argument('--store', help="Каталог хранилища свечей вместо CSV")
+    parser.add_argument('--port', type=int, default=8898)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    from benchmarks.fake_bot_api import FakeBotAPI, FakeBotAPIServer
+    server = FakeBotAPIServer(FakeBotAPI(global_rate=10 ** 6, per_chat_rate=10 ** 6, latency=0.0), port=args.port)
+    server.start()
+    os.environ['BOT_API_URL'] = server.url
+
+    from services.time_utils import time_service
+    minutes = time_service.timeframe_minutes[args.timeframe]
+    if args.generate:
+        streams = {symbol: generate_ohlcv(args.generate, minutes, seed=index)
+                   for index, symbol in enumerate(args.symbols.split(','))}
+    elif args.store:
+        streams = load_store(args.store, args.symbols.split(','), args.timeframe)
+    else:
+        streams = {os.path.basename(path).split('_')[0]: load_ohlcv(path) for path in args.files}
+
+    async def run():
+        from config import bot
+        try:
+            return await ReplayEngine(streams, args.timeframe).run()
+        finally:
+            await bot.session.close()
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.stop()
+
+    print_report(results)
+    path = save_results(results, 'replay')
+    print(f"Результаты: {path}")
+    previous = previous_results('replay', exclude=path)
+    if previous:
+        regressions = compare_stages(results, previous, args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ: {line}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
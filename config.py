@@ -1,15 +1,80 @@
 import os
 from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
 
 # Конфигурация из переменных окружения
 #TOKEN = '8213569469:AAExbtP6wQaKky-4Y4TQ9E807j184QSH6hY' #бэк Тест
 TOKEN = '8442684870:AAEwtD81q4QbQSL5D7fnGUYY7wiOkODAHGM' # Основной
 
-# Инициализация бота и хранилища
-bot = Bot(token=TOKEN)
-storage = MemoryStorage()
+# Режим вебхука (если WEBHOOK_URL не задан - используется polling)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+# Воркер N получает пользователей с user_id % WEBHOOK_WORKERS == N. Снимок шарда - SNAPSHOT_PATH.N-of-WORKERS,
+# поэтому после смены числа воркеров старые снимки не загружаются (предупреждение в логе, анализы нужно
+# запустить заново). Журнал сигналов - SIGNAL_JOURNAL_PATH.N, выгрузка читает все файлы журналов
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+
+# Альтернативный адрес Bot API (локальный сервер или бенчмарк)
+BOT_API_URL = os.getenv('BOT_API_URL')
+
+# Замеры стадий конвейера сигнала (дешевые, по умолчанию включены)
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '1') != '0'
+
+# Локальный эндпоинт метрик Prometheus (0 - выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+
+# Блокировка event loop дольше порога (с) логируется со стеком
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '0.25'))
+
+# Глубина стека tracemalloc для /debug/memory (0 - выключен, дорого в продакшене)
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', '0'))
+
+# SQLite с состоянием пользователей (пустая строка - только память)
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'data/state.db')
+
+# Снимок анализов и кэшей для теплого перезапуска (пустая строка - выключен)
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'data/snapshot.bin')
+
+# Тело свечи-импульса должно быть выше этого перцентиля тел по символу и таймфрейму (0 - выключено)
+ORDER_BLOCK_BODY_PERCENTILE = float(os.getenv('ORDER_BLOCK_BODY_PERCENTILE', '0'))
 
-# Глобальные состояния
-subscribed_users = set()
-running_analyses = {}
+# Опрос формирующейся свечи для ранних предупреждений, сек (на символ, общий для всех)
+EARLY_WARNING_INTERVAL = float(os.getenv('EARLY_WARNING_INTERVAL', '60'))
+
+# Каталог локальной истории свечей, файл на символ и таймфрейм (пустая строка - выключена)
+CANDLE_STORE_PATH = os.getenv('CANDLE_STORE_PATH', 'data/candles')
+
+# Журнал отправленных сигналов, строка JSON на сигнал (пустая строка - выключен)
+SIGNAL_JOURNAL_PATH = os.getenv('SIGNAL_JOURNAL_PATH', 'data/signals.jsonl')
+
+# Тейк для оценки исхода сигналов в долях риска (стоп - за зоной ордерблока)
+SIGNAL_OUTCOME_RR = float(os.getenv('SIGNAL_OUTCOME_RR', '2'))
+
+# Сигнал без исхода дольше стольких свечей своего таймфрейма закрывается как expired
+SIGNAL_EXPIRY_BARS = int(os.getenv('SIGNAL_EXPIRY_BARS', '500'))
+
+# База инструментов: CSV с провайдером, биржей, шагом цены и лота, минимальной суммой
+INSTRUMENTS_PATH = os.getenv('INSTRUMENTS_PATH', os.path.join(os.path.dirname(__file__), 'instruments.csv'))
+
+# Информационно-статистический сервер Московской биржи (ISS)
+MOEX_ISS_URL = os.getenv('MOEX_ISS_URL', 'https://iss.moex.com/iss')
+
+# Общее хранилище FSM для нескольких процессов
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Инициализация бота и хранилища
+if BOT_API_URL:
+    bot = Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_URL)))
+else:
+    bot = Bot(token=TOKEN)
+if REDIS_URL:
+    from aiogram.fsm.storage.redis import RedisStorage
+    storage = RedisStorage.from_url(REDIS_URL)
+else:
+    storage = MemoryStorage()
@@ -62,7 +62,7 @@ async def handle_timeframe_selection(callback: CallbackQuery, timeframe: str):
         state_service.set_navigation_id(user_id, callback.message.message_id)
         
         await time_service.sync_binance_time()
-        timeframe_manager.set_timeframe(timeframe)
+        timeframe_manager.set_timeframe(timeframe, user_id)
         
         await callback.answer(f"Синхронизировано с Binance", show_alert=True)
         
@@ -80,9 +80,9 @@ async def handle_timeframe_selection(callback: CallbackQuery, timeframe: str):
 @time_router.callback_query(F.data == "progress")
 async def handle_progress_callback(callback: CallbackQuery):
     """Обработка нажатия на кнопку прогресса"""
-    user_id = callback.message.from_user.id
+    user_id = callback.from_user.id
 
-    get_timeframe = timeframe_manager.get_timeframe()
+    get_timeframe = timeframe_manager.get_timeframe(user_id)
     timeframe = get_timeframe  # или timeframe_manager.get_timeframe_text(get_timeframe) если функция существует
     current_time = time_service.get_binance_time()
     user_timezone = timezone_service.get_user_timezone(user_id)
@@ -41,15 +41,8 @@ async def handle_direction_selection(callback: CallbackQuery):
             state_service.user_calculation_data[user_id] = {}
         state_service.user_calculation_data[user_id]['direction'] = direction
         
-        state_service.user_states[user_id] = {'waiting_for': 'balance'}
-        
-        await edit_navigation_message(
-            user_id,
-            f"📊 *Расчет позиции - {direction.upper()}*\n\n"
-            f"Введите ваш баланс в USDT:",
-            keyboards.cancel_keyboard(),
-            "Markdown"
-        )
+        from handlers.message_handlers import ask_symbol
+        await ask_symbol(user_id, direction)
         
     except Exception as e:
         logger.error(f"Error in direction selection: {e}")
@@ -101,15 +94,15 @@ async def handle_trade_details(callback: CallbackQuery):
             f"• Риск/Прибыль: 1:{trade.risk_reward_ratio}\n"
             f"• Риск на сделку: {trade.risk_percent*100:.1f}% (${trade.risk_money:.2f})\n\n"
             f"*ПАРАМЕТРЫ ПОЗИЦИИ:*\n"
-            f"• Идеальный объем: {trade_calculator.format_volume(trade.volume)}\n"
-            f"• Фактический объем: {trade_calculator.format_volume(trade.adjusted_volume)}\n"
+            f"• Идеальный объем: {trade_calculator.format_volume(trade.volume, user_data.get('symbol'))}\n"
+            f"• Фактический объем: {trade_calculator.format_volume(trade.adjusted_volume, user_data.get('symbol'))}\n"
             f"• Стоимость позиции: ${trade.position_value:.2f}\n"
             f"• Плечо: x{trade_calculator.format_leverage(trade.adjusted_leverage)}\n"
             f"• Дистанция риска: {trade.risk_distance_percent:.2f}%\n\n"
             f"*ПОТЕНЦИАЛ:*\n"
             f"• Потенциальный убыток: ${trade.potential_loss:.2f}\n"
             f"• Потенциальная прибыль: ${trade.potential_profit:.2f}\n\n"
-            f"*ВНИМАНИЕ:* Объем округлен до 4 знаков после запятой"
+            f"*ВНИМАНИЕ:* Объем округлен до шага лота инструмента (без инструмента - до 4 знаков)"
         )
         
         await edit_navigation_message(
@@ -144,7 +137,7 @@ async def handle_trade_brief(callback: CallbackQuery):
             f"• Стоп-лосс: ${trade.stop_loss:.2f}\n"
             f"• Тейк-профит: ${trade.take_profit:.2f}\n\n"
             f"*РЕКОМЕНДАЦИЯ:*\n"
-            f"• Объем: {trade_calculator.format_volume(trade.volume)}\n"
+            f"• Объем: {trade_calculator.format_volume(trade.volume, user_data.get('symbol'))}\n"
             f"• Плечо: x{trade.required_leverage:.2f}\n"
             f"• Риск: ${trade.risk_money:.2f} ({trade.risk_percent*100:.1f}%)\n\n"
             f"Потенциальная прибыль: ${trade.potential_profit:.2f}"
@@ -161,6 +154,31 @@ async def handle_trade_brief(callback: CallbackQuery):
         logger.error(f"Error showing trade brief: {e}")
         await callback.answer("Произошла ошибка")
 
+@trade_router.callback_query(F.data == "trade_grid")
+async def handle_trade_grid(callback: CallbackQuery):
+    """Сетка объемов и прибыли по стопам и RR одним сообщением"""
+    try:
+        user_id = callback.from_user.id
+        
+        user_data = state_service.user_calculation_data.get(user_id, {})
+        if 'result' not in user_data:
+            await callback.answer("Данные не найдены", show_alert=True)
+            return
+        
+        grid = trade_calculator.sizing_grid(user_data)
+        await edit_navigation_message(
+            user_id,
+            f"*СЕТКА ПОЗИЦИИ* ({user_data['direction'].upper()}, вход ${user_data['entry_price']:.2f})\n"
+            f"Стопы от 0.5 до 2 введенных дистанций, в колонках - тейк-профит для RR\n\n"
+            f"```\n{grid}\n```",
+            keyboards.back_to_trade_keyboard(),
+            "Markdown"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error showing trade grid: {e}")
+        await callback.answer("Произошла ошибка")
+
 @trade_router.callback_query(F.data == "new_trade")
 async def handle_new_trade(callback: CallbackQuery):
     """Начать новый расчет"""
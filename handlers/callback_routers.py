@@ -128,7 +128,7 @@ async def handle_timeframe_selection(callback: CallbackQuery, timeframe: str):
 
         from services.time_utils import time_service, timeframe_manager
         await time_service.sync_binance_time()
-        timeframe_manager.set_timeframe(timeframe)
+        timeframe_manager.set_timeframe(timeframe, user_id)
 
         await callback.answer(f"Синхронизировано с Binance", show_alert=True)
 
@@ -146,11 +146,11 @@ async def handle_timeframe_selection(callback: CallbackQuery, timeframe: str):
 @callback_router.callback_query(F.data == "progress")
 async def handle_progress_callback(callback: CallbackQuery):
     from services.time_utils import timezone_service, time_service, timeframe_manager
-    user_id = callback.message.from_user.id
+    user_id = callback.from_user.id
 
     """Обработка нажатия на кнопку прогресса"""
 
-    get_timeframe = timeframe_manager.get_timeframe()
+    get_timeframe = timeframe_manager.get_timeframe(user_id)
     timeframe = timeframe_manager.get_timeframe_text(get_timeframe)
     current_time = time_service.get_binance_time()
     user_timezone = timezone_service.get_user_timezone(user_id)
@@ -198,16 +198,9 @@ async def handle_direction_selection(callback: CallbackQuery):
             state_service.user_calculation_data[user_id] = {}
         state_service.user_calculation_data[user_id]['direction'] = direction
 
-        # Устанавливаем состояние ожидания ввода баланса
-        state_service.user_states[user_id] = {'waiting_for': 'balance'}
-
-        await edit_navigation_message(
-            user_id,
-            f"*Расчет позиции - {direction.upper()}*\n\n"
-            f"Введите ваш баланс в USDT:",
-            keyboards.cancel_keyboard(),
-            "Markdown"
-        )
+        # Сначала инструмент: от него зависят шаг лота и минимальная сумма
+        from handlers.message_handlers import ask_symbol
+        await ask_symbol(user_id, direction)
 
     except Exception as e:
         logger.error(f"Error in direction selection: {e}")
@@ -261,7 +254,7 @@ async def handle_trade_details(callback: CallbackQuery):
             f"• Риск/Прибыль: 1:{trade.risk_reward_ratio}\n"
             f"• Риск на сделку: {trade.risk_percent*100:.1f}% (${trade.risk_money:.2f})\n\n"
             f"*ПАРАМЕТРЫ ПОЗИЦИИ:*\n"
-            f"• Объем: {trade_calculator.format_volume(trade.volume)}\n"
+            f"• Объем: {trade_calculator.format_volume(trade.volume, user_data.get('symbol'))}\n"
             f"• Стоимость позиции: ${trade.position_value:.2f}\n"
             f"• Плечо: x{trade.required_leverage:.2f}\n"
             f"• Дистанция риска: {trade.risk_distance_percent:.2f}%\n\n"
@@ -304,7 +297,7 @@ async def handle_trade_brief(callback: CallbackQuery):
             f"• Стоп-лосс: ${trade.stop_loss:.2f}\n"
             f"• Тейк-профит: ${trade.take_profit:.2f}\n\n"
             f"*РЕКОМЕНДАЦИЯ:*\n"
-            f"• Объем: {trade_calculator.format_volume(trade.volume)}\n"
+            f"• Объем: {trade_calculator.format_volume(trade.volume, user_data.get('symbol'))}\n"
             f"• Плечо: x{trade.required_leverage:.2f}\n"
             f"• Риск: ${trade.risk_money:.2f} ({trade.risk_percent*100:.1f}%)\n\n"
             f"Потенциальная прибыль: ${trade.potential_profit:.2f}"
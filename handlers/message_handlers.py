@@ -6,6 +6,8 @@ import logging
 from services.state_service import state_service
 from services.message_utils import edit_navigation_message
 from services.trade_calculator import trade_calculator
+from services.cleanup_service import cleanup_service
+from services.instrument_registry import instrument_registry
 
 import keyboards
 logger = logging.getLogger(__name__)
@@ -27,7 +29,9 @@ async def handle_trade_inputs(message):
     try:
         text = message.text.strip()
         
-        if waiting_for == 'balance':
+        if waiting_for == 'symbol':
+            await _handle_symbol_input(user_id, text)
+        elif waiting_for == 'balance':
             await _handle_balance_input(user_id, text)
         elif waiting_for == 'entry_price':
             await _handle_entry_price_input(user_id, text)
@@ -38,10 +42,7 @@ async def handle_trade_inputs(message):
         elif waiting_for == 'risk_percent':
             await _handle_risk_percent_input(user_id, text)
             
-        try:
-            await message.delete()
-        except:
-            pass
+        cleanup_service.schedule(message.chat.id, [message.message_id])
             
     except ValueError:
         await edit_navigation_message(
@@ -61,6 +62,43 @@ async def handle_trade_inputs(message):
             "Markdown"
         )
 
+async def ask_symbol(user_id: int, direction: str):
+    """Первый шаг калькулятора: инструмент задает шаг лота и минимальную сумму позиции"""
+    state_service.user_states[user_id] = {'waiting_for': 'symbol'}
+    await edit_navigation_message(
+        user_id,
+        f"📊 *Расчет позиции - {direction.upper()}*\n\n"
+        "Введите тикер инструмента (например: BTCUSDT)\n"
+        "или - для расчета без привязки к инструменту:",
+        keyboards.cancel_keyboard(),
+        "Markdown"
+    )
+
+async def _handle_symbol_input(user_id: int, text: str):
+    """Обработка выбора инструмента"""
+    symbol = text.upper()
+    if symbol == '-':
+        state_service.user_calculation_data[user_id].pop('symbol', None)
+    elif symbol in instrument_registry:
+        state_service.user_calculation_data[user_id]['symbol'] = symbol
+    else:
+        await edit_navigation_message(
+            user_id,
+            f"Инструмент {symbol} не найден в базе\n\n"
+            "Введите тикер инструмента или -:",
+            keyboards.cancel_keyboard(),
+            None
+        )
+        return
+
+    await edit_navigation_message(
+        user_id,
+        "Введите ваш баланс в USDT:",
+        keyboards.cancel_keyboard(),
+        "Markdown"
+    )
+    state_service.user_states[user_id] = {'waiting_for': 'balance'}
+
 async def _handle_balance_input(user_id: int, text: str):
     """Обработка ввода баланса"""
     balance = float(text)
@@ -233,7 +271,7 @@ async def calculate_and_show_trade(user_id: int):
             f"• Стоп-лосс: ${trade.stop_loss:.2f}\n"
             f"• Тейк-профит: ${trade.take_profit:.2f}\n\n"
             f"*РЕКОМЕНДАЦИЯ:*\n"
-            f"• Объем: {trade_calculator.format_volume(trade.adjusted_volume)}\n"
+            f"• Объем: {trade_calculator.format_volume(trade.adjusted_volume, user_data.get('symbol'))}\n"
             f"• Плечо: x{trade_calculator.format_leverage(trade.adjusted_leverage)}\n"
             f"• Риск: ${trade.risk_money:.2f} ({trade.risk_percent*100:.1f}%)\n\n"
             f"Потенциальная прибыль: ${trade.potential_profit:.2f}"
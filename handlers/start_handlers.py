@@ -3,10 +3,11 @@ from aiogram import types, Router
 import asyncio
 import logging
 
-from config import subscribed_users
+from services.session_service import subscribed_users
 import keyboards
 from services.trade_calculator import trade_calculator
 from services.state_service import state_service
+from services.cleanup_service import cleanup_service
 
 logger = logging.getLogger(__name__)
 start_router = Router()
@@ -28,9 +29,9 @@ async def handle_start(message: types.Message):
         
 @start_router.message(Command("imoex"))  # Правильная команда
 async def handle_imoex_command(message: types.Message):
-    from services.price_service import price_service
+    from services.moex_service import moex_service
     try:
-        imoex_price = await price_service.get_imoex_index()
+        imoex_price = await moex_service.get_imoex_index()
         if imoex_price is not None:
             await message.answer(
                 f"*Индекс Московской биржи IMOEX*\n"
@@ -68,11 +69,7 @@ async def start_calculation_command(message: types.Message):
         )
         
         state_service.set_navigation_id(user_id, nav_message.message_id)
-        
-        try:
-            await message.delete()
-        except:
-            pass
+        cleanup_service.schedule(message.chat.id, [message.message_id])
             
     except Exception as e:
         logger.error(f"Error starting calculation: {e}")
@@ -81,7 +78,7 @@ async def start_calculation_command(message: types.Message):
 @start_router.message(Command("trade"))
 async def start_analysis_command(message: types.Message):
     """Запуск анализа с красивой анимацией"""
-    from config import running_analyses
+    from services.session_service import running_analyses
     from services.analysis_service import analysis_service
     from services.time_utils import timeframe_manager
     
@@ -91,12 +88,12 @@ async def start_analysis_command(message: types.Message):
         await message.answer("⚠️ Анализ уже запущен! /stop чтобы остановить")
         return
     
-    timeframe = timeframe_manager.get_timeframe()
+    timeframe = timeframe_manager.get_timeframe(user_id)
     if not timeframe:
         await message.answer("⚠️ Сначала выбери таймфрейм в настройках!")
         return
     
-    task = asyncio.create_task(analysis_service.analyze_candles_with_progress(user_id))
+    task = asyncio.create_task(analysis_service.analyze_candles_with_progress(user_id, timeframe))
     running_analyses[user_id] = task
     analysis_service.user_tasks[user_id] = task
     
@@ -110,27 +107,142 @@ async def start_analysis_command(message: types.Message):
 @start_router.message(Command("stop"))
 async def stop_analysis(message: types.Message):
     """Провая остановка"""
-    from config import running_analyses
+    from services.session_service import running_analyses
     from services.analysis_service import analysis_service
     
     user_id = message.from_user.id
     
     if user_id in running_analyses:
+        # Сначала снимаем флаг: циклы анализа выйдут, даже если отмену проглотит bare except
+        analysis_service.stop_analysis(user_id)
+
         # Отменяем задачу анализа
         running_analyses[user_id].cancel()
         try:
             await running_analyses[user_id]
         except:
             pass
-        del running_analyses[user_id]
-        
-        # Останавливаем анализ в сервисе
-        analysis_service.stop_analysis(user_id)
+        # Задача анализа уже могла убрать себя в cleanup_user_analysis
+        running_analyses.pop(user_id, None)
         
         await message.answer("Анализ остановлен")
     else:
         await message.answer("Анализ не запущен")
         
+@start_router.message(Command("profile"))
+async def handle_profile_command(message: types.Message):
+    """Сохранение профиля сканирования: /profile имя BTCUSDT,ETHUSDT buy 100000-110000"""
+    from services.analysis_service import analysis_service
+    from services.profile_service import profile_service
+
+    user_id = message.from_user.id
+    args = message.text.partition(' ')[2].strip()
+    if not args:
+        profiles = profile_service.get_profiles(user_id)
+        text = "\n".join(profile_service.describe(profile) for profile in profiles) or "Профилей пока нет"
+        await message.answer(
+            f"{text}\n\nНовый профиль: /profile имя BTCUSDT,ETHUSDT [buy|sell|all] [мин-макс]\n"
+            f"Удалить: /profile_del имя"
+        )
+        return
+
+    try:
+        profile = profile_service.parse(args, analysis_service.instruments)
+        profile_service.save_profile(user_id, profile)
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}")
+        return
+    if analysis_service.refresh_profiles(user_id):
+        await message.answer(f"Профиль сохранен и применен к анализу\n{profile_service.describe(profile)}")
+    else:
+        await message.answer(f"Профиль сохранен\n{profile_service.describe(profile)}\n\nПрименится при следующем /trade")
+
+@start_router.message(Command("profile_del"))
+async def handle_profile_delete(message: types.Message):
+    """Удаление профиля сканирования"""
+    from services.analysis_service import analysis_service
+    from services.profile_service import profile_service
+
+    name = message.text.partition(' ')[2].strip()
+    if profile_service.delete_profile(message.from_user.id, name):
+        analysis_service.refresh_profiles(message.from_user.id)
+        await message.answer(f"Профиль {name} удален")
+    else:
+        await message.answer("Профиль не найден")
+
+@start_router.message(Command("alert"))
+async def handle_alert_command(message: types.Message):
+    """Ценовой алерт: /alert BTCUSDT 100000 или /alert BTCUSDT 100000-110000"""
+    from services.alert_service import alert_service
+    from services.instrument_registry import instrument_registry
+
+    user_id = message.from_user.id
+    parts = message.text.split()[1:]
+    if not parts:
+        alerts = alert_service.get_alerts(user_id)
+        lines = [f"• #{alert_id} {alert['symbol']}: {alert['low']:g}"
+                 + ('' if alert['low'] == alert['high'] else f"-{alert['high']:g}")
+                 for alert_id, alert in alerts.items()]
+        await message.answer("\n".join(lines or ["Алертов пока нет"])
+                             + "\n\nНовый алерт: /alert BTCUSDT 100000[-110000]\nУдалить: /alert_del номер")
+        return
+
+    symbol = parts[0].upper()
+    try:
+        if symbol not in instrument_registry or len(parts) != 2:
+            raise ValueError("Формат: /alert BTCUSDT 100000 или /alert BTCUSDT 100000-110000")
+        low, _, high = parts[1].partition('-')
+        alert_id = alert_service.add_alert(user_id, symbol, float(low), float(high) if high else None)
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}")
+        return
+    await message.answer(f"🔔 Алерт #{alert_id} на {symbol} {parts[1]} установлен")
+
+@start_router.message(Command("alert_del"))
+async def handle_alert_delete(message: types.Message):
+    """Удаление ценового алерта"""
+    from services.alert_service import alert_service
+
+    alert_id = message.text.partition(' ')[2].strip().lstrip('#')
+    if alert_service.remove_alert(message.from_user.id, alert_id):
+        await message.answer(f"Алерт #{alert_id} удален")
+    else:
+        await message.answer("Алерт не найден")
+
+@start_router.message(Command("early"))
+async def handle_early_warning_toggle(message: types.Message):
+    """Включение и выключение предупреждений о формирующихся ордерблоках"""
+    from services.early_warning import early_warning_service
+
+    user_id = message.from_user.id
+    if user_id in early_warning_service.users:
+        early_warning_service.users.discard(user_id)
+        await message.answer("Ранние предупреждения выключены")
+    else:
+        early_warning_service.users.add(user_id)
+        await message.answer(
+            "⏳ Ранние предупреждения включены\n"
+            "Бот будет сообщать об ордерблоке до закрытия свечи, а на закрытии - подтверждать или отменять его"
+        )
+
+@start_router.message(Command("stats"))
+async def handle_signal_stats(message: types.Message):
+    """Скользящая статистика исходов сигналов: /stats или /stats BTCUSDT"""
+    from services.signal_journal import signal_journal
+
+    symbol = message.text.partition(' ')[2].strip().upper() or None
+    stats = signal_journal.performance(symbol)
+    if not stats:
+        await message.answer("Исходов сигналов пока нет")
+        return
+    lines = [f"📒 Последние {signal_journal.window} сигналов, тейк {signal_journal.risk_reward:g}R"]
+    for (stats_symbol, timeframe), row in stats.items():
+        line = f"• {stats_symbol} {timeframe}: ✅ {row['tp']} ❌ {row['sl']} ⏳ {row['open']}"
+        if row['win_rate'] is not None:
+            line += f" | винрейт {row['win_rate'] * 100:.0f}%, в среднем {row['avg_r']:+.2f}R"
+        lines.append(line)
+    await message.answer("\n".join(lines))
+
 @start_router.message(Command("default"))
 async def handle_default_risk(message: types.Message):
     """Использование значения риска по умолчанию"""
@@ -148,11 +260,7 @@ async def handle_default_risk(message: types.Message):
     # Создаем отдельную функцию чтобы избежать циклического импорта
     await _calculate_and_show_trade(user_id)
     
-    try:
-        await asyncio.sleep(2)
-        await message.delete()
-    except:
-        pass
+    cleanup_service.schedule(message.chat.id, [message.message_id])
 
 async def _calculate_and_show_trade(user_id: int):
     """Вспомогательная функция для расчета сделки"""
@@ -192,7 +300,7 @@ async def _calculate_and_show_trade(user_id: int):
             f"• Стоп-лосс: ${trade.stop_loss:.2f}\n"
             f"• Тейк-профит: ${trade.take_profit:.2f}\n\n"
             f"💡 *РЕКОМЕНДАЦИЯ:*\n"
-            f"• Объем: {trade_calculator.format_volume(trade.volume)}\n"
+            f"• Объем: {trade_calculator.format_volume(trade.volume, user_data.get('symbol'))}\n"
             f"• Плечо: x{trade.required_leverage:.2f}\n"
             f"• Риск: ${trade.risk_money:.2f} ({trade.risk_percent*100:.1f}%)\n\n"
             f"Потенциальная прибыль: ${trade.potential_profit:.2f}"
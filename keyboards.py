@@ -88,6 +88,7 @@ def trade_details_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text="Подробнее", callback_data="trade_details"),
+        InlineKeyboardButton(text="Сетка", callback_data="trade_grid"),
         InlineKeyboardButton(text="Новый расчет", callback_data="new_trade")
     )
     builder.row(
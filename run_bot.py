@@ -1,35 +1,84 @@
 import asyncio
 import logging
+import time
 from aiogram import Dispatcher
 
-from config import bot, storage
+from config import (bot, storage, WEBHOOK_URL, METRICS_HOST, METRICS_PORT,
+                    TRACEMALLOC_FRAMES, STATE_DB_PATH, CANDLE_STORE_PATH,
+                    SIGNAL_JOURNAL_PATH)
 from handlers import start_router, message_router, callback_router  # Изменен импорт
 from services.state_service import state_service
 from services.time_utils import time_service
+from services.cleanup_service import cleanup_service
+from services.rate_limiter import rate_limiter, OutboundMiddleware
+from services.metrics import metrics, MetricsServer
+from services.loop_monitor import loop_monitor
+from services.diagnostics import memory_diagnostics
+from services.storage_service import persistence_service, SessionLoadMiddleware
+from services.snapshot_service import snapshot_service
+from services.expiry_service import expiry_service
+from services.alert_service import alert_service
+from services.candle_store import candle_store
+from services.signal_journal import signal_journal
+from services.moex_service import moex_service
+from services.logging_setup import setup_logging, stop_logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Лимит запросов и учет отправленных сообщений для всех исходящих вызовов
+bot.session.middleware(OutboundMiddleware(rate_limiter))
+
 async def on_startup():
     """Действия при запуске бота"""
     logger.info("Бот запущен...")
+    if STATE_DB_PATH and not persistence_service.enabled:
+        await persistence_service.start(STATE_DB_PATH)
+    if CANDLE_STORE_PATH and not candle_store.enabled:
+        candle_store.open(CANDLE_STORE_PATH)
+    if SIGNAL_JOURNAL_PATH and not signal_journal.enabled:
+        signal_journal.open(SIGNAL_JOURNAL_PATH)
+    # Алерты проверяются и для пользователей, чьи сессии еще не загружены
+    alert_service.restore(await persistence_service.field_rows('alerts'))
+    alert_service.start()
+    # Анализы и кэши поднимаются до первого апдейта
+    await snapshot_service.restore()
     await time_service.sync_binance_time()
     logger.info("Binance time synced successfully")
 
 async def on_shutdown():
     """Действия при остановке бота"""
     logger.info("Бот остановлен...")
+    snapshot_service.save()
+    await alert_service.stop()
+    await cleanup_service.flush()
+    await persistence_service.stop()
+    candle_store.close()
+    signal_journal.close()
+    await moex_service.close()
     await bot.session.close()
 
 async def cleanup_task():
-    """Задача для очистки неактивных пользователей"""
-    while True:
-        await asyncio.sleep(3600*24*7)  # Каждые 7 дней
-        state_service.cleanup_inactive_users()
+    """Порционная выгрузка неактивных пользователей и ежечасная проверка утечек"""
+    expiry_task = asyncio.create_task(expiry_service.run())
+    try:
+        while True:
+            await asyncio.sleep(3600)
+            # Сигналы символов, которые больше никто не опрашивает
+            expired = signal_journal.expire(int(time.time() * 1000))
+            if expired:
+                logger.info(f"📒 Сигналов без исхода закрыто как expired: {len(expired)}")
+            stale = memory_diagnostics.stale_users()
+            if stale:
+                logger.warning(f"Данные удаленных пользователей остались в: {', '.join(stale)}")
+    finally:
+        expiry_task.cancel()
 
-async def main():
-    """Основная функция запуска бота"""
+def create_dispatcher() -> Dispatcher:
+    """Сборка диспетчера со всеми роутерами"""
     dp = Dispatcher(storage=storage)
+    # Данные пользователя поднимаются из SQLite до любого обработчика
+    dp.update.outer_middleware(SessionLoadMiddleware(persistence_service))
 
     dp.include_router(start_router)
     dp.include_router(message_router)
@@ -37,8 +86,28 @@ async def main():
 
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
+    return dp
+
+async def start_metrics(port: int = METRICS_PORT) -> MetricsServer:
+    """Запуск эндпоинта метрик на текущем event loop"""
+    server = MetricsServer(metrics, METRICS_HOST, port, {'/debug/memory': memory_diagnostics.handle})
+    if TRACEMALLOC_FRAMES:
+        memory_diagnostics.start_tracing(TRACEMALLOC_FRAMES)
+    if port:
+        try:
+            await server.start()
+        except OSError as e:
+            logger.error(f"Не удалось запустить метрики на порту {port}: {e}")
+    return server
+
+async def main():
+    """Основная функция запуска бота"""
+    dp = create_dispatcher()
 
+    setup_logging()
+    loop_monitor.start()
     cleanup_task_instance = asyncio.create_task(cleanup_task())
+    metrics_server = await start_metrics()
 
     try:
         await bot.delete_webhook(drop_pending_updates=True)
@@ -47,10 +116,17 @@ async def main():
         logger.error(f"Ошибка в боте: {e}")
     finally:
         cleanup_task_instance.cancel()
+        await metrics_server.stop()
+        await loop_monitor.stop()
         await on_shutdown()
+        stop_logging()
 
 if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        if WEBHOOK_URL:
+            from webhook_server import serve
+            serve()
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
\ No newline at end of file
@@ -5,6 +5,26 @@ from .price_service import crypto_service
 from .time_utils import time_service, timeframe_manager, timezone_service
 from .progress_service import progress_service
 from .trade_calculator import trade_calculator
+from .rate_limiter import rate_limiter
+from .cleanup_service import cleanup_service
+from .tracing import pipeline_tracer
+from .metrics import metrics
+from .diagnostics import memory_diagnostics
+from .session_service import session_service
+from .storage_service import persistence_service
+from .snapshot_service import snapshot_service
+from .expiry_service import expiry_service
+from .subscription_service import subscription_index
+from .profile_service import profile_service, profile_index
+from .alert_service import alert_service
+from .zone_service import zone_tracker
+from .quantile_sketch import body_size_stats
+from .early_warning import early_warning_service
+from .candle_aggregator import candle_feed
+from .candle_store import candle_store
+from .signal_journal import signal_journal
+from .instrument_registry import instrument_registry
+from .moex_service import moex_service
 
 __all__ = [
     'state_service',
@@ -16,5 +36,26 @@ __all__ = [
     'timezone_service',
     'edit_navigation_message',
     'progress_service',
-    'trade_calculator'
+    'trade_calculator',
+    'rate_limiter',
+    'cleanup_service',
+    'pipeline_tracer',
+    'metrics',
+    'memory_diagnostics',
+    'session_service',
+    'persistence_service',
+    'snapshot_service',
+    'expiry_service',
+    'subscription_index',
+    'profile_service',
+    'profile_index',
+    'alert_service',
+    'zone_tracker',
+    'body_size_stats',
+    'early_warning_service',
+    'candle_feed',
+    'candle_store',
+    'signal_journal',
+    'instrument_registry',
+    'moex_service'
 ]
\ No newline at end of file
@@ -0,0 +1,147 @@
+# alert_service.py
+import asyncio
+import itertools
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from services.interval_index import IntervalIndex
+from services.metrics import metrics
+from services.session_service import session_service
+
+logger = logging.getLogger(__name__)
+
+MAX_ALERTS = 20
+
+alerts_fired = metrics.counter('price_alerts_fired_total', "Сработавшие ценовые алерты", ('symbol',))
+
+class AlertService:
+    """Ценовые алерты (уровень или зона) в индексе интервалов по символам.
+    Проверка цены - пересечение отрезка [прошлая цена, текущая] с индексом"""
+
+    def __init__(self, interval: float = 60):
+        self.interval = interval
+        self.user_alerts = session_service.view('alerts')  # user_id → {id: {symbol, low, high}}
+        self.levels: Dict[str, IntervalIndex] = {}
+        self.last_price: Dict[str, float] = {}
+        self._ids = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+
+    def _index(self, user_id: int, alert_id: str, alert: dict):
+        index = self.levels.get(alert['symbol'])
+        if index is None:
+            index = self.levels[alert['symbol']] = IntervalIndex()
+        index.add((user_id, alert_id), alert['low'], alert['high'])
+
+    def _unindex(self, user_id: int, alert_id: str, symbol: str):
+        index = self.levels.get(symbol)
+        if index is not None:
+            index.remove((user_id, alert_id))
+            if not index:
+                del self.levels[symbol]
+
+    def add_alert(self, user_id: int, symbol: str, low: float, high: Optional[float] = None) -> str:
+        """Добавляет алерт и сразу ставит его в индекс"""
+        alerts = dict(self.user_alerts.get(user_id, {}))
+        if len(alerts) >= MAX_ALERTS:
+            raise ValueError(f"Не больше {MAX_ALERTS} алертов")
+        high = low if high is None else high
+        if low > high:
+            raise ValueError("Нижняя граница больше верхней")
+        alert_id = str(next(self._ids))
+        while alert_id in alerts:
+            alert_id = str(next(self._ids))
+        alert = {'symbol': symbol, 'low': low, 'high': high}
+        alerts[alert_id] = alert
+        self.user_alerts[user_id] = alerts
+        self._index(user_id, alert_id, alert)
+        return alert_id
+
+    def remove_alert(self, user_id: int, alert_id: str) -> bool:
+        alerts = dict(self.user_alerts.get(user_id, {}))
+        alert = alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        if alerts:
+            self.user_alerts[user_id] = alerts
+        else:
+            del self.user_alerts[user_id]
+        self._unindex(user_id, alert_id, alert['symbol'])
+        return True
+
+    def get_alerts(self, user_id: int) -> Dict[str, dict]:
+        return dict(self.user_alerts.get(user_id, {}))
+
+    def restore(self, rows: List[Tuple[int, dict]]):
+        """Индексирует алерты, сохраненные в хранилище (сами сессии не загружаются)"""
+        for user_id, alerts in rows:
+            for alert_id, alert in alerts.items():
+                self._index(user_id, alert_id, alert)
+        logger.info(f"🔔 Восстановлено алертов: {sum(len(index) for index in self.levels.values())}")
+
+    def check(self, symbol: str, price: float) -> List[Tuple[int, str]]:
+        """Алерты, которые цена задела с прошлой проверки"""
+        index = self.levels.get(symbol)
+        previous = self.last_price.get(symbol, price)
+        self.last_price[symbol] = price
+        if index is None:
+            return []
+        return index.overlap(min(previous, price), max(previous, price))
+
+    async def fire(self, symbol: str, price: float):
+        from config import bot
+        from services.storage_service import persistence_service
+
+        for user_id, alert_id in self.check(symbol, price):
+            # Пользователь мог быть выгружен - алерт удаляем из его сохраненной сессии
+            await persistence_service.load(user_id)
+            alert = self.get_alerts(user_id).get(alert_id)
+            if alert is None:
+                self._unindex(user_id, alert_id, symbol)  # Уже удален пользователем
+                continue
+            self.remove_alert(user_id, alert_id)
+            alerts_fired.inc(symbol)
+            level = f"{alert['low']:g}" if alert['low'] == alert['high'] else f"{alert['low']:g}-{alert['high']:g}"
+            try:
+                await bot.send_message(user_id, f"🔔 {symbol}: цена {price:g} достигла {level}")
+            except Exception as e:
+                logger.error(f"Ошибка отправки алерта user {user_id}: {e}")
+
+    async def get_price(self, symbol: str) -> Optional[float]:
+        from services.instrument_registry import instrument_registry
+
+        provider = instrument_registry.provider(symbol)
+        if provider is None:
+            return None
+        data = await provider.get_price(symbol)
+        return float(data.indicators['close']) if data else None
+
+    async def run(self):
+        """Опрос цен только по символам, на которые есть алерты (через общий кэш котировок)"""
+        while True:
+            for symbol in list(self.levels):
+                try:
+                    price = await self.get_price(symbol)
+                    if price is not None:
+                        await self.fire(symbol, price)
+                except Exception as e:
+                    logger.error(f"Ошибка проверки алертов {symbol}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Глобальный экземпляр
+alert_service = AlertService()
+
+metrics.gauge('price_alerts', "Активные ценовые алерты", (),
+              lambda: {(): sum(len(index) for index in alert_service.levels.values())})
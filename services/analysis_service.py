@@ -3,48 +3,83 @@ import asyncio
 from typing import Dict, Optional, List
 import logging
 
-import time
 from config import bot
-from services.price_service import crypto_service, forex_service
 from services.time_utils import timeframe_manager, time_service, logger, timezone_service
 from services.progress_service import progress_service
-from .models import Candle
+from services.tracing import pipeline_tracer
+from services.metrics import metrics
+from services.diagnostics import memory_diagnostics
+from services.session_service import session_service, UserSession
+from services.subscription_service import subscription_index, GroupKey
+from services.profile_service import profile_index, profile_service
+from services.zone_service import zone_tracker
+from services.quantile_sketch import body_size_stats
+from services.early_warning import early_warning_service
+from services.candle_aggregator import candle_feed
+from services.candle_store import candle_store
+from services.signal_journal import signal_journal
+from services.instrument_registry import instrument_registry
+from services.moex_service import moex_service
+from .models import Candle, ScanProfile, Zone
 
 logger = logging.getLogger(__name__)
 
 class AnalysisService:
-    def __init__(self, crypto_service, forex_service, time_service, timeframe_manager):
-        self.crypto_service = crypto_service
-        self.forex_service = forex_service
+    DEFAULT_SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'EURUSD', 'GBPUSD']
+
+    def __init__(self, instruments, time_service, timeframe_manager):
+        self.instruments = instruments  # Символ → провайдер котировок
         self.time_service = time_service
         self.timeframe_manager = timeframe_manager
-        self.user_tasks: Dict[int, asyncio.Task] = {}
-        self.candle_history: Dict[int, Dict[str, List[Candle]]] = {}
-        self.active_analyses: Dict[int, bool] = {}
-        self.last_prices: Dict[int, float] = {}
-        self.analysis_tasks: Dict[int, Dict[str, asyncio.Task]] = {}
-        self.progress_managers: Dict[int, asyncio.Task] = {}
-
-    async def safe_send_message(self, chat_id: int, text: str, parse_mode: Optional[str] = None) -> bool:
-        """Безопасная отправка сообщений"""
+        # Поля UserSession в виде словарей user_id → значение
+        self.user_tasks = session_service.view('analysis_task')
+        self.active_analyses = session_service.view('analysis_active')
+        self.last_prices = session_service.view('last_price')
+        self.progress_managers = session_service.view('progress_manager')
+        self.user_timeframes = session_service.view('timeframe')  # Таймфрейм запущенного анализа
+        self.user_symbols = session_service.view('symbols')
+        # Общая работа по группам (символ, таймфрейм)
+        self.subscriptions = subscription_index
+        self.profiles = profile_index  # Кому отправлять: фильтры профилей по типу блока и цене
+        self.candle_feed = candle_feed  # Один запрос на символ, старшие таймфреймы из базового
+        self.group_tasks: Dict[GroupKey, asyncio.Task] = {}
+        self.candle_history: Dict[GroupKey, List[Candle]] = {}
+
+    async def safe_send_message(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                                symbol: Optional[str] = None, timeframe: Optional[str] = None,
+                                candle_close: Optional[float] = None) -> bool:
+        """Безопасная отправка сообщений (с symbol - с замером доставки сигнала).
+        Темп отправки задает rate_limiter в сессии бота"""
         try:
-            await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
-            await asyncio.sleep(1)
+            if symbol is None:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return True
+
+            with pipeline_tracer.span('send', symbol, timeframe):
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+            if candle_close is not None:
+                pipeline_tracer.observe('close_to_delivered', symbol, timeframe,
+                                        self.time_service.clock.time() - candle_close)
             return True
         except Exception as e:
             logger.error(f"Ошибка отправки сообщения: {e}")
             return False
 
-    def analyze_order_block(self, prev_candle: Candle, current_candle: Candle) -> Optional[str]:
+    def analyze_order_block(self, prev_candle: Candle, current_candle: Candle,
+                            min_body: Optional[float] = None) -> Optional[str]:
         """
         Анализирует две свечи на наличие ордерблока:
         1. Свечи разного цвета
         2. Вторая свеча в 2+ раза больше первой по телу
+        3. Тело второй не меньше min_body (перцентиль тел по символу), если он задан
         """
         if (prev_candle is None or current_candle is None or
             prev_candle.body_size == 0 or current_candle.body_size == 0):
             return None
 
+        if min_body is not None and current_candle.body_size < min_body:
+            return None
+
         # Определяем цвет свечей через свойства
         prev_color = prev_candle.color
         current_color = current_candle.color
@@ -93,34 +128,61 @@ class AnalysisService:
 
         return message
 
+    def create_retest_message(self, zone: Zone, candle: Candle) -> str:
+        """Сообщение о возврате цены в зону ордерблока"""
+        from services.message_utils import escape_markdown
+
+        (first_limit, second_limit), stop = zone.limit_levels
+        direction = "🟢 LONG" if zone.block_type == 'buy' else "🔴 SHORT"
+        block_type = "Бычий ордерблок" if zone.block_type == 'buy' else "Медвежий ордерблок"
+        return (
+            f"*{escape_markdown(zone.symbol)} - ретест: {escape_markdown(block_type)}*\n"
+            f"• Сигнал: {escape_markdown(direction)}\n"
+            f"• Таймфрейм: {escape_markdown(zone.timeframe)}\n"
+            f"• Зона: {zone.low:.2f} - {zone.high:.2f}\n"
+            f"• Лимитные входы: {first_limit:.2f} / {second_limit:.2f}\n"
+            f"• Стоп: за {stop:.2f}\n"
+            f"• Закрытие: {candle.close:.2f}\n"
+            f"\n*ВНИМАНИЕ:* Это только сигнал. Проверьте дополнительный анализ!"
+        )
+
     async def get_candle_data(self, symbol: str, timeframe: str) -> Optional[Candle]:
-        """Получает данные последней завершенной свечи"""
+        """Получает данные последней завершенной свечи (у провайдера со свечами, например ISS,
+        иначе - последнюю свечу, собранную из котировок)"""
         try:
-            if symbol == 'IMOEX':
-                # Для IMOEX используем новый метод из price_service
-                imoex_candles = await self.price_service.get_imoex_ohlc(
-                    timeframe=timeframe,
-                    num_candles=1
+            get_ohlc = getattr(self.instruments.provider(symbol), 'get_ohlc', None)
+            if get_ohlc is None:
+                return self.candle_feed.latest(symbol, timeframe)
+            candles = await get_ohlc(symbol, timeframe, 1)
+            if candles:
+                candle_data = candles[0]
+                return Candle(
+                    open=float(candle_data['open']),
+                    high=float(candle_data['high']),
+                    low=float(candle_data['low']),
+                    close=float(candle_data['close']),
+                    volume=float(candle_data.get('volume') or 0),
+                    timestamp=int(candle_data['begin'].timestamp() * 1000)  # Открытие свечи, мс
                 )
-
-                if imoex_candles and len(imoex_candles) > 0:
-                    candle_data = imoex_candles[0]
-                    return Candle(
-                        open=float(candle_data['open']),
-                        high=float(candle_data['high']),
-                        low=float(candle_data['low']),
-                        close=float(candle_data['close']),
-                        volume=0.0,  # Для IMOEX объем не используется
-                        timestamp=candle_data['end'].timestamp() * 1000  # Конвертируем в миллисекунды
-                    )
-            else:
-                # Для крипты используем Binance
-                pass
         except Exception as e:
             logger.error(f"Ошибка получения свечи {symbol} {timeframe}: {e}")
 
         return None
 
+    async def fetch_price(self, symbol: str, max_age: Optional[float] = None):
+        """Данные символа у его провайдера (через общий кэш котировок, не старше max_age с)"""
+        provider = self.instruments.provider(symbol)
+        if provider is None:
+            return None
+        return await provider.get_price(symbol, max_age=max_age)
+
+    async def fetch_bar(self, symbol: str, timeframe: str) -> Optional[dict]:
+        """Закрытый бар таймфрейма у провайдера символа (open/high/low/close/volume, без кэша)"""
+        provider = self.instruments.provider(symbol)
+        if provider is None:
+            return None
+        return await provider.get_bar(symbol, timeframe)
+
     async def manage_progress(self, user_id: int, timeframe: str):
         """Управление прогресс-баром (отправляется один раз)"""
         try:
@@ -132,63 +194,58 @@ class AnalysisService:
                     await progress_service.start_progress_animation(
                         user_id, wait_time, timeframe, close_time
                     )
-                    await asyncio.sleep(wait_time)
+                    await self.time_service.sleep(wait_time)
                     await progress_service.stop_progress_animation(user_id)
 
-                await asyncio.sleep(1)
+                await self.time_service.sleep(1)
 
         except asyncio.CancelledError:
             logger.info(f"⏹️ Управление прогрессом остановлено для user {user_id}")
         except Exception as e:
             logger.error(f"❌ Ошибка в управлении прогрессом: {e}")
 
-    async def analyze_symbol(self, user_id: int, symbol: str, timeframe: str):
-        """Анализ отдельного символа (только после закрытия свечи)"""
+    async def analyze_group(self, symbol: str, timeframe: str):
+        """Анализ символа для всех подписчиков таймфрейма (только после закрытия свечи)"""
+        key = (symbol, timeframe)
         try:
-            logger.info(f"🔄 Начинаем анализ {symbol} для user {user_id} на TF: {timeframe}")
-
-            # Инициализируем историю для символа
-            if user_id not in self.candle_history:
-                self.candle_history[user_id] = {}
-            if symbol not in self.candle_history[user_id]:
-                self.candle_history[user_id][symbol] = []
+            logger.info(f"🔄 Начинаем анализ {symbol} на TF: {timeframe}")
 
-            while self.active_analyses.get(user_id, False):
-                if asyncio.current_task().cancelled():
-                    break
+            history = self.candle_history.setdefault(key, [])
+            if not history:
+                # После перезапуска детектор продолжает с локальной истории
+                history.extend(self.stored_history(symbol, timeframe))
 
+            while key in self.subscriptions:
                 # Ждем до закрытия следующей свечи
                 wait_time, close_time = await self.time_service.get_time_to_candle_close(timeframe)
                 if wait_time > 0:
                     logger.info(f"Ждем {wait_time} сек до закрытия свечи {timeframe}")
-                    await asyncio.sleep(wait_time)
-
-                # Получаем новые данные
-                analysis_data = None
-                if symbol in ['BTCUSDT', 'ETHUSDT']:
-                    analysis_data = await self.crypto_service.get_price(symbol)
-                elif symbol in ['EURUSD', 'GBPUSD']:
-                    analysis_data = await self.forex_service.get_price(symbol)
-
-                if not analysis_data:
+                    waited_from = self.time_service.clock.time()
+                    # Пока свеча формируется - предупреждения для тех, кто их включил
+                    watcher = None
+                    if history and early_warning_service.wanted(symbol, timeframe):
+                        watcher = asyncio.create_task(early_warning_service.watch(symbol, timeframe, history[-1]))
+                    try:
+                        await self.time_service.sleep(wait_time)
+                    finally:
+                        if watcher is not None:
+                            watcher.cancel()
+                    pipeline_tracer.observe('wait_close', symbol, timeframe,
+                                            self.time_service.clock.time() - waited_from)
+                candle_close = close_time.timestamp()
+
+                # Свеча из общего потока символа: старшие таймфреймы собраны из базового
+                with pipeline_tracer.span('fetch', symbol, timeframe):
+                    new_candle = await self.candle_feed.candle(symbol, timeframe, candle_close)
+
+                if new_candle is None:
                     logger.warning(f"{symbol}: Не получилось получить данные")
+                    early_warning_service.discard(symbol, timeframe)
                     continue
 
-                # Создаем объект Candle из полученных данных
-                indicators = analysis_data.indicators
-                new_candle = Candle(
-                    open=float(indicators.get('open', 0)),
-                    high=float(indicators.get('high', 0)),
-                    low=float(indicators.get('low', 0)),
-                    close=float(indicators.get('close', 0)),
-                    volume=float(indicators.get('volume', 0)),
-                    timestamp=int(time.time() * 1000)  # Текущее время в миллисекундах
-                )
-
                 print(f'{symbol}: Close = {new_candle.close}')
 
                 # Обновляем историю
-                history = self.candle_history[user_id][symbol]
                 history.append(new_candle)
 
                 # Держим только последние 2 свечи
@@ -197,42 +254,139 @@ class AnalysisService:
 
                 logger.info(f"📊 {symbol} {timeframe}: обновлена история свечей ({len(history)} шт)")
 
+                # Возврат цены в ранее найденные зоны
+                period_ms = self.time_service.timeframe_minutes[timeframe] * 60000
+                for zone in zone_tracker.on_candle(symbol, timeframe, new_candle, period_ms):
+                    logger.info(f"🎯 Ретест зоны {symbol} {timeframe}: {zone.low}-{zone.high}")
+                    await self.deliver_signal(symbol, timeframe, zone.block_type, new_candle.close,
+                                              self.create_retest_message(zone, new_candle), candle_close)
+
                 # Анализируем если есть минимум 2 свечи
+                signal = None
                 if len(history) >= 2:
                     prev_candle, current_candle = history[-2], history[-1]
 
                     # Проверяем, что свечи разные (по времени)
                     if prev_candle.timestamp != current_candle.timestamp:
                         # Ищем ордерблок
-                        signal = self.analyze_order_block(prev_candle, current_candle)
+                        with pipeline_tracer.span('detect', symbol, timeframe):
+                            signal = self.analyze_order_block(
+                                prev_candle, current_candle, body_size_stats.threshold(symbol, timeframe)
+                            )
 
                         if signal:
                             logger.info(f"🎯 Найден ордерблок {symbol} {timeframe}: {signal}")
+                            zone = zone_tracker.add_zone(symbol, timeframe, signal, prev_candle)
+                            signal_journal.record(zone, current_candle.close, current_candle.timestamp)
 
                             message = self.create_order_block_message(
                                 symbol, signal, timeframe, [prev_candle, current_candle]
                             )
-                            await self.safe_send_message(user_id, message, parse_mode="Markdown")
+                            await self.deliver_signal(symbol, timeframe, signal, current_candle.close,
+                                                      message, candle_close)
                         else:
                             logger.debug(f"{symbol} {timeframe}: ордерблок не найден")
                 else:
                     logger.info(f"📊 {symbol}: накопление истории ({len(history)}/2)")
 
+                # Предварительные сигналы подтверждаются или отменяются закрытием
+                await early_warning_service.resolve(symbol, timeframe, signal)
+
+                # Порог для следующих свечей считается без текущей
+                body_size_stats.observe(symbol, timeframe, new_candle.body_size)
+
         except asyncio.CancelledError:
-            logger.info(f"⏹️ Анализ {symbol} остановлен для user {user_id}")
+            logger.info(f"⏹️ Анализ {symbol} {timeframe} остановлен")
         except Exception as e:
             logger.error(f"❌ Ошибка в анализе {symbol} {timeframe}: {e}")
+        finally:
+            if self.group_tasks.get(key) is asyncio.current_task():
+                del self.group_tasks[key]
+            if key not in self.subscriptions:
+                self.candle_history.pop(key, None)
+                zone_tracker.drop(symbol, timeframe)
+                early_warning_service.discard(symbol, timeframe)
+                if not self.subscriptions.timeframes(symbol):
+                    self.candle_feed.drop([symbol])
+
+    def stored_history(self, symbol: str, timeframe: str) -> List[Candle]:
+        """Две последние свечи из хранилища, если последняя закрылась на прошлой границе периода"""
+        period_ms = self.time_service.timeframe_minutes[timeframe] * 60000
+        last_open = int(self.time_service.clock.time() * 1000) // period_ms * period_ms - period_ms
+        stored = candle_store.candles(symbol, timeframe, last_open - period_ms, last_open + 1)
+        return stored if stored and stored[-1].timestamp == last_open else []
+
+    async def deliver_signal(self, symbol: str, timeframe: str, signal: str, price: float,
+                             message: str, candle_close: Optional[float]):
+        """Рассылка сигнала тем, чьи профили совпали, если они еще ждут сигналы"""
+        recipients = [user_id for user_id in self.profiles.match(symbol, timeframe, signal, price)
+                      if self.active_analyses.get(user_id, False)]
+        await asyncio.gather(*(
+            self.safe_send_message(user_id, message, parse_mode="Markdown",
+                                   symbol=symbol, timeframe=timeframe, candle_close=candle_close)
+            for user_id in recipients
+        ))
+
+    def subscribe(self, user_id: int, symbols: List[str], timeframe: str,
+                  profiles: Optional[List[ScanProfile]] = None) -> List[asyncio.Task]:
+        """Подписка пользователя на группы; для новых групп запускается одна задача опроса.
+        Без профилей пользователь получает все сигналы по symbols"""
+        started = []
+        if not profiles:
+            profiles = [ScanProfile('default', list(symbols))]
+        symbols = self.profiles.compile(user_id, profiles, timeframe)
+        self.subscriptions.subscribe(user_id, symbols, timeframe)
+        for key, task in list(self.group_tasks.items()):
+            if key not in self.subscriptions:
+                # Группа опустела после смены инструментов
+                task.cancel()
+                del self.group_tasks[key]
+        for key in self.subscriptions.by_user.get(user_id, ()):
+            task = self.group_tasks.get(key)
+            if task is None or task.done():
+                task = self.group_tasks[key] = asyncio.create_task(self.analyze_group(*key))
+                started.append(task)
+        return started
+
+    async def unsubscribe(self, user_id: int):
+        """Снимает подписки; задачи опустевших групп останавливаются"""
+        self.profiles.remove(user_id)
+        for key in self.subscriptions.unsubscribe(user_id):
+            task = self.group_tasks.pop(key, None)
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+            self.candle_history.pop(key, None)
+            zone_tracker.drop(*key)
+            early_warning_service.discard(*key)
+
+    def refresh_profiles(self, user_id: int) -> bool:
+        """Применяет измененные профили к запущенному анализу (переиндексируются только диапазоны пользователя)"""
+        timeframe = self.user_timeframes.get(user_id)
+        if timeframe is None or not self.active_analyses.get(user_id, False):
+            return False
+        self.subscribe(user_id, self.get_user_symbols(user_id), timeframe, profile_service.get_profiles(user_id))
+        return True
+
+    def get_user_symbols(self, user_id: int) -> List[str]:
+        """Инструменты пользователя (по умолчанию - стандартный набор)"""
+        return list(self.user_symbols.get(user_id, self.DEFAULT_SYMBOLS))
 
-    async def analyze_candles_with_progress(self, user_id: int):
+    async def analyze_candles_with_progress(self, user_id: int, timeframe: Optional[str] = None):
         """Запуск анализа (работает до команды stop)"""
         try:
-            timeframe = self.timeframe_manager.get_timeframe()
+            timeframe = timeframe or self.timeframe_manager.get_timeframe(user_id)
             if not timeframe:
                 await self.safe_send_message(user_id, "Сначала выбери таймфрейм в настройках!")
                 return
 
-            symbols = ['BTCUSDT', 'ETHUSDT', 'EURUSD', 'GBPUSD']
+            profiles = profile_service.get_profiles(user_id)
+            symbols = self.get_user_symbols(user_id)
             self.active_analyses[user_id] = True
+            self.user_timeframes[user_id] = timeframe
 
             logger.info(f"🔄 Начинаем бесконечный анализ ордерблоков для user {user_id}, TF: {timeframe}")
 
@@ -242,11 +396,8 @@ class AnalysisService:
                 self.manage_progress(user_id, timeframe)
             )
 
-            # Создаем отдельные задачи для каждого символа
-            self.analysis_tasks[user_id] = {}
-            for symbol in symbols:
-                task = asyncio.create_task(self.analyze_symbol(user_id, symbol, timeframe))
-                self.analysis_tasks[user_id][symbol] = task
+            # Подписываемся на группы: опрос символа общий для всех пользователей таймфрейма
+            self.subscribe(user_id, symbols, timeframe, profiles)
 
             # Бесконечно ждем, пока не будет остановлено
             while self.active_analyses.get(user_id, False):
@@ -275,24 +426,23 @@ class AnalysisService:
                 pass
             del self.progress_managers[user_id]
 
-        if user_id in self.analysis_tasks:
-            for task in self.analysis_tasks[user_id].values():
-                task.cancel()
-                try:
-                    await task
-                except:
-                    pass
-            del self.analysis_tasks[user_id]
+        await self.unsubscribe(user_id)
 
-        # Чистим за собой
-        if user_id in self.candle_history:
-            del self.candle_history[user_id]
-        if user_id in self.active_analyses:
-            del self.active_analyses[user_id]
+        # Чистим за собой все поля анализа разом
+        session_service.clear_fields(user_id, UserSession.ANALYSIS_FIELDS)
 
         await progress_service.stop_progress_animation(user_id)
+        memory_diagnostics.check_cleanup(user_id)
         logger.info(f"🧹 Ресурсы анализа очищены для user {user_id}")
 
+    def tasks_by_timeframe(self) -> Dict[tuple, int]:
+        """Число живых задач опроса групп по таймфреймам"""
+        counts: Dict[tuple, int] = {}
+        for (_, timeframe), task in self.group_tasks.items():
+            if not task.done():
+                counts[(timeframe,)] = counts.get((timeframe,), 0) + 1
+        return counts
+
     def stop_analysis(self, user_id: int):
         """Останавливает анализ для пользователя"""
         if user_id in self.active_analyses:
@@ -302,10 +452,15 @@ class AnalysisService:
     async def get_imoex_current_price(self) -> Optional[float]:
         """Получить текущую цену IMOEX"""
         try:
-            return await self.price_service.get_imoex_index()
+            return await moex_service.get_imoex_index()
         except Exception as e:
             logger.error(f"Ошибка получения цены IMOEX: {e}")
             return None
 
 # Глобальный экземпляр
-analysis_service = AnalysisService(crypto_service, forex_service, time_service, timeframe_manager)
\ No newline at end of file
+analysis_service = AnalysisService(instrument_registry, time_service, timeframe_manager)
+
+metrics.gauge('analysis_tasks', "Активные задачи опроса групп по таймфреймам", ('timeframe',),
+              analysis_service.tasks_by_timeframe)
+metrics.gauge('analysis_subscribers', "Пользователи с запущенным анализом по таймфреймам", ('timeframe',),
+              subscription_index.users_by_timeframe)
\ No newline at end of file
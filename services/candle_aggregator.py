@@ -0,0 +1,171 @@
+# candle_aggregator.py
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from services.candle_store import candle_store
+from services.metrics import metrics
+from services.models import Candle
+from services.signal_journal import signal_journal
+
+logger = logging.getLogger(__name__)
+
+feed_fetches = metrics.counter('candle_feed_fetches_total', "Запросы базовой свечи к провайдеру", ('symbol',))
+
+class _Bucket:
+    """Формирующаяся свеча старшего таймфрейма"""
+
+    __slots__ = ('period_ms', 'start', 'candle', 'warm', 'seen')
+
+    def __init__(self, period_ms: int):
+        self.period_ms = period_ms
+        self.start: Optional[int] = None
+        self.candle: Optional[Candle] = None
+        self.warm = False  # Свеча собрана с начала периода
+        self.seen = False  # Базовые свечи уже приходили (пропуск дальше - перерыв сессии)
+
+    def take(self) -> Optional[Candle]:
+        candle = self.candle if self.warm else None
+        self.start, self.candle = None, None
+        return candle
+
+class SymbolAggregator:
+    """Свертка базовых свечей символа во все таймфреймы, кратные базовому.
+    Границы периодов выровнены по UTC, как у TimeService.get_time_to_candle_close"""
+
+    def __init__(self, timeframe_minutes: Dict[str, int]):
+        self.timeframe_minutes = timeframe_minutes
+        self.base: Optional[str] = None
+        self.buckets: Dict[str, _Bucket] = {}
+        self.latest: Dict[str, Candle] = {}  # Последняя закрытая свеча по таймфреймам
+
+    def configure(self, base: str):
+        """Базовый таймфрейм - младший из нужных; свертки некратных ему таймфреймов сбрасываются"""
+        if base == self.base:
+            return
+        base_minutes = self.timeframe_minutes[base]
+        self.base = base
+        self.buckets = {
+            timeframe: self.buckets.get(timeframe) or _Bucket(minutes * 60000)
+            for timeframe, minutes in self.timeframe_minutes.items()
+            if minutes > base_minutes and minutes % base_minutes == 0
+        }
+
+    @property
+    def base_ms(self) -> int:
+        return self.timeframe_minutes[self.base] * 60000
+
+    def ingest(self, candle: Candle) -> Dict[str, Candle]:
+        """Базовая свеча (timestamp - открытие, мс) → закрытые ей свечи по таймфреймам"""
+        closed = {self.base: candle}
+        end = candle.timestamp + self.base_ms
+        for timeframe, bucket in self.buckets.items():
+            start = candle.timestamp // bucket.period_ms * bucket.period_ms
+            if bucket.candle is not None and bucket.start != start:
+                # Конец периода пропущен (нет данных или перерыв сессии) - закрываем тем, что есть
+                stale = bucket.take()
+                if stale is not None:
+                    closed.setdefault(timeframe, stale)
+            if bucket.candle is None:
+                bucket.start = start
+                bucket.warm = bucket.seen or candle.timestamp == start
+                bucket.candle = Candle(candle.open, candle.high, candle.low, candle.close,
+                                       candle.volume, start)
+            else:
+                rolled = bucket.candle
+                rolled.high = max(rolled.high, candle.high)
+                rolled.low = min(rolled.low, candle.low)
+                rolled.close = candle.close
+                rolled.volume += candle.volume
+            bucket.seen = True
+            if end == start + bucket.period_ms:
+                rolled = bucket.take()
+                if rolled is not None:
+                    closed[timeframe] = rolled
+        self.latest.update(closed)
+        return closed
+
+    def flush(self, close_ms: int) -> Dict[str, Candle]:
+        """Закрывает периоды, кончившиеся к close_ms без последней базовой свечи"""
+        closed = {}
+        for timeframe, bucket in self.buckets.items():
+            if bucket.candle is not None and bucket.start + bucket.period_ms <= close_ms:
+                rolled = bucket.take()
+                if rolled is not None:
+                    closed[timeframe] = rolled
+        self.latest.update(closed)
+        return closed
+
+class CandleFeed:
+    """Один запрос к провайдеру на символ за базовый период: старшие таймфреймы
+    собираются из базовых свечей, их закрытия не стоят лишних запросов"""
+
+    def __init__(self):
+        self.aggregators: Dict[str, SymbolAggregator] = {}
+        self._closed: Dict[str, Tuple[int, Dict[str, Candle]]] = {}  # Символ → (закрытие, свечи)
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    async def candle(self, symbol: str, timeframe: str, close_time: float) -> Optional[Candle]:
+        """Свеча таймфрейма, закрывшаяся в close_time (None - данных нет).
+        Группы символа, закрывающиеся одновременно, делят один запрос"""
+        close_ms = int(close_time * 1000)
+        closed = self._closed.get(symbol)
+        if closed is None or closed[0] != close_ms:
+            key = (symbol, close_ms)
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = asyncio.ensure_future(self._collect(symbol, close_ms))
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            closed = (close_ms, await asyncio.shield(future))
+        return closed[1].get(timeframe)
+
+    async def _collect(self, symbol: str, close_ms: int) -> Dict[str, Candle]:
+        from services.analysis_service import analysis_service
+
+        minutes = analysis_service.time_service.timeframe_minutes
+        timeframes = analysis_service.subscriptions.timeframes(symbol)
+        if not timeframes:
+            return {}
+        aggregator = self.aggregators.get(symbol)
+        if aggregator is None:
+            aggregator = self.aggregators[symbol] = SymbolAggregator(minutes)
+        aggregator.configure(min(timeframes, key=minutes.__getitem__))
+
+        feed_fetches.inc(symbol)
+        # Бар, закрывшийся на базовом таймфрейме, а не снимок дня из кэша котировок
+        bar = await analysis_service.fetch_bar(symbol, aggregator.base)
+        closed: Dict[str, Candle] = {}
+        if bar:
+            candle = Candle(
+                open=float(bar['open']),
+                high=float(bar['high']),
+                low=float(bar['low']),
+                close=float(bar['close']),
+                volume=float(bar.get('volume') or 0),
+                timestamp=close_ms - aggregator.base_ms,
+            )
+            closed = aggregator.ingest(candle)
+            # Исходы прошлых сигналов символа всех таймфреймов - по самой мелкой свече
+            for signal_id, outcome in signal_journal.on_candle(symbol, candle):
+                logger.info(f"📒 Сигнал #{signal_id} {symbol}: {outcome}")
+        closed.update(aggregator.flush(close_ms))
+        for timeframe, candle in closed.items():
+            candle_store.append(symbol, timeframe, candle)
+        self._closed[symbol] = (close_ms, closed)
+        return closed
+
+    def latest(self, symbol: str, timeframe: str) -> Optional[Candle]:
+        """Последняя закрытая свеча любого таймфрейма символа - без запроса к провайдеру"""
+        aggregator = self.aggregators.get(symbol)
+        return aggregator.latest.get(timeframe) if aggregator else None
+
+    def drop(self, symbols: Iterable[str]):
+        for symbol in symbols:
+            self.aggregators.pop(symbol, None)
+            self._closed.pop(symbol, None)
+
+# Глобальный экземпляр
+candle_feed = CandleFeed()
+
+metrics.gauge('candle_feed_symbols', "Символы с общей базовой свечой", (),
+              lambda: {(): len(candle_feed.aggregators)})
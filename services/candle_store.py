@@ -0,0 +1,184 @@
+# candle_store.py
+import logging
+import mmap
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.metrics import metrics
+from services.models import Candle
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HPCNDL1\0'
+# Запись фиксированной ширины: время открытия (мс) и OHLCV
+CANDLE_DTYPE = np.dtype([
+    ('timestamp', '<i8'), ('open', '<f8'), ('high', '<f8'),
+    ('low', '<f8'), ('close', '<f8'), ('volume', '<f8'),
+])
+
+GROW_RECORDS = 4096  # Файл и отображение растут сразу на столько записей
+
+stored_candles = metrics.counter('candle_store_appends_total', "Свечи, записанные в локальное хранилище", ('timeframe',))
+
+class CandleSeries:
+    """Файл свечей одного (символа, таймфрейма): только дозапись, чтение - срезы mmap без копирования.
+    Записи идут по возрастанию времени, поэтому индекс времени - бинарный поиск по колонке timestamp.
+    Файл растет с запасом в GROW_RECORDS нулевых записей, и отображение пересоздается, только когда
+    запас кончился; при закрытии запас отрезается. writable=False - только чтение существующего файла"""
+
+    def __init__(self, path: str, writable: bool = True):
+        self.path = path
+        self.writable = writable
+        exists = os.path.exists(path) and os.path.getsize(path) >= len(MAGIC)
+        if not exists and not writable:
+            raise FileNotFoundError(path)
+        self._file = open(path, ('r+b' if exists else 'w+b') if writable else 'rb')
+        if not exists:
+            self._file.write(MAGIC)
+            self._file.flush()
+        elif self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path}: не файл свечей")
+        size = os.path.getsize(path)
+        self.count = (size - len(MAGIC)) // CANDLE_DTYPE.itemsize
+        if writable and len(MAGIC) + self.count * CANDLE_DTYPE.itemsize != size:
+            # Недописанная запись (падение во время записи) отрезается
+            self._file.truncate(len(MAGIC) + self.count * CANDLE_DTYPE.itemsize)
+        self._view: Optional[np.ndarray] = None
+        self.capacity = 0
+        self.remaps = 0
+        if self.count:
+            self._remap(self.count)
+            # Нулевой хвост - запас места после падения без закрытия, а не записи
+            empty = np.flatnonzero(self._view['timestamp'] == 0)
+            if len(empty):
+                self.count = int(empty[0])
+        self.last_timestamp: Optional[int] = int(self.records()[-1]['timestamp']) if self.count else None
+
+    def _remap(self, capacity: int):
+        # Старое отображение закроется, когда уйдут выданные из него срезы
+        mapped = mmap.mmap(self._file.fileno(), len(MAGIC) + capacity * CANDLE_DTYPE.itemsize,
+                           access=mmap.ACCESS_READ)
+        self._view = np.frombuffer(mapped, dtype=CANDLE_DTYPE, count=capacity, offset=len(MAGIC))
+        self.capacity = capacity
+        self.remaps += 1
+
+    def append(self, candle: Candle) -> bool:
+        """Дописывает свечу, если она новее последней"""
+        if self.last_timestamp is not None and candle.timestamp <= self.last_timestamp:
+            return False
+        if self.count == self.capacity:
+            capacity = self.count + GROW_RECORDS
+            self._file.truncate(len(MAGIC) + capacity * CANDLE_DTYPE.itemsize)
+            self._remap(capacity)
+        record = np.array([(candle.timestamp, candle.open, candle.high, candle.low,
+                            candle.close, candle.volume)], dtype=CANDLE_DTYPE)
+        # Запись через файл видна в общем отображении сразу
+        self._file.seek(len(MAGIC) + self.count * CANDLE_DTYPE.itemsize)
+        self._file.write(record.tobytes())
+        self._file.flush()
+        self.count += 1
+        self.last_timestamp = candle.timestamp
+        return True
+
+    def records(self) -> np.ndarray:
+        """Все записи как представление поверх mmap"""
+        if not self.count:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return self._view[:self.count]
+
+    def range(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """Свечи с открытием в [start, end) за O(log n)"""
+        records = self.records()
+        timestamps = records['timestamp']
+        low = 0 if start is None else int(np.searchsorted(timestamps, start, 'left'))
+        high = len(records) if end is None else int(np.searchsorted(timestamps, end, 'left'))
+        return records[low:high]
+
+    def close(self):
+        # Выданные срезы не выходят за count, отрезанный запас они не задевают
+        if self.writable:
+            self._file.truncate(len(MAGIC) + self.count * CANDLE_DTYPE.itemsize)
+        self._view = None
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+class CandleStore:
+    """Локальная история свечей: файл на (символ, таймфрейм) в каталоге root.
+    Пока хранилище не открыто, дозапись ничего не делает. Чтение файлов не создает.
+    writable=False - чтение хранилища, которое дописывает другой процесс (выгрузка, реплей)"""
+
+    def __init__(self):
+        self.root: Optional[str] = None
+        self.writable = True
+        self.series_by_key: Dict[Tuple[str, str], CandleSeries] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    def open(self, root: str, writable: bool = True):
+        if writable:
+            os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.writable = writable
+        logger.info(f"🗄️ Хранилище свечей: {root}")
+
+    def close(self):
+        for series in self.series_by_key.values():
+            series.close()
+        self.series_by_key.clear()
+        self.root = None
+
+    def series(self, symbol: str, timeframe: str, create: bool = True) -> Optional[CandleSeries]:
+        """Ряд (символ, таймфрейм); create=False - None, если файла еще нет"""
+        if self.root is None:
+            return None
+        series = self.series_by_key.get((symbol, timeframe))
+        if series is None:
+            path = os.path.join(self.root, f"{symbol}_{timeframe}.candles")
+            if not (create and self.writable) and not os.path.exists(path):
+                return None
+            series = self.series_by_key[(symbol, timeframe)] = CandleSeries(path, self.writable)
+        return series
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """Все ряды на диске: (символ, таймфрейм)"""
+        if self.root is None or not os.path.isdir(self.root):
+            return []
+        names = sorted(name[:-len('.candles')] for name in os.listdir(self.root) if name.endswith('.candles'))
+        return [tuple(name.rsplit('_', 1)) for name in names]
+
+    def append(self, symbol: str, timeframe: str, candle: Candle) -> bool:
+        series = self.series(symbol, timeframe)
+        if series is None or not series.writable:
+            return False
+        try:
+            appended = series.append(candle)
+        except OSError as e:
+            logger.error(f"Ошибка записи свечи {symbol} {timeframe}: {e}")
+            return False
+        if appended:
+            stored_candles.inc(timeframe)
+        return appended
+
+    def range(self, symbol: str, timeframe: str, start: Optional[int] = None,
+              end: Optional[int] = None) -> np.ndarray:
+        series = self.series(symbol, timeframe, create=False)
+        return series.range(start, end) if series is not None else np.empty(0, dtype=CANDLE_DTYPE)
+
+    def candles(self, symbol: str, timeframe: str, start: Optional[int] = None,
+                end: Optional[int] = None, limit: Optional[int] = None) -> List[Candle]:
+        """Свечи диапазона как модели Candle (limit - последние N)"""
+        records = self.range(symbol, timeframe, start, end)
+        if limit is not None:
+            records = records[len(records) - min(limit, len(records)):]
+        return [Candle(float(r['open']), float(r['high']), float(r['low']), float(r['close']),
+                       float(r['volume']), int(r['timestamp'])) for r in records]
+
+# Глобальный экземпляр
+candle_store = CandleStore()
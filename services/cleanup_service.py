@@ -0,0 +1,96 @@
+# cleanup_service.py
+import asyncio
+import logging
+from typing import Dict, Iterable, List
+
+from config import bot
+
+logger = logging.getLogger(__name__)
+
+class CleanupService:
+    """Пакетное удаление сообщений через deleteMessages"""
+
+    def __init__(self, batch_size: int = 100, flush_delay: float = 0.5,
+                 max_known_per_chat: int = 500):
+        self.batch_size = batch_size  # Лимит Bot API на один deleteMessages
+        self.flush_delay = flush_delay
+        self.max_known_per_chat = max_known_per_chat
+        # Сообщения, которые точно существуют (dict хранит порядок отправки)
+        self.known_messages: Dict[int, Dict[int, None]] = {}
+        self.pending: Dict[int, set] = {}  # Отложенные удаления по чатам
+        self._flush_task = None
+
+    def track(self, chat_id: int, message_id: int):
+        """Запоминает отправленное сообщение как существующее"""
+        known = self.known_messages.setdefault(chat_id, {})
+        known[message_id] = None
+        if len(known) > self.max_known_per_chat:
+            # Самое старое сообщение, старше 48ч его всё равно нельзя удалить
+            del known[next(iter(known))]
+
+    def forget(self, chat_id: int, message_ids: Iterable[int] = None):
+        """Убирает сообщения (или весь чат) из учета"""
+        if message_ids is None:
+            self.known_messages.pop(chat_id, None)
+            self.pending.pop(chat_id, None)
+            return
+        known = self.known_messages.get(chat_id)
+        if known is None:
+            return
+        for message_id in message_ids:
+            known.pop(message_id, None)
+        if not known:
+            del self.known_messages[chat_id]
+
+    def schedule(self, chat_id: int, message_ids: Iterable[int]):
+        """Откладывает удаление, чтобы собрать сообщения в пакет"""
+        self.pending.setdefault(chat_id, set()).update(message_ids)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        # Удаления, запланированные во время flush, забираем в этой же задаче
+        while self.pending:
+            await self.flush()
+
+    async def flush(self):
+        """Удаляет все отложенные сообщения"""
+        pending, self.pending = self.pending, {}
+        for chat_id, message_ids in pending.items():
+            await self.delete(chat_id, message_ids)
+
+    async def delete(self, chat_id: int, message_ids: Iterable[int]) -> int:
+        """Удаляет сообщения пакетами до batch_size штук"""
+        ids: List[int] = sorted(set(message_ids))
+        if not ids:
+            return 0
+
+        deleted = 0
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            try:
+                # Лимит запросов применяет OutboundMiddleware сессии бота
+                if len(batch) == 1:
+                    await bot.delete_message(chat_id=chat_id, message_id=batch[0])
+                else:
+                    await bot.delete_messages(chat_id=chat_id, message_ids=batch)
+                deleted += len(batch)
+            except Exception as e:
+                logger.debug(f"Не получилось удалить сообщения {batch[0]}..{batch[-1]}: {e}")
+            self.forget(chat_id, batch)
+
+        return deleted
+
+    async def delete_range(self, chat_id: int, start_id: int, end_id: int,
+                           only_known: bool = False) -> int:
+        """Удаляет все сообщения диапазона, включая сообщения пользователя (only_known - только отправленные ботом)"""
+        if only_known:
+            known = self.known_messages.get(chat_id, {})
+            ids = [message_id for message_id in known if start_id <= message_id <= end_id]
+        else:
+            ids = range(start_id, end_id + 1)
+        return await self.delete(chat_id, ids)
+
+# Глобальный экземпляр сервиса очистки
+cleanup_service = CleanupService()
@@ -0,0 +1,81 @@
+# clock.py
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Callable, List, Optional
+
+class SystemClock:
+    """Реальные часы: time.time() и asyncio.sleep"""
+
+    real = True
+
+    def time(self) -> float:
+        return time.time()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+class VirtualClock:
+    """Виртуальные часы для реплея: время прыгает к ближайшему пробуждению,
+    как только все участвующие задачи уснули"""
+
+    real = False
+
+    def __init__(self, start: float):
+        self.now = start
+        self.on_advance: Optional[Callable[[float], None]] = None
+        self._sleepers: List = []  # Куча (срок, порядковый номер, future)
+        self._seq = itertools.count()
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + seconds, next(self._seq), future))
+        await future
+
+    @property
+    def sleeping(self) -> int:
+        """Число задач, ожидающих виртуального времени"""
+        return sum(1 for _, _, future in self._sleepers if not future.done())
+
+    def next_deadline(self) -> Optional[float]:
+        """Ближайший срок пробуждения"""
+        while self._sleepers and self._sleepers[0][2].done():
+            heapq.heappop(self._sleepers)
+        return self._sleepers[0][0] if self._sleepers else None
+
+    def advance(self) -> bool:
+        """Переводит время на ближайший срок и будит всех, у кого он наступил"""
+        if self.next_deadline() is None:
+            return False
+
+        self.now = max(self.now, self._sleepers[0][0])
+        if self.on_advance:
+            self.on_advance(self.now)
+        while self._sleepers and self._sleepers[0][0] <= self.now:
+            _, _, future = heapq.heappop(self._sleepers)
+            if not future.done():
+                future.set_result(None)
+        return True
+
+    async def run(self, tasks: List[asyncio.Task], until: float, poll: float = 0.0005):
+        """Двигает время, пока живы задачи и есть пробуждения не позже until.
+        Возвращается, когда все задачи снова уснули после последнего шага"""
+        while True:
+            alive = [task for task in tasks if not task.done()]
+            if not alive:
+                break
+            # Ждем реальным временем, пока все задачи не дойдут до sleep
+            if self.sleeping < len(alive):
+                await asyncio.sleep(poll)
+                continue
+            deadline = self.next_deadline()
+            if deadline is None or deadline > until:
+                break
+            self.advance()
@@ -0,0 +1,177 @@
+# diagnostics.py
+import asyncio
+import logging
+import sys
+import tracemalloc
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+cleanup_leaks = metrics.counter('analysis_cleanup_leaks_total',
+                                "Данные пользователя, пережившие cleanup_user_analysis", ('registry',))
+
+def approx_size(obj, limit: int = 100000) -> int:
+    """Примерный размер объекта с содержимым (обходит не больше limit объектов)"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        # Внутренности задач и корутин принадлежат event loop, не реестру
+        if isinstance(current, (asyncio.Task, asyncio.Future, type)):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, '__dict__'):
+            stack.append(vars(current))
+        elif hasattr(current, '__slots__'):
+            stack.extend(getattr(current, name) for name in current.__slots__ if hasattr(current, name))
+    return total
+
+def registry_size(registry) -> int:
+    """Объем содержимого реестра (представления сессий меряются по значениям)"""
+    if isinstance(registry, (dict, set)):
+        return approx_size(registry)
+    if isinstance(registry, Mapping):
+        return approx_size(dict(registry))
+    return approx_size(set(registry))
+
+def _analysis_registries() -> Dict[str, Callable[[], object]]:
+    """Реестры, которые cleanup_user_analysis обязан очистить"""
+    from services.analysis_service import analysis_service
+    from services.progress_service import progress_service
+
+    return {
+        'analysis.subscriptions': lambda: analysis_service.subscriptions.by_user,
+        'analysis.profiles': lambda: analysis_service.profiles.by_user,
+        'analysis.progress_managers': lambda: analysis_service.progress_managers,
+        'analysis.active_analyses': lambda: analysis_service.active_analyses,
+        'analysis.last_prices': lambda: analysis_service.last_prices,
+        'analysis.user_tasks': lambda: analysis_service.user_tasks,
+        'analysis.user_timeframes': lambda: analysis_service.user_timeframes,
+        'progress.progress_tasks': lambda: progress_service.progress_tasks,
+        'progress.progress_messages': lambda: progress_service.progress_messages,
+    }
+
+def _all_registries() -> Dict[str, Callable[[], object]]:
+    from services.cleanup_service import cleanup_service
+    from services.profile_service import profile_service
+    from services.alert_service import alert_service
+    from services.session_service import session_service, running_analyses, subscribed_users
+    from services.state_service import state_service
+    from services.time_utils import timezone_service
+    from services.trade_calculator import trade_calculator
+
+    registries = {
+        'session.sessions': lambda: session_service.sessions,
+        'state.user_navigation_ids': lambda: state_service.user_navigation_ids,
+        'state.user_states': lambda: state_service.user_states,
+        'state.user_last_activity': lambda: state_service.user_last_activity,
+        'state.user_calculation_data': lambda: state_service.user_calculation_data,
+        'trade_calculator.user_data': lambda: trade_calculator.user_data,
+        'timezone.user_timezones': lambda: timezone_service.user_timezones,
+        'profiles.user_profiles': lambda: profile_service.user_profiles,
+        'alerts.user_alerts': lambda: alert_service.user_alerts,
+        'cleanup.known_messages': lambda: cleanup_service.known_messages,
+        'cleanup.pending': lambda: cleanup_service.pending,
+        'session.running_analyses': lambda: running_analyses,
+        'session.subscribed_users': lambda: subscribed_users,
+    }
+    registries.update(_analysis_registries())
+    return registries
+
+class MemoryDiagnostics:
+    """Размеры реестров по пользователям и дифф снимков tracemalloc"""
+
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    def registry_sizes(self, with_bytes: bool = True) -> Dict[str, Dict[str, int]]:
+        """Число записей и примерный объем каждого реестра"""
+        sizes = {}
+        for name, get in _all_registries().items():
+            registry = get()
+            sizes[name] = {'entries': len(registry)}
+            if with_bytes:
+                sizes[name]['bytes'] = registry_size(registry)
+        return sizes
+
+    def entries_gauge(self) -> Dict[tuple, int]:
+        return {(name,): stats['entries'] for name, stats in self.registry_sizes(with_bytes=False).items()}
+
+    def survivors(self, user_id: int) -> List[str]:
+        """Реестры анализа, в которых пользователь остался после очистки"""
+        return [name for name, get in _analysis_registries().items() if user_id in get()]
+
+    def check_cleanup(self, user_id: int) -> List[str]:
+        """Вызывается в конце cleanup_user_analysis"""
+        leftovers = self.survivors(user_id)
+        for name in leftovers:
+            cleanup_leaks.inc(name)
+        if leftovers:
+            logger.warning(f"⚠️ После очистки анализа user {user_id} остался в: {', '.join(leftovers)}")
+        return leftovers
+
+    def stale_users(self) -> Dict[str, List[int]]:
+        """Пользователи, которых уже нет в state_service, но есть в других реестрах"""
+        from services.state_service import state_service
+
+        active = state_service.user_last_activity
+        stale = {}
+        for name, get in _all_registries().items():
+            if name.startswith(('state.', 'session.')):
+                continue
+            users = [user_id for user_id in get() if user_id not in active]
+            if users:
+                stale[name] = users[:50]
+        return stale
+
+    @staticmethod
+    def start_tracing(frames: int = 10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def snapshot_diff(self, limit: int = 15) -> List[str]:
+        """Рост памяти по местам выделения с прошлого снимка"""
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        previous, self._previous = self._previous, snapshot
+        if previous is None:
+            stats = snapshot.statistics('lineno')
+        else:
+            stats = snapshot.compare_to(previous, 'lineno')
+        return [str(stat) for stat in stats[:limit]]
+
+    def report(self) -> dict:
+        return {
+            'registries': self.registry_sizes(),
+            'stale_users': self.stale_users(),
+            'tracemalloc': self.snapshot_diff(),
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """GET /debug/memory рядом с /metrics"""
+        return web.json_response(self.report())
+
+# Глобальный экземпляр
+memory_diagnostics = MemoryDiagnostics()
+
+metrics.gauge('registry_entries', "Число записей в реестрах по пользователям", ('registry',),
+              memory_diagnostics.entries_gauge)
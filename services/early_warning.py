@@ -0,0 +1,132 @@
+# early_warning.py
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from config import EARLY_WARNING_INTERVAL
+from services.metrics import metrics
+from services.models import Candle
+from services.quantile_sketch import body_size_stats
+from services.session_service import session_service
+
+logger = logging.getLogger(__name__)
+
+early_warnings = metrics.counter('early_warnings_total', "Предварительные сигналы и их исход", ('outcome',))
+
+class EarlyWarningService:
+    """Предупреждения о формирующемся ордерблоке до закрытия свечи.
+    Одна проверка на группу (символ, таймфрейм), цена символа опрашивается не чаще interval"""
+
+    def __init__(self, interval: float = 60, min_gap: float = 300):
+        self.interval = interval
+        self.min_gap = min_gap  # Пауза между предупреждениями по одному символу
+        self.users = session_service.flag_view('early_warning')  # Кто включил режим
+        # Отправленные предупреждения текущей свечи: группа → (сигнал, получатели)
+        self.pending: Dict[Tuple[str, str], Tuple[str, List[int]]] = {}
+        self._prices: Dict[str, Tuple[float, float]] = {}  # Символ → (время опроса, цена)
+        self._last_warning: Dict[str, float] = {}
+
+    def wanted(self, symbol: str, timeframe: str) -> bool:
+        from services.analysis_service import analysis_service
+        return any(user_id in self.users for user_id in analysis_service.subscriptions.recipients(symbol, timeframe))
+
+    async def current_price(self, symbol: str) -> Optional[float]:
+        """Цена символа, общая для всех таймфреймов в пределах interval"""
+        from services.analysis_service import analysis_service
+
+        now = analysis_service.time_service.clock.time()
+        polled = self._prices.get(symbol)
+        if polled is not None and now - polled[0] < self.interval:
+            return polled[1]
+        # Общий кэш котировок живет дольше interval - берем из него только свежее
+        data = await analysis_service.fetch_price(symbol, max_age=self.interval)
+        if not data:
+            return None
+        price = float(data.indicators.get('close', 0))
+        self._prices[symbol] = (now, price)
+        return price
+
+    async def watch(self, symbol: str, timeframe: str, prev_candle: Candle):
+        """Опрос формирующейся свечи до отмены задачи (в момент закрытия)"""
+        from services.analysis_service import analysis_service
+
+        time_service = analysis_service.time_service
+        threshold = body_size_stats.threshold(symbol, timeframe)
+        forming: Optional[Candle] = None
+        try:
+            while True:
+                await time_service.sleep(self.interval)
+                price = await self.current_price(symbol)
+                if price is None:
+                    continue
+                if forming is None:
+                    # Открытие формирующейся свечи - закрытие предыдущей
+                    forming = Candle(prev_candle.close, max(prev_candle.close, price),
+                                     min(prev_candle.close, price), price, 0, int(time_service.clock.time() * 1000))
+                else:
+                    forming.high, forming.low, forming.close = max(forming.high, price), min(forming.low, price), price
+
+                if (symbol, timeframe) in self.pending:
+                    continue  # Одно предупреждение на свечу
+                signal = analysis_service.analyze_order_block(prev_candle, forming, threshold)
+                if signal and self._allowed(symbol, time_service.clock.time()):
+                    await self.warn(symbol, timeframe, signal, prev_candle, forming)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"❌ Ошибка раннего предупреждения {symbol} {timeframe}: {e}")
+
+    def _allowed(self, symbol: str, now: float) -> bool:
+        last = self._last_warning.get(symbol)
+        if last is not None and now - last < self.min_gap:
+            early_warnings.inc('throttled')
+            return False
+        self._last_warning[symbol] = now
+        return True
+
+    def recipients(self, symbol: str, timeframe: str, signal: str, price: float) -> List[int]:
+        from services.analysis_service import analysis_service
+        return [user_id for user_id in analysis_service.profiles.match(symbol, timeframe, signal, price)
+                if user_id in self.users and analysis_service.active_analyses.get(user_id, False)]
+
+    async def warn(self, symbol: str, timeframe: str, signal: str, prev_candle: Candle, forming: Candle):
+        from services.analysis_service import analysis_service
+        from services.message_utils import escape_markdown
+
+        recipients = self.recipients(symbol, timeframe, signal, forming.close)
+        self.pending[(symbol, timeframe)] = (signal, recipients)
+        if not recipients:
+            return
+        early_warnings.inc('sent')
+        block_type = "Бычий ордерблок" if signal == 'buy' else "Медвежий ордерблок"
+        text = (
+            f"⏳ *{escape_markdown(symbol)} - формируется {escape_markdown(block_type.lower())}* "
+            f"(x{forming.body_size / prev_candle.body_size:.1f})\n"
+            f"• Таймфрейм: {escape_markdown(timeframe)}\n"
+            f"• Цена: {forming.close:.2f}\n"
+            f"\nСвеча еще не закрыта - подтверждение придет на закрытии"
+        )
+        await asyncio.gather(*(analysis_service.safe_send_message(user_id, text, parse_mode="Markdown")
+                               for user_id in recipients))
+
+    async def resolve(self, symbol: str, timeframe: str, signal: Optional[str]):
+        """Итог на закрытии: подтверждение или отмена для тех, кто получил предупреждение"""
+        from services.analysis_service import analysis_service
+
+        pending = self.pending.pop((symbol, timeframe), None)
+        if pending is None:
+            return
+        warned, recipients = pending
+        confirmed = signal == warned
+        early_warnings.inc('confirmed' if confirmed else 'cancelled')
+        if not recipients:
+            return
+        text = (f"✅ {symbol} {timeframe}: ордерблок подтвержден закрытием" if confirmed
+                else f"❌ {symbol} {timeframe}: предупреждение отменено - свеча закрылась без ордерблока")
+        await asyncio.gather(*(analysis_service.safe_send_message(user_id, text) for user_id in recipients))
+
+    def discard(self, symbol: str, timeframe: str):
+        self.pending.pop((symbol, timeframe), None)
+
+# Глобальный экземпляр
+early_warning_service = EarlyWarningService(EARLY_WARNING_INTERVAL)
@@ -0,0 +1,111 @@
+# expiry_service.py
+import asyncio
+import heapq
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from services.cleanup_service import cleanup_service
+from services.metrics import metrics
+from services.session_service import session_service, UserSession
+
+logger = logging.getLogger(__name__)
+
+sessions_expired = metrics.counter('sessions_expired_total', "Сессии, выгруженные по неактивности", ('mode',))
+
+class ExpiryService:
+    """Индекс истечения сессий: min-heap по сроку неактивности.
+    Срок в куче может устареть - при извлечении сверяемся с last_activity
+    и переставляем пользователя, так что touch стоит O(1)"""
+
+    def __init__(self, inactive_time: float = 3600, budget: int = 200, interval: float = 1.0):
+        self.inactive_time = inactive_time
+        self.budget = budget  # Сколько сессий разбирать за один шаг
+        self.interval = interval
+        self._heap: List[Tuple[float, int]] = []
+        self._scheduled: set = set()
+        self._expiring: Optional[int] = None
+
+    def track(self, user_id: int, now: Optional[float] = None):
+        """Ставит пользователя в индекс, если его там еще нет"""
+        if user_id in self._scheduled:
+            return
+        self._scheduled.add(user_id)
+        heapq.heappush(self._heap, ((time.time() if now is None else now) + self.inactive_time, user_id))
+
+    def on_change(self, user_id: int, field: Optional[str]):
+        """Подписка на изменения сессий: любая новая сессия попадает в индекс"""
+        if field is not None and user_id != self._expiring:
+            self.track(user_id)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def evict_expired(self, now: Optional[float] = None, budget: Optional[int] = None) -> int:
+        """Разбирает не больше budget истекших записей, возвращает число выгруженных"""
+        now = time.time() if now is None else now
+        budget = self.budget if budget is None else budget
+        evicted = 0
+        while self._heap and self._heap[0][0] <= now and budget > 0:
+            budget -= 1
+            _, user_id = heapq.heappop(self._heap)
+            session = session_service.get(user_id)
+            if session is None:
+                self._scheduled.discard(user_id)
+                continue
+            last = session.last_activity
+            if last is not None and last + self.inactive_time > now:
+                # Пользователь был активен - переносим срок
+                heapq.heappush(self._heap, (last + self.inactive_time, user_id))
+                continue
+            self._scheduled.discard(user_id)
+            self.expire(session)
+            evicted += 1
+        return evicted
+
+    def expire(self, session: UserSession):
+        """Освобождает все данные неактивного пользователя"""
+        from services.storage_service import persistence_service
+
+        user_id = session.user_id
+        self._expiring = user_id  # Собственные изменения не возвращают пользователя в индекс
+        try:
+            self._expire(session, persistence_service)
+        finally:
+            self._expiring = None
+        logger.info(f"Cleaned up inactive user: {user_id}")
+
+    @staticmethod
+    def _expire(session: UserSession, persistence_service):
+        user_id = session.user_id
+        cleanup_service.forget(user_id)
+        running = (session.analysis_active, session.analysis_task, session.progress_task)
+        if any(handle is not None for handle in running):
+            # Анализ продолжает работать - сбрасываем только интерфейс
+            session_service.clear_fields(user_id, UserSession.INTERACTION_FIELDS)
+            sessions_expired.inc('interaction')
+        elif persistence_service.enabled:
+            # Настройки остаются в SQLite и загрузятся при следующем апдейте
+            session_service.clear_fields(user_id, UserSession.INTERACTION_FIELDS)
+            persistence_service.unload(user_id)
+            session_service.drop(user_id, notify=False)
+            sessions_expired.inc('unloaded')
+        else:
+            # Без хранилища настройки живут только в памяти - их не трогаем
+            session_service.clear_fields(user_id, UserSession.INTERACTION_FIELDS + ('trade_data',))
+            sessions_expired.inc('interaction')
+
+    async def run(self):
+        """Фоновая выгрузка небольшими порциями"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.evict_expired()
+            except Exception as e:
+                logger.error(f"Ошибка выгрузки неактивных сессий: {e}")
+
+# Глобальный экземпляр
+expiry_service = ExpiryService()
+session_service.listeners.append(expiry_service.on_change)
+
+metrics.gauge('expiry_index_size', "Записи в индексе истечения сессий", (), lambda: {(): len(expiry_service)})
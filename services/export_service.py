@@ -0,0 +1,220 @@
+# export_service.py
+"""Выгрузка свечей и журнала сигналов в сжатые колоночные файлы для офлайн-анализа.
+
+Раскладка: root/<набор>/symbol=X/timeframe=Y/month=YYYY-MM/part-NNNNN.npz,
+колонка - отдельный массив в архиве, время хранится разностями.
+Запуск: python -m services.export_service data/export --store data/candles --journal 'data/signals.jsonl*'
+"""
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = '_manifest.json'
+MAX_PARTS = 16  # Больше частей в месяце - склеиваются в одну
+SIGNAL_TYPES = {'buy': 1, 'sell': -1}
+OUTCOME_TYPES = {'tp': 1, 'sl': -1, 'expired': 0}
+
+Key = Tuple[str, str]  # (символ, таймфрейм)
+
+def _month(timestamp_ms: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, datetime.timezone.utc).strftime('%Y-%m')
+
+def _sorted(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Строки по времени (устойчиво); уже упорядоченные не копируются"""
+    timestamps = columns['timestamp']
+    if len(timestamps) < 2 or not np.any(timestamps[1:] < timestamps[:-1]):
+        return columns
+    order = np.argsort(timestamps, kind='stable')
+    return {name: values[order] for name, values in columns.items()}
+
+def _encode(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    encoded = dict(columns)
+    # Шаг времени почти постоянный - разности сжимаются в несколько байт на месяц
+    encoded['timestamp'] = np.diff(columns['timestamp'], prepend=np.int64(0))
+    return encoded
+
+class ColumnarExporter:
+    """Инкрементальная выгрузка: манифест хранит последнее выгруженное время по ключу
+    (для журналов воркеров - по каждому файлу-источнику) и границы каждой части,
+    чтение отбрасывает части по ключу и времени до распаковки"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest: Dict[str, Dict[str, dict]] = {}
+        path = os.path.join(root, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.manifest = json.load(file)
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.manifest, file)
+        os.replace(path + '.tmp', path)
+
+    def append(self, dataset: str, key: Key, columns: Dict[str, np.ndarray], source: Optional[str] = None) -> int:
+        """Дописывает строки новее уже выгруженных, по части на затронутый месяц.
+        source - файл, из которого строки: у каждого источника своя граница выгруженного"""
+        symbol, timeframe = key
+        entry = self.manifest.setdefault(dataset, {}).setdefault(f"{symbol}/{timeframe}", {'last': None, 'parts': []})
+        sources = entry.setdefault('sources', {}) if source is not None else None
+        last = entry['last'] if source is None else sources.get(source)
+        timestamps = columns['timestamp']
+        if last is not None:
+            fresh = timestamps > last
+            columns = {name: values[fresh] for name, values in columns.items()}
+            timestamps = columns['timestamp']
+        if not len(timestamps):
+            return 0
+
+        # Границы месяцев ищутся по началам дней, а не по каждой строке
+        day_starts = np.r_[0, np.flatnonzero(np.diff(timestamps // 86400000)) + 1]
+        months = [_month(int(timestamps[index])) for index in day_starts]
+        bounds = [int(day_starts[i]) for i in range(len(months)) if i == 0 or months[i] != months[i - 1]]
+        bounds.append(len(timestamps))
+        for start, end in zip(bounds, bounds[1:]):
+            part = {name: values[start:end] for name, values in columns.items()}
+            self._write_part(dataset, key, entry, _month(int(part['timestamp'][0])), part)
+        if source is None:
+            entry['last'] = int(timestamps[-1])
+        else:
+            sources[source] = int(timestamps[-1])
+            entry['last'] = max(entry['last'] or 0, sources[source])
+        self._save_manifest()
+        return len(timestamps)
+
+    def _directory(self, dataset: str, key: Key, month: str) -> str:
+        return os.path.join(self.root, dataset, f"symbol={key[0]}", f"timeframe={key[1]}", f"month={month}")
+
+    def _write_part(self, dataset: str, key: Key, entry: dict, month: str, columns: Dict[str, np.ndarray]):
+        directory = self._directory(dataset, key, month)
+        os.makedirs(directory, exist_ok=True)
+        parts = [part for part in entry['parts'] if part['month'] == month]
+        if len(parts) >= MAX_PARTS:
+            # Склейка частей месяца, чтобы чтение не открывало сотни мелких файлов
+            merged = self._load_parts(parts, list(columns))
+            columns = _sorted({name: np.concatenate([merged[name], values]) for name, values in columns.items()})
+            for part in parts:
+                os.remove(os.path.join(self.root, part['path']))
+            entry['parts'] = [part for part in entry['parts'] if part['month'] != month]
+        sequence = max((part['seq'] for part in entry['parts'] if part['month'] == month), default=-1) + 1
+        path = os.path.join(directory, f"part-{sequence:05d}.npz")
+        np.savez_compressed(path, **_encode(columns))
+        timestamps = columns['timestamp']
+        entry['parts'].append({
+            'month': month, 'seq': sequence, 'path': os.path.relpath(path, self.root),
+            'min': int(timestamps.min()), 'max': int(timestamps.max()), 'rows': len(timestamps),
+        })
+
+    def _load_parts(self, parts: List[dict], columns: Optional[Iterable[str]]) -> Dict[str, np.ndarray]:
+        loaded: Dict[str, List[np.ndarray]] = {}
+        for part in parts:
+            with np.load(os.path.join(self.root, part['path'])) as archive:
+                # Архив распаковывает только запрошенные колонки
+                for name in (columns or archive.files):
+                    values = archive[name]
+                    loaded.setdefault(name, []).append(np.cumsum(values) if name == 'timestamp' else values)
+        return {name: np.concatenate(chunks) for name, chunks in loaded.items()}
+
+    def read(self, dataset: str, columns: Optional[List[str]] = None, symbols: Optional[Iterable[str]] = None,
+             timeframes: Optional[Iterable[str]] = None, start: Optional[int] = None,
+             end: Optional[int] = None) -> Dict[Key, Dict[str, np.ndarray]]:
+        """Колонки по ключам с фильтром по символу, таймфрейму и времени открытия [start, end)"""
+        symbols = set(symbols) if symbols is not None else None
+        timeframes = set(timeframes) if timeframes is not None else None
+        if columns is not None and 'timestamp' not in columns:
+            columns = ['timestamp'] + list(columns)
+        result = {}
+        for name, entry in self.manifest.get(dataset, {}).items():
+            symbol, timeframe = name.split('/')
+            if (symbols is not None and symbol not in symbols) or (timeframes is not None and timeframe not in timeframes):
+                continue
+            parts = [part for part in entry['parts']
+                     if (start is None or part['max'] >= start) and (end is None or part['min'] < end)]
+            if not parts:
+                continue
+            parts.sort(key=lambda part: part['min'])
+            # Части разных источников перекрываются по времени
+            data = _sorted(self._load_parts(parts, columns))
+            timestamps = data['timestamp']
+            low = 0 if start is None else int(np.searchsorted(timestamps, start, 'left'))
+            high = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, 'left'))
+            result[(symbol, timeframe)] = {column: values[low:high] for column, values in data.items()}
+        return result
+
+    def export_candles(self, store) -> int:
+        """Все ряды хранилища свечей (CandleStore) - только новые строки"""
+        rows = 0
+        for symbol, timeframe in store.keys():
+            records = store.range(symbol, timeframe)
+            rows += self.append('candles', (symbol, timeframe),
+                                {name: np.ascontiguousarray(records[name]) for name in records.dtype.names})
+        return rows
+
+    def export_signals(self, entries: Iterable[dict], source: Optional[str] = None) -> int:
+        """Журнал сигналов: сигналы и их исходы - два набора по ключу (символ, таймфрейм).
+        source - имя файла журнала, у журналов воркеров граница выгруженного своя"""
+        signals: Dict[Key, List[dict]] = {}
+        outcomes: Dict[Key, List[dict]] = {}
+        for entry in entries:
+            target = outcomes if 'outcome' in entry else signals
+            target.setdefault((entry['symbol'], entry['timeframe']), []).append(entry)
+        rows = 0
+        for key, group in signals.items():
+            group.sort(key=lambda signal: (signal['time'], signal['id']))
+            rows += self.append('signals', key, {
+                'timestamp': np.array([signal['time'] for signal in group], dtype=np.int64),
+                'id': np.array([signal['id'] for signal in group], dtype=np.int64),
+                'direction': np.array([SIGNAL_TYPES[signal['type']] for signal in group], dtype=np.int8),
+                'price': np.array([signal['price'] for signal in group]),
+                'low': np.array([signal['low'] for signal in group]),
+                'high': np.array([signal['high'] for signal in group]),
+            }, source)
+        for key, group in outcomes.items():
+            group.sort(key=lambda outcome: (outcome['time'], outcome['id']))
+            rows += self.append('outcomes', key, {
+                'timestamp': np.array([outcome['time'] for outcome in group], dtype=np.int64),
+                'id': np.array([outcome['id'] for outcome in group], dtype=np.int64),
+                'result': np.array([OUTCOME_TYPES[outcome['outcome']] for outcome in group], dtype=np.int8),
+                'price': np.array([np.nan if outcome['price'] is None else outcome['price'] for outcome in group]),
+            }, source)
+        return rows
+
+def main(argv=None) -> int:
+    from services.candle_store import CandleStore
+    from services.signal_journal import SignalJournal
+
+    parser = argparse.ArgumentParser(description="Выгрузка свечей и сигналов в колоночные архивы")
+    parser.add_argument('root', help="Каталог выгрузки")
+    parser.add_argument('--store', action='append', default=[], help="Каталог хранилища свечей (можно несколько)")
+    parser.add_argument('--journal', action='append', default=[], help="Журнал сигналов (можно маску)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    exporter = ColumnarExporter(args.root)
+    for root in args.store:
+        store = CandleStore()
+        store.open(root, writable=False)
+        try:
+            logger.info(f"Свечей выгружено из {root}: {exporter.export_candles(store)}")
+        finally:
+            store.close()
+    for pattern in args.journal:
+        for path in sorted(glob.glob(pattern)):
+            if path.endswith(('.checkpoint', '.tmp')):
+                continue  # Контрольные точки журналов - не записи
+            rows = exporter.export_signals(SignalJournal().read(path), source=os.path.basename(path))
+            logger.info(f"Сигналов выгружено из {path}: {rows}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
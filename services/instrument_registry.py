@@ -0,0 +1,81 @@
+# instrument_registry.py
+import csv
+import logging
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from config import INSTRUMENTS_PATH
+from services.models import Instrument
+from services.moex_service import moex_service
+from services.price_service import tradingview_service
+
+logger = logging.getLogger(__name__)
+
+# Провайдер котировок по инструменту: объект с async get_price(symbol)
+PROVIDERS: Dict[str, Callable[[Instrument], object]] = {
+    'tradingview': lambda instrument: tradingview_service(instrument.screener, instrument.exchange),
+    'moex': moex_service.register,
+}
+
+class InstrumentRegistry:
+    """База инструментов, загруженная один раз в словари: символ → инструмент и символ → провайдер.
+    Маршрутизация и точность калькулятора - один поиск по хэшу, сколько бы инструментов ни было"""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.instruments: Dict[str, Instrument] = {}
+        self.routes: Dict[str, object] = {}
+        self._symbols: Tuple[str, ...] = ()
+
+    def load(self, path: str) -> int:
+        """Читает CSV (symbol,provider,screener,exchange,tick_size,lot_step,min_notional).
+        Строки с ошибкой и неизвестным провайдером пропускаются с предупреждением"""
+        instruments: Dict[str, Instrument] = {}
+        routes: Dict[str, object] = {}
+        with open(path, encoding='utf-8', newline='') as file:
+            for line, row in enumerate(csv.DictReader(file), start=2):
+                try:
+                    instrument = Instrument(
+                        row['symbol'].strip().upper(), row['provider'].strip(), row['screener'].strip(),
+                        row['exchange'].strip(), float(row['tick_size']), float(row['lot_step']),
+                        float(row.get('min_notional') or 0),
+                    )
+                    if instrument.tick_size <= 0 or instrument.lot_step <= 0:
+                        raise ValueError("шаг цены и лота должен быть положительным")
+                    route = PROVIDERS[instrument.provider](instrument)
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    logger.warning(f"Инструменты {path}:{line} пропущены: {e}")
+                    continue
+                instruments[instrument.symbol] = instrument
+                routes[instrument.symbol] = route
+
+        self.path = path
+        self.instruments, self.routes = instruments, routes
+        self._symbols = tuple(instruments)
+        logger.info(f"📚 Инструменты: {len(instruments)} из {path}")
+        return len(instruments)
+
+    def get(self, symbol: str) -> Optional[Instrument]:
+        return self.instruments.get(symbol)
+
+    def provider(self, symbol: str):
+        """Провайдер котировок символа или None, если символа нет в базе"""
+        return self.routes.get(symbol)
+
+    def symbols(self) -> Tuple[str, ...]:
+        return self._symbols
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.instruments
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._symbols)
+
+    def __len__(self) -> int:
+        return len(self.instruments)
+
+# Глобальный экземпляр (загружается при импорте, один раз)
+instrument_registry = InstrumentRegistry()
+try:
+    instrument_registry.load(INSTRUMENTS_PATH)
+except OSError as e:
+    logger.error(f"База инструментов недоступна: {e}")
@@ -0,0 +1,155 @@
+# interval_index.py
+import bisect
+import math
+from typing import Dict, Hashable, List, Optional, Tuple
+
+Interval = Tuple[float, float, Hashable]  # (нижняя граница, верхняя граница, ключ)
+
+class _Node:
+    """Узел центрированного дерева: интервалы, содержащие center"""
+
+    __slots__ = ('center', 'by_low', 'lows', 'by_high', 'highs', 'left', 'right')
+
+    def __init__(self, center: float, intervals: List[Interval]):
+        self.center = center
+        self.by_low = sorted(intervals, key=lambda interval: interval[0])
+        self.lows = [interval[0] for interval in self.by_low]
+        self.by_high = sorted(intervals, key=lambda interval: -interval[1])
+        self.highs = [-interval[1] for interval in self.by_high]
+        self.left: Optional['_Node'] = None
+        self.right: Optional['_Node'] = None
+
+def _midpoint(interval: Interval) -> float:
+    low, high = interval[0], interval[1]
+    if math.isinf(low) and math.isinf(high):
+        return 0.0
+    if math.isinf(low):
+        return high
+    if math.isinf(high):
+        return low
+    return (low + high) / 2
+
+def _build(intervals: List[Interval]) -> Optional[_Node]:
+    """Сборка по списку, упорядоченному по середине интервала (порядок сохраняется в поддеревьях)"""
+    if not intervals:
+        return None
+    center = _midpoint(intervals[len(intervals) // 2])
+    here, left, right = [], [], []
+    for interval in intervals:
+        if interval[1] < center:
+            left.append(interval)
+        elif interval[0] > center:
+            right.append(interval)
+        else:
+            here.append(interval)
+    node = _Node(center, here)
+    node.left = _build(left)
+    node.right = _build(right)
+    return node
+
+def _query(node: Optional[_Node], low: float, high: float, found: List[Hashable]):
+    stack = [node] if node is not None else []
+    while stack:
+        node = stack.pop()
+        if high < node.center:
+            # Все интервалы узла доходят до center > high: нужна только нижняя граница
+            found.extend(interval[2] for interval in node.by_low[:bisect.bisect_right(node.lows, high)])
+            if node.left is not None:
+                stack.append(node.left)
+        elif low > node.center:
+            found.extend(interval[2] for interval in node.by_high[:bisect.bisect_right(node.highs, -low)])
+            if node.right is not None:
+                stack.append(node.right)
+        else:
+            found.extend(interval[2] for interval in node.by_low)
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+
+class IntervalIndex:
+    """Индекс интервалов: какие ключи содержат точку или пересекают отрезок за O(log² n + k).
+    Интервалы лежат в статических деревьях размеров buffer·2^i: вставка копит буфер и сливает
+    его с младшими деревьями (логарифмический метод), удаление только помечает запись"""
+
+    def __init__(self, buffer_size: int = 32):
+        self.buffer_size = buffer_size
+        self.intervals: Dict[Hashable, Tuple[float, float]] = {}
+        self._pending: Dict[Hashable, Tuple[float, float]] = {}
+        self._levels: List[Optional[_Node]] = []
+        self._level_keys: List[List[Hashable]] = []
+        self._location: Dict[Hashable, int] = {}  # Уровень, где лежит актуальная запись ключа
+        self._removed = 0  # Устаревшие записи в деревьях
+
+    def add(self, key: Hashable, low: Optional[float] = None, high: Optional[float] = None):
+        """Добавляет или заменяет интервал ключа (None - без ограничения с этой стороны)"""
+        low = -math.inf if low is None else low
+        high = math.inf if high is None else high
+        if low > high:
+            raise ValueError(f"Пустой интервал {low}-{high}")
+        self.remove(key)
+        self.intervals[key] = (low, high)
+        self._pending[key] = (low, high)
+        if len(self._pending) >= self.buffer_size:
+            self._carry()
+
+    def remove(self, key: Hashable) -> bool:
+        if self.intervals.pop(key, None) is None:
+            return False
+        if self._pending.pop(key, None) is None:
+            del self._location[key]
+            self._removed += 1
+            if self._removed > max(self.buffer_size, len(self.intervals)):
+                self.rebuild()
+        return True
+
+    def _carry(self):
+        """Сливает буфер с занятыми младшими уровнями в первый свободный"""
+        keys = list(self._pending)
+        self._pending.clear()
+        level = 0
+        while level < len(self._levels) and self._levels[level] is not None:
+            keys.extend(key for key in self._level_keys[level] if self._location.get(key) == level)
+            self._levels[level] = None
+            self._level_keys[level] = []
+            level += 1
+        if level == len(self._levels):
+            self._levels.append(None)
+            self._level_keys.append([])
+        self._place(level, keys)
+
+    def _place(self, level: int, keys: List[Hashable]):
+        intervals = sorted(((*self.intervals[key], key) for key in keys), key=_midpoint)
+        self._levels[level] = _build(intervals)
+        self._level_keys[level] = keys
+        for key in keys:
+            self._location[key] = level
+
+    def rebuild(self):
+        """Все интервалы в одно дерево, без устаревших записей"""
+        self._pending.clear()
+        self._location.clear()
+        self._removed = 0
+        self._levels, self._level_keys = [None], [[]]
+        if self.intervals:
+            self._place(0, list(self.intervals))
+
+    def overlap(self, low: float, high: float) -> List[Hashable]:
+        """Ключи, чьи интервалы пересекают [low, high]"""
+        found = []
+        for level, root in enumerate(self._levels):
+            if root is None:
+                continue
+            hits: List[Hashable] = []
+            _query(root, low, high, hits)
+            location = self._location
+            found.extend(key for key in hits if location.get(key) == level)
+        found.extend(key for key, (start, end) in self._pending.items() if start <= high and end >= low)
+        return found
+
+    def stab(self, point: float) -> List[Hashable]:
+        """Ключи, чьи интервалы содержат точку"""
+        return self.overlap(point, point)
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.intervals
@@ -0,0 +1,35 @@
+# logging_setup.py
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Логи пишутся в очередь, вывод в stderr идет в отдельном потоке,
+    чтобы запись лога не блокировала event loop"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    root = logging.getLogger()
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_queue = queue.SimpleQueue()
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_logging():
+    """Дописывает очередь логов перед выходом"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,104 @@
+# loop_monitor.py
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from config import LOOP_LAG_THRESHOLD
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+loop_lag = metrics.histogram('event_loop_lag_seconds', "Задержка планирования event loop")
+slow_callbacks = metrics.counter('event_loop_slow_callbacks_total', "Блокировки loop дольше порога")
+
+class LoopMonitor:
+    """Сторож event loop: меряет задержку планирования, а поток-наблюдатель
+    снимает стек, если loop завис дольше порога"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25,
+                 window: int = 1000, max_samples: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=window)  # Последние замеры для перцентилей
+        self.samples: Deque[str] = deque(maxlen=max_samples)  # Стеки медленных колбэков
+        self._heartbeat = time.monotonic()
+        self._reported = False
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Запуск на текущем event loop"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lags.append(lag)
+            loop_lag.observe(lag)
+            self._heartbeat = time.monotonic()
+            self._reported = False
+
+    def _watch(self):
+        """Поток-наблюдатель: стек loop в момент блокировки"""
+        while not self._stop.wait(self.threshold / 2):
+            stalled = time.monotonic() - self._heartbeat - self.interval
+            if stalled < self.threshold or self._reported:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self._reported = True  # Один снимок на одну блокировку
+            stack = ''.join(traceback.format_stack(frame))
+            self.samples.append(stack)
+            slow_callbacks.inc()
+            logger.warning(f"🐢 Event loop заблокирован {stalled:.2f} с, стек:\n{stack}")
+
+    def percentiles(self) -> Dict[str, float]:
+        """Перцентили задержки по последним замерам, секунды"""
+        if not self.lags:
+            return {}
+        ordered = sorted(self.lags)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': ordered[-1]}
+
+    def quantile_gauge(self) -> Dict[tuple, float]:
+        return {(name,): value for name, value in self.percentiles().items()}
+
+    def recent_samples(self) -> List[str]:
+        return list(self.samples)
+
+# Глобальный экземпляр
+loop_monitor = LoopMonitor(threshold=LOOP_LAG_THRESHOLD)
+
+metrics.gauge('event_loop_lag_quantile_seconds', "Перцентили задержки event loop за последнее окно",
+              ('quantile',), loop_monitor.quantile_gauge)
@@ -4,17 +4,6 @@ import logging
 import re
 logger = logging.getLogger(__name__)
 
-async def delete_messages_range(chat_id: int, start_id: int, end_id: int, 
-                              bot, delay: float = 0.1):
-    """Удаление диапазона сообщений"""
-    for message_id in range(start_id, end_id + 1):
-        try:
-            await bot.delete_message(chat_id=chat_id, message_id=message_id)
-            await asyncio.sleep(delay)
-        except Exception as e:
-            logger.debug(f"Не получилось удалить сообщение {message_id}: {e}")
-            continue
-
 async def edit_navigation_message(user_id: int, text: str, reply_markup=None, 
                                 parse_mode=None) -> bool:
     """Утилита для редактирования навигационного сообщения"""
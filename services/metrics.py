@@ -0,0 +1,152 @@
+# metrics.py
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from services.tracing import Histogram, pipeline_tracer
+
+logger = logging.getLogger(__name__)
+
+class Counter:
+    """Счетчик с метками: запись - одно сложение в dict"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, value: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + value
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield self.name, label_values, value
+
+class Gauge:
+    """Значение, которое считается в момент запроса метрик"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...],
+                 collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.collect = collect
+
+    def samples(self):
+        for label_values, value in self.collect().items():
+            yield self.name, label_values, value
+
+class HistogramMetric:
+    """Набор гистограмм по меткам (можно подключить готовый dict гистограмм)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 histograms: Optional[Dict[Tuple[str, ...], Histogram]] = None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.histograms = histograms if histograms is not None else {}
+
+    def observe(self, value: float, *label_values: str):
+        histogram = self.histograms.get(label_values)
+        if histogram is None:
+            histogram = self.histograms[label_values] = Histogram()
+        histogram.observe(value)
+
+    def samples(self):
+        for label_values, histogram in list(self.histograms.items()):
+            for bound, total in histogram.cumulative():
+                yield f'{self.name}_bucket', label_values + (_format_bound(bound),), total
+            yield f'{self.name}_sum', label_values, histogram.sum
+            yield f'{self.name}_count', label_values, histogram.count
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+class MetricsRegistry:
+    """Реестр метрик с выводом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...],
+              collect: Callable[[], Dict[Tuple[str, ...], float]]) -> Gauge:
+        return self._register(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  histograms: Optional[Dict[Tuple[str, ...], Histogram]] = None) -> HistogramMetric:
+        return self._register(HistogramMetric(name, help_text, labels, histograms))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            try:
+                for name, label_values, value in metric.samples():
+                    label_names = metric.labels + ('le',) if name.endswith('_bucket') else metric.labels
+                    if label_values:
+                        labels = ','.join(f'{key}="{_escape(val)}"' for key, val in zip(label_names, label_values))
+                        lines.append(f'{name}{{{labels}}} {value}')
+                    else:
+                        lines.append(f'{name} {value}')
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрики {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    """HTTP /metrics на текущем event loop"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9100,
+                 routes: Optional[Dict[str, Callable]] = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.routes = routes or {}  # Дополнительные отладочные GET-маршруты
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        for path, handler in self.routes.items():
+            app.router.add_get(path, handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"📈 Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+# Глобальный реестр
+metrics = MetricsRegistry()
+
+# Гистограммы стадий конвейера сигнала отдаются без копирования
+metrics.histogram(
+    'signal_stage_seconds', "Длительность стадий конвейера сигнала",
+    ('stage', 'symbol', 'timeframe'), pipeline_tracer.histograms,
+)
@@ -1,6 +1,7 @@
 # models.py
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import List, Optional
 
 @dataclass
 # models.py
@@ -40,3 +41,76 @@ class Imbalance:
     @property
     def recommendation(self) -> str:
         return f"Лимитный ордер в зоне: {self.mid_price:.2f}"
+
+@dataclass
+class ScanProfile:
+    """Сохраненный фильтр сканирования пользователя"""
+    name: str
+    symbols: List[str]
+    block_type: Optional[str] = None  # 'buy', 'sell' или None - любой
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+
+    def matches_price(self, price: float) -> bool:
+        return ((self.price_min is None or price >= self.price_min) and
+                (self.price_max is None or price <= self.price_max))
+
+    def to_dict(self) -> dict:
+        return {'symbols': self.symbols, 'block_type': self.block_type,
+                'price_min': self.price_min, 'price_max': self.price_max}
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> 'ScanProfile':
+        return cls(name, list(data['symbols']), data.get('block_type'),
+                   data.get('price_min'), data.get('price_max'))
+
+@dataclass
+class Zone:
+    """Зона ордерблока, которую ждут для ретеста"""
+    zone_id: int
+    symbol: str
+    timeframe: str
+    block_type: str  # 'buy' или 'sell'
+    low: float
+    high: float
+    created: int  # Время свечи-блока, мс
+
+    @property
+    def mid_price(self) -> float:
+        return (self.high + self.low) / 2
+
+    @property
+    def limit_levels(self):
+        """Лимитные входы от края зоны к середине и уровень стопа за зоной"""
+        if self.block_type == 'buy':
+            return (self.high, self.mid_price), self.low
+        return (self.low, self.mid_price), self.high
+
+@dataclass
+class Instrument:
+    """Инструмент из базы: у кого брать котировки и ограничения биржи"""
+    symbol: str
+    provider: str  # 'tradingview' и т.п.
+    screener: str
+    exchange: str
+    tick_size: float
+    lot_step: float
+    min_notional: float = 0.0
+    volume_decimals: int = field(init=False, repr=False)
+    price_decimals: int = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # Знаков после запятой в шагах (0.001 → 3, 1000 → 0) - считается один раз при загрузке
+        self.volume_decimals = _decimals(self.lot_step)
+        self.price_decimals = _decimals(self.tick_size)
+
+    def round_volume(self, volume: float) -> float:
+        """Объем, кратный шагу лота"""
+        return round(round(volume / self.lot_step) * self.lot_step, self.volume_decimals)
+
+    def round_price(self, price: float) -> float:
+        """Цена, кратная шагу цены"""
+        return round(round(price / self.tick_size) * self.tick_size, self.price_decimals)
+
+def _decimals(step: float) -> int:
+    return max(0, -Decimal(str(step)).normalize().as_tuple().exponent)
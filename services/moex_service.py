@@ -0,0 +1,253 @@
+# moex_service.py
+import asyncio
+import datetime
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import pytz
+
+from config import MOEX_ISS_URL
+from services.models import Instrument
+from services.price_service import PriceService, provider_errors, provider_latency
+
+logger = logging.getLogger(__name__)
+
+MOSCOW = pytz.timezone('Europe/Moscow')  # Время в ответах ISS - московское
+
+# Рынок ISS → торговая система (engine)
+MARKET_ENGINES = {'index': 'stock', 'shares': 'stock', 'bonds': 'stock', 'selt': 'currency', 'forts': 'futures'}
+# Таймфрейм бота → interval свечей ISS и сколько таких свечей в одной свече таймфрейма
+ISS_INTERVALS = {
+    '1m': (1, 1), '5m': (1, 5), '10m': (10, 1), '15m': (1, 15), '30m': (10, 3),
+    '1h': (60, 1), '4h': (60, 4), '1d': (24, 1), '1w': (7, 1),
+}
+ISS_MINUTES = {1: 1, 10: 10, 60: 60, 24: 1440, 7: 10080}
+MAX_SECURITIES = 50  # Бумаг в одном запросе котировок
+LOOKBACK_DAYS = 4  # Первое окно истории свечей: запас на выходные и ночь без торгов
+MAX_LOOKBACKS = 6  # Сколько раз окно удваивается назад (праздники), 4 дня → ~8 месяцев
+
+Route = Tuple[str, str, str]  # (engine, market, board)
+
+@dataclass
+class IssQuote:
+    """Котировка ISS в формате TradingView Analysis: OHLCV дня лежат в indicators"""
+    symbol: str
+    indicators: Dict[str, float]
+
+def _pick(row: dict, *names: str) -> float:
+    """Первое непустое поле: у индексов и акций разные названия колонок"""
+    for name in names:
+        value = row.get(name)
+        if value is not None:
+            return float(value)
+    return 0.0
+
+def _moscow_floor(timestamp: float, bucket_s: int) -> int:
+    """Начало корзины длиной bucket_s, выровненной по московской полуночи (секунды эпохи)"""
+    offset = int(datetime.datetime.fromtimestamp(timestamp, MOSCOW).utcoffset().total_seconds())
+    return (int(timestamp) + offset) // bucket_s * bucket_s - offset
+
+def _rows(block: dict) -> List[dict]:
+    columns = block['columns']
+    return [dict(zip(columns, row)) for row in block['data']]
+
+class MoexService(PriceService):
+    """Котировки и свечи Московской биржи через ISS с тем же интерфейсом, что у TradingView.
+    Одновременные запросы get_price собираются в один запрос на рынок (до MAX_SECURITIES бумаг),
+    результат ложится в общий кэш котировок; все запросы идут через один пул соединений"""
+
+    def __init__(self, base_url: str = MOEX_ISS_URL, batch_size: int = MAX_SECURITIES, connections: int = 10):
+        super().__init__('moex', 'MOEX')
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size
+        self.connections = connections
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.routes: Dict[str, Route] = {'IMOEX': ('stock', 'index', 'SNDX')}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.requests = 0
+
+    def register(self, instrument: Instrument) -> 'MoexService':
+        """Маршрут инструмента из базы: screener - рынок ISS, exchange - режим торгов
+        (акции - shares/TQBR, фьючерсы - forts/RFUD)"""
+        engine = MARKET_ENGINES.get(instrument.screener)
+        if engine is None:
+            raise ValueError(f"неизвестный рынок ISS: {instrument.screener}")
+        self.routes[instrument.symbol] = (engine, instrument.screener, instrument.exchange)
+        return self
+
+    async def _request(self, path: str, params: Dict[str, str]) -> dict:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=15),
+            )
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            async with self.session.get(f"{self.base_url}/{path}", params={'iss.meta': 'off', **params}) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        finally:
+            provider_latency.observe(time.perf_counter() - started, self.screener)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_price(self, symbol: str, max_age: Optional[float] = None) -> Optional[IssQuote]:
+        """Асинхронная версия получения цены (запрос общий с другими символами этого тика)"""
+        cached_price = self._get_from_cache(symbol, max_age)
+        if cached_price is not None:
+            return cached_price
+        if symbol not in self.routes:
+            logger.warning(f"Нет маршрута ISS для {symbol}")
+            return None
+
+        future = self._pending.get(symbol)
+        if future is None:
+            if not self._pending:
+                asyncio.get_running_loop().call_soon(self._flush)
+            future = self._pending[symbol] = asyncio.get_running_loop().create_future()
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        asyncio.create_task(self._resolve(pending))
+
+    async def _resolve(self, pending: Dict[str, asyncio.Future]):
+        try:
+            quotes = await self.get_quotes(list(pending))
+        except Exception as e:
+            logger.error(f"Ошибка запроса котировок ISS: {e}")
+            quotes = {}
+        for symbol, future in pending.items():
+            if not future.done():
+                future.set_result(quotes.get(symbol))
+
+    async def get_quotes(self, symbols: List[str]) -> Dict[str, IssQuote]:
+        """Котировки дня по многим бумагам: один запрос на рынок и пачку из batch_size бумаг"""
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for symbol in symbols:
+            route = self.routes.get(symbol)
+            if route is not None:
+                groups.setdefault(route[:2], []).append(symbol)
+
+        requests = []
+        for (engine, market), group in groups.items():
+            for offset in range(0, len(group), self.batch_size):
+                requests.append(self._fetch_quotes(engine, market, group[offset:offset + self.batch_size]))
+        quotes: Dict[str, IssQuote] = {}
+        for result in await asyncio.gather(*requests, return_exceptions=True):
+            if isinstance(result, BaseException):
+                logger.error(f"Ошибка API ISS: {result}")
+                provider_errors.inc(self.screener)
+                continue
+            quotes.update(result)
+        return quotes
+
+    async def _fetch_quotes(self, engine: str, market: str, symbols: List[str]) -> Dict[str, IssQuote]:
+        logger.info(f"🔄 Запрос к ISS для {len(symbols)} бумаг ({market})...")
+        data = await self._request(
+            f"engines/{engine}/markets/{market}/securities.json",
+            {'securities': ','.join(symbols), 'iss.only': 'marketdata'},
+        )
+        requested, quotes = set(symbols), {}
+        for row in _rows(data['marketdata']):
+            symbol = row.get('SECID')
+            route = self.routes.get(symbol)
+            if route is None or row.get('BOARDID') != route[2] or symbol not in requested:
+                continue  # Та же бумага в других режимах торгов
+            quote = IssQuote(symbol, {
+                'open': _pick(row, 'OPEN', 'OPENVALUE'),
+                'high': _pick(row, 'HIGH'),
+                'low': _pick(row, 'LOW'),
+                'close': _pick(row, 'LAST', 'CURRENTVALUE', 'LASTVALUE'),
+                'volume': _pick(row, 'VOLTODAY'),
+            })
+            self._save_to_cache(symbol, quote)
+            quotes[symbol] = quote
+        return quotes
+
+    async def get_candles(self, symbol: str, interval: int, start: datetime.datetime,
+                          end: Optional[datetime.datetime] = None) -> List[dict]:
+        """Свечи ISS за период, все страницы подряд (параметр start, пока страница не пустая).
+        begin и end в ответе - datetime с московским поясом"""
+        engine, market, board = self.routes[symbol]
+        params = {'interval': str(interval), 'from': start.astimezone(MOSCOW).strftime('%Y-%m-%d %H:%M:%S')}
+        if end is not None:
+            params['till'] = end.astimezone(MOSCOW).strftime('%Y-%m-%d %H:%M:%S')
+        path = f"engines/{engine}/markets/{market}/boards/{board}/securities/{symbol}/candles.json"
+
+        candles: List[dict] = []
+        while True:
+            data = await self._request(path, {**params, 'start': str(len(candles))})
+            page = _rows(data['candles'])
+            if not page:
+                return candles
+            for row in page:
+                for field in ('begin', 'end'):
+                    row[field] = MOSCOW.localize(datetime.datetime.strptime(row[field], '%Y-%m-%d %H:%M:%S'))
+            candles.extend(page)
+
+    async def get_ohlc(self, symbol: str, timeframe: str, num_candles: int = 1,
+                       now: Optional[float] = None) -> List[dict]:
+        """Последние завершенные свечи таймфрейма бота, от новых к старым; begin - московское время.
+        Если у ISS нет такого interval, свечи собираются из младших в корзины по московскому времени.
+        Пока свечей не хватает (длинные праздники), история листается назад удваивающимися окнами"""
+        interval, count = ISS_INTERVALS[timeframe]
+        bucket_s = ISS_MINUTES[interval] * count * 60
+        now = self.now() if now is None else now
+        lookback = bucket_s * (num_candles + 1) + LOOKBACK_DAYS * 86400
+        rows: List[dict] = []
+        end: Optional[datetime.datetime] = None
+        for _ in range(MAX_LOOKBACKS):
+            # Окно начинается на границе корзины, чтобы самая старая корзина была полной
+            start = datetime.datetime.fromtimestamp(_moscow_floor(now - lookback, bucket_s), MOSCOW)
+            rows = await self.get_candles(symbol, interval, start, end) + rows
+            buckets = self._buckets(rows, bucket_s, count, now)
+            if len(buckets) >= num_candles:
+                break
+            end = start - datetime.timedelta(seconds=1)
+            lookback *= 2
+        return [buckets[opened] for opened in sorted(buckets, reverse=True)[:num_candles]]
+
+    @staticmethod
+    def _buckets(rows: List[dict], bucket_s: int, count: int, now: float) -> Dict[int, dict]:
+        """Завершенные свечи по времени открытия: свечи ISS как есть или корзины из count младших"""
+        buckets: Dict[int, dict] = {}
+        for row in rows:
+            begin = int(row['begin'].timestamp())
+            opened = _moscow_floor(begin, bucket_s) if count > 1 else begin
+            if opened + bucket_s > now:
+                continue  # Свеча еще формируется
+            bucket = buckets.get(opened)
+            if bucket is None:
+                buckets[opened] = dict(row, begin=datetime.datetime.fromtimestamp(opened, MOSCOW))
+                continue
+            bucket['high'] = max(bucket['high'], row['high'])
+            bucket['low'] = min(bucket['low'], row['low'])
+            bucket['close'] = row['close']
+            bucket['end'] = row['end']
+            bucket['volume'] += row['volume']
+            bucket['value'] += row['value']
+        return buckets
+
+    async def get_bar(self, symbol: str, timeframe: str) -> Optional[dict]:
+        """Последний закрытый бар таймфрейма (интерфейс PriceService.get_bar)"""
+        candles = await self.get_ohlc(symbol, timeframe, 1)
+        return candles[0] if candles else None
+
+    async def get_imoex_ohlc(self, timeframe: str, num_candles: int = 1) -> List[dict]:
+        return await self.get_ohlc('IMOEX', timeframe, num_candles)
+
+    async def get_imoex_index(self) -> Optional[float]:
+        """Текущее значение индекса Мосбиржи"""
+        quote = await self.get_price('IMOEX')
+        return quote.indicators['close'] if quote else None
+
+# Глобальный экземпляр сервиса
+moex_service = MoexService()
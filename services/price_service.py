@@ -3,10 +3,18 @@ import time
 from tradingview_ta import TA_Handler
 import logging
 
+from services.metrics import metrics
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+cache_requests = metrics.counter('price_cache_requests_total', "Обращения к кэшу котировок", ('provider', 'result'))
+provider_latency = metrics.histogram('price_provider_request_seconds', "Время запроса к TradingView", ('provider',))
+provider_errors = metrics.counter('price_provider_errors_total', "Неудачные запросы к TradingView", ('provider',))
+
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
 class PriceService:
     def __init__(self, screener, exchange):
         self.screener = screener
@@ -14,22 +22,27 @@ class PriceService:
         self.interval = '1d'
         self.cache = {}
         self.cache_ttl = 300
+        self.now = time.time  # Часы кэша (в тестах подменяются)
 
     def _get_cache_key(self, symbol):
         return f"{self.screener}:{self.exchange}:{symbol}"
 
-    def _get_from_cache(self, symbol):
+    def _get_from_cache(self, symbol, max_age=None):
+        """max_age - допустимый возраст для вызывающего, если он меньше cache_ttl"""
         cache_key = self._get_cache_key(symbol)
+        ttl = self.cache_ttl if max_age is None else min(self.cache_ttl, max_age)
         if cache_key in self.cache:
             data, timestamp = self.cache[cache_key]
-            if time.time() - timestamp < self.cache_ttl:
+            if self.now() - timestamp < ttl:
                 logger.info(f"✓ Данные из кэша для {symbol}")
+                cache_requests.inc(self.screener, 'hit')
                 return data
+        cache_requests.inc(self.screener, 'miss')
         return None
 
     def _save_to_cache(self, symbol, price):
         cache_key = self._get_cache_key(symbol)
-        self.cache[cache_key] = (price, time.time())
+        self.cache[cache_key] = (price, self.now())
         logger.info(f"✓ Данные сохранены в кэш для {symbol}")
 
     def _get_price_from_api(self, symbol):
@@ -47,30 +60,66 @@ class PriceService:
             logger.error(f"Ошибка API для {symbol}: {e}")
             return None
 
-    async def get_price(self, symbol):
-        """Асинхронная версия получения цены"""
-        cached_price = self._get_from_cache(symbol)
+    def _get_bar_from_api(self, symbol, interval):
+        """Синхронный запрос прошлого (закрытого) бара интервала: поля с суффиксом [1]"""
+        try:
+            handler = TA_Handler(symbol=symbol, screener=self.screener, exchange=self.exchange, interval=interval)
+            values = handler.get_indicators([f"{field}[1]" for field in BAR_FIELDS])
+            if values.get('close[1]') is None:
+                return None
+            return {field: float(values.get(f"{field}[1]") or 0) for field in BAR_FIELDS}
+        except Exception as e:
+            logger.error(f"Ошибка API для {symbol} {interval}: {e}")
+            return None
+
+    async def get_bar(self, symbol, interval):
+        """Последний закрытый бар интервала (open/high/low/close/volume).
+        Без кэша: снимок дня из get_price для свечей не годится"""
+        loop = asyncio.get_event_loop()
+        started = time.perf_counter()
+        bar = await loop.run_in_executor(None, self._get_bar_from_api, symbol, interval)
+        provider_latency.observe(time.perf_counter() - started, self.screener)
+        if bar is None:
+            provider_errors.inc(self.screener)
+        return bar
+
+    async def get_price(self, symbol, max_age=None):
+        """Асинхронная версия получения цены (max_age, с - не старше этого из кэша)"""
+        cached_price = self._get_from_cache(symbol, max_age)
         if cached_price is not None:
             return cached_price
 
         try:
             logger.info(f"🔄 Запрос к API для {symbol}...")
             loop = asyncio.get_event_loop()
+            started = time.perf_counter()
             current_price = await loop.run_in_executor(None, self._get_price_from_api, symbol)
+            provider_latency.observe(time.perf_counter() - started, self.screener)
 
             if current_price is not None:
                 self._save_to_cache(symbol, current_price)
                 return current_price
+            provider_errors.inc(self.screener)
             return None
 
         except Exception as e:
             logger.error(f"Ошибка в get_price для {symbol}: {e}")
+            provider_errors.inc(self.screener)
             return None
 
 # Глобальные экземпляры сервисов
 crypto_service = PriceService('crypto', 'BINANCE')
 forex_service = PriceService('forex', 'FX_IDC')
 
+tradingview_services = {('crypto', 'BINANCE'): crypto_service, ('forex', 'FX_IDC'): forex_service}
+
+def tradingview_service(screener: str, exchange: str) -> PriceService:
+    """Один сервис (и кэш) на пару скринер/биржа"""
+    service = tradingview_services.get((screener, exchange))
+    if service is None:
+        service = tradingview_services[(screener, exchange)] = PriceService(screener, exchange)
+    return service
+
 # ✅ ПРАВИЛЬНО: асинхронная main функция
 async def main():
     data = await crypto_service.get_price('BTCUSDT')
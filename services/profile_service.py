@@ -0,0 +1,136 @@
+# profile_service.py
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.interval_index import IntervalIndex
+from services.models import ScanProfile
+from services.session_service import session_service
+
+logger = logging.getLogger(__name__)
+
+BLOCK_TYPES = ('buy', 'sell')
+BLOCK_ALIASES = {
+    'buy': 'buy', 'bull': 'buy', 'бычий': 'buy', 'long': 'buy',
+    'sell': 'sell', 'bear': 'sell', 'медвежий': 'sell', 'short': 'sell',
+    'all': None, 'any': None, 'все': None,
+}
+MAX_PROFILES = 10
+
+ProfileKey = Tuple[str, str, str]  # (символ, таймфрейм, тип блока)
+
+class ProfileIndex:
+    """Скомпилированные профили: (символ, таймфрейм, тип блока) → индекс ценовых диапазонов.
+    Получатели сигнала ищутся в своем ключе по цене закрытия за O(log n + k)"""
+
+    def __init__(self):
+        self.entries: Dict[ProfileKey, IntervalIndex] = {}
+        self.by_user: Dict[int, Set[Tuple[ProfileKey, str]]] = {}  # Ключ и имя профиля
+
+    def compile(self, user_id: int, profiles: Iterable[ScanProfile], timeframe: str) -> List[str]:
+        """Заменяет фильтры пользователя, возвращает инструменты для опроса.
+        Меняются только диапазоны этого пользователя"""
+        self.remove(user_id)
+        keys = set()
+        symbols = []
+        for profile in profiles:
+            for symbol in profile.symbols:
+                if symbol not in symbols:
+                    symbols.append(symbol)
+                for block_type in (BLOCK_TYPES if profile.block_type is None else (profile.block_type,)):
+                    key = (symbol, timeframe, block_type)
+                    index = self.entries.get(key)
+                    if index is None:
+                        index = self.entries[key] = IntervalIndex()
+                    index.add((user_id, profile.name), profile.price_min, profile.price_max)
+                    keys.add((key, profile.name))
+        if keys:
+            self.by_user[user_id] = keys
+        return symbols
+
+    def remove(self, user_id: int):
+        for key, name in self.by_user.pop(user_id, ()):
+            index = self.entries.get(key)
+            if index is None:
+                continue
+            index.remove((user_id, name))
+            if not index:
+                del self.entries[key]
+
+    def match(self, symbol: str, timeframe: str, block_type: str, price: float) -> List[int]:
+        """Получатели сигнала: подписаны на ключ и цена в диапазоне хотя бы одного профиля"""
+        index = self.entries.get((symbol, timeframe, block_type))
+        if index is None:
+            return []
+        return list(dict.fromkeys(user_id for user_id, _ in index.stab(price)))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class ProfileService:
+    """Сохраненные профили сканирования (хранятся в сессии и переживают перезапуск)"""
+
+    def __init__(self):
+        self.user_profiles = session_service.view('profiles')  # user_id → {имя: словарь профиля}
+
+    def get_profiles(self, user_id: int) -> List[ScanProfile]:
+        return [ScanProfile.from_dict(name, data) for name, data in self.user_profiles.get(user_id, {}).items()]
+
+    def save_profile(self, user_id: int, profile: ScanProfile):
+        profiles = dict(self.user_profiles.get(user_id, {}))
+        if profile.name not in profiles and len(profiles) >= MAX_PROFILES:
+            raise ValueError(f"Не больше {MAX_PROFILES} профилей")
+        profiles[profile.name] = profile.to_dict()
+        # Новый словарь через представление - изменение попадет в хранилище
+        self.user_profiles[user_id] = profiles
+        logger.info(f"Профиль {profile.name} сохранен для user {user_id}")
+
+    def delete_profile(self, user_id: int, name: str) -> bool:
+        profiles = dict(self.user_profiles.get(user_id, {}))
+        if profiles.pop(name, None) is None:
+            return False
+        if profiles:
+            self.user_profiles[user_id] = profiles
+        else:
+            del self.user_profiles[user_id]
+        return True
+
+    @staticmethod
+    def parse(text: str, supported: Iterable[str]) -> ScanProfile:
+        """Разбор строки «имя BTCUSDT,ETHUSDT buy 100000-110000» (тип и диапазон необязательны)"""
+        parts = text.split()
+        if len(parts) < 2:
+            raise ValueError("Формат: /profile имя BTCUSDT,ETHUSDT [buy|sell|all] [мин-макс]")
+        name, symbols = parts[0], [symbol.upper() for symbol in parts[1].split(',') if symbol]
+        unknown = [symbol for symbol in symbols if symbol not in supported]
+        if unknown or not symbols:
+            raise ValueError(f"Неизвестные инструменты: {', '.join(unknown) or parts[1]}")
+
+        block_type: Optional[str] = None
+        price_min = price_max = None
+        for part in parts[2:]:
+            if part.lower() in BLOCK_ALIASES:
+                block_type = BLOCK_ALIASES[part.lower()]
+                continue
+            match = re.fullmatch(r'(\d+(?:\.\d+)?)?-(\d+(?:\.\d+)?)?', part)
+            if not match or part == '-':
+                raise ValueError(f"Непонятный параметр: {part}")
+            price_min = float(match.group(1)) if match.group(1) else None
+            price_max = float(match.group(2)) if match.group(2) else None
+            if price_min is not None and price_max is not None and price_min > price_max:
+                raise ValueError("Нижняя граница диапазона больше верхней")
+        return ScanProfile(name, symbols, block_type, price_min, price_max)
+
+    @staticmethod
+    def describe(profile: ScanProfile) -> str:
+        block = {'buy': "бычий", 'sell': "медвежий"}.get(profile.block_type, "любой")
+        text = f"• {profile.name}: {', '.join(profile.symbols)}, блок {block}"
+        if profile.price_min is not None or profile.price_max is not None:
+            low = '' if profile.price_min is None else f"{profile.price_min:g}"
+            high = '' if profile.price_max is None else f"{profile.price_max:g}"
+            text += f", цена {low}-{high}"
+        return text
+
+# Глобальные экземпляры
+profile_index = ProfileIndex()
+profile_service = ProfileService()
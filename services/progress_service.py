@@ -1,18 +1,19 @@
 # progress_service.py
 import asyncio
 import logging
-from typing import Dict
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import bot
 import datetime
 from services.time_utils import timezone_service
+from services.cleanup_service import cleanup_service
+from services.session_service import session_service
 
 logger = logging.getLogger(__name__)
 
 class ProgressService:
     def __init__(self):
-        self.progress_tasks: Dict[int, asyncio.Task] = {}
-        self.progress_messages: Dict[int, int] = {}
+        self.progress_tasks = session_service.view('progress_task')
+        self.progress_messages = session_service.view('progress_message')
 
     async def start_progress_animation(self, user_id: int, wait_time: int, 
                                     timeframe: str, close_time: datetime.datetime):
@@ -62,10 +63,7 @@ class ProgressService:
 
     async def cleanup_progress(self, user_id: int):
         if user_id in self.progress_messages:
-            try:
-                await bot.delete_message(chat_id=user_id, message_id=self.progress_messages[user_id])
-            except Exception:
-                pass
-            del self.progress_messages[user_id]
+            message_id = self.progress_messages.pop(user_id)
+            await cleanup_service.delete(user_id, [message_id])
 
 progress_service = ProgressService()
\ No newline at end of file
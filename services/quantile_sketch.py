@@ -0,0 +1,113 @@
+# quantile_sketch.py
+import logging
+from typing import Dict, Optional, Tuple
+
+from config import ORDER_BLOCK_BODY_PERCENTILE
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class P2Quantile:
+    """Потоковая оценка квантиля алгоритмом P² (Jain & Chlamtac): пять маркеров, память O(1)"""
+
+    __slots__ = ('p', 'count', 'heights', 'positions', 'desired', 'increments')
+
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f"Квантиль должен быть в (0, 1): {p}")
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value: float):
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        positions = self.positions
+        for index in range(cell + 1, 5):
+            positions[index] += 1
+        for index in range(5):
+            self.desired[index] += self.increments[index]
+
+        for index in (1, 2, 3):
+            delta = self.desired[index] - positions[index]
+            if ((delta >= 1 and positions[index + 1] - positions[index] > 1) or
+                    (delta <= -1 and positions[index - 1] - positions[index] < -1)):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(index, step)
+                if not heights[index - 1] < height < heights[index + 1]:
+                    height = heights[index] + step * (heights[index + step] - heights[index]) / (
+                        positions[index + step] - positions[index])
+                heights[index] = height
+                positions[index] += step
+
+    def _parabolic(self, index: int, step: int) -> float:
+        heights, positions = self.heights, self.positions
+        left = positions[index] - positions[index - 1]
+        right = positions[index + 1] - positions[index]
+        return heights[index] + step / (positions[index + 1] - positions[index - 1]) * (
+            (left + step) * (heights[index + 1] - heights[index]) / right +
+            (right - step) * (heights[index] - heights[index - 1]) / left
+        )
+
+    def value(self) -> Optional[float]:
+        if not self.count:
+            return None
+        if self.count <= 5:
+            # Пока маркеров нет - точный квантиль по накопленным значениям
+            return self.heights[min(len(self.heights) - 1, int(self.p * len(self.heights)))]
+        return self.heights[2]
+
+class BodySizeStats:
+    """Перцентиль размера тела свечи по (символ, таймфрейм), обновляется на каждом закрытии"""
+
+    def __init__(self, percentile: float = 0, warmup: int = 20):
+        self.percentile = percentile  # 0 - фильтр выключен
+        self.warmup = warmup  # До стольких свечей порог не применяется
+        self.sketches: Dict[Tuple[str, str], P2Quantile] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.percentile < 100
+
+    def observe(self, symbol: str, timeframe: str, body_size: float):
+        if not self.enabled:
+            return
+        sketch = self.sketches.get((symbol, timeframe))
+        if sketch is None:
+            sketch = self.sketches[(symbol, timeframe)] = P2Quantile(self.percentile / 100)
+        sketch.add(body_size)
+
+    def threshold(self, symbol: str, timeframe: str) -> Optional[float]:
+        """Минимальное тело импульса или None, если статистики еще мало"""
+        sketch = self.sketches.get((symbol, timeframe))
+        if sketch is None or sketch.count < self.warmup:
+            return None
+        return sketch.value()
+
+    def thresholds(self) -> Dict[tuple, float]:
+        return {key: sketch.value() for key, sketch in self.sketches.items() if sketch.count >= self.warmup}
+
+# Глобальный экземпляр
+body_size_stats = BodySizeStats(ORDER_BLOCK_BODY_PERCENTILE)
+
+metrics.gauge('order_block_body_threshold', "Порог тела импульса по перцентилю", ('symbol', 'timeframe'),
+              body_size_stats.thresholds)
@@ -0,0 +1,110 @@
+# rate_limiter.py
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+from services.cleanup_service import cleanup_service
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+api_requests = metrics.counter('bot_api_requests_total', "Вызовы Bot API", ('method',))
+api_errors = metrics.counter('bot_api_errors_total', "Ошибки вызовов Bot API", ('method', 'error'))
+
+class RateLimiter:
+    """Ограничитель исходящих запросов к Bot API (в пределах процесса)"""
+
+    def __init__(self, global_rate: float = 30, per_chat_interval: float = 1.0):
+        self.total_rate = global_rate  # Лимит Telegram на весь бот
+        self.global_rate = global_rate  # Доля этого процесса, запросов в секунду
+        self.per_chat_interval = per_chat_interval  # Пауза между сообщениями в один чат
+        self.waiting = 0  # Глубина очереди ожидающих запросов
+        self._next_global = 0.0
+        self._chat_next: Dict[int, float] = {}
+
+    async def acquire(self, chat_id: Optional[int] = None):
+        """Ожидание слота на отправку запроса (chat_id включает лимит на чат)"""
+        loop = asyncio.get_running_loop()
+        self.waiting += 1
+        try:
+            if chat_id is not None:
+                now = loop.time()
+                slot = max(now, self._chat_next.get(chat_id, 0.0))
+                self._chat_next[chat_id] = slot + self.per_chat_interval
+                if slot > now:
+                    await asyncio.sleep(slot - now)
+
+            now = loop.time()
+            slot = max(now, self._next_global)
+            self._next_global = slot + 1 / self.global_rate
+            if slot > now:
+                await asyncio.sleep(slot - now)
+        finally:
+            self.waiting -= 1
+
+        if len(self._chat_next) > 10000:
+            self._prune(loop.time())
+
+    def share(self, processes: int):
+        """Делит общий лимит между процессами бота: у каждого своя равная доля.
+        Чаты не пересекаются (пользователи закреплены за воркерами), так что лимит на чат не делится"""
+        self.global_rate = self.total_rate / max(1, processes)
+
+    def pause(self, seconds: float, chat_id: Optional[int] = None):
+        """Telegram ответил 429: следующий слот (чата или общий) не раньше чем через retry_after"""
+        until = asyncio.get_running_loop().time() + seconds
+        if chat_id is not None:
+            self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), until)
+        else:
+            self._next_global = max(self._next_global, until)
+
+    def _prune(self, now: float):
+        """Удаление устаревших слотов чатов"""
+        self._chat_next = {
+            chat_id: slot for chat_id, slot in self._chat_next.items() if slot > now
+        }
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """Все запросы бота идут через rate_limiter, отправленные сообщения учитываются для очистки"""
+
+    # Методы, на которые действует лимит Telegram на сообщения в один чат
+    PER_CHAT_PREFIXES = ('send', 'copy', 'forward')
+
+    def __init__(self, limiter: RateLimiter, retries: int = 2):
+        self.limiter = limiter
+        self.retries = retries  # Повторы после 429 (retry_after)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        per_chat = (isinstance(chat_id, int) and
+                    method.__api_method__.startswith(self.PER_CHAT_PREFIXES))
+        limited_chat = chat_id if per_chat else None
+
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire(limited_chat)
+            api_requests.inc(method.__api_method__)
+            try:
+                result = await make_request(bot, method)
+                break
+            except TelegramRetryAfter as e:
+                api_errors.inc(method.__api_method__, type(e).__name__)
+                self.limiter.pause(e.retry_after, limited_chat)
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"429 на {method.__api_method__}: повтор через {e.retry_after} с")
+            except Exception as e:
+                api_errors.inc(method.__api_method__, type(e).__name__)
+                raise
+        if isinstance(result, Message):
+            cleanup_service.track(result.chat.id, result.message_id)
+        return result
+
+# Глобальный экземпляр ограничителя
+rate_limiter = RateLimiter()
+
+metrics.gauge('bot_api_queue_depth', "Запросы, ожидающие слота ограничителя", (),
+              lambda: {(): rate_limiter.waiting})
@@ -0,0 +1,163 @@
+# session_service.py
+import logging
+from collections.abc import MutableMapping, MutableSet
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class UserSession:
+    """Все данные пользователя в одном компактном объекте (None - поле не задано)"""
+
+    # Поля интерфейса: сбрасываются при неактивности
+    INTERACTION_FIELDS = ('navigation_id', 'state', 'calculation_data', 'last_activity')
+    # Поля запущенного анализа: сбрасываются в cleanup_user_analysis
+    ANALYSIS_FIELDS = ('analysis_task', 'analysis_active', 'progress_manager', 'last_price', 'timeframe')
+
+    __slots__ = (
+        'user_id', 'subscribed', 'timezone', 'trade_data',
+        'settings_timeframe', 'symbols', 'profiles', 'alerts', 'early_warning',  # Настройки анализа
+        'progress_task', 'progress_message',
+    ) + INTERACTION_FIELDS + ANALYSIS_FIELDS
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        for name in self.__slots__[1:]:
+            setattr(self, name, None)
+
+    def clear(self, fields):
+        for name in fields:
+            setattr(self, name, None)
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, name) is None for name in self.__slots__[1:])
+
+class SessionFieldView(MutableMapping):
+    """Поле сессий как dict user_id → значение (для старого кода со словарями)"""
+
+    def __init__(self, service: 'SessionService', field: str):
+        self.service = service
+        self.field = field
+
+    def __getitem__(self, user_id: int):
+        session = self.service.sessions.get(user_id)
+        value = None if session is None else getattr(session, self.field)
+        if value is None:
+            raise KeyError(user_id)
+        return value
+
+    def __setitem__(self, user_id: int, value):
+        setattr(self.service.get_or_create(user_id), self.field, value)
+        self.service.notify(user_id, self.field)
+
+    def __delitem__(self, user_id: int):
+        session = self.service.sessions.get(user_id)
+        if session is None or getattr(session, self.field) is None:
+            raise KeyError(user_id)
+        setattr(session, self.field, None)
+        self.service.notify(user_id, self.field)
+        self.service.drop_if_empty(user_id)
+
+    def __contains__(self, user_id) -> bool:
+        session = self.service.sessions.get(user_id)
+        return session is not None and getattr(session, self.field) is not None
+
+    def get(self, user_id, default=None):
+        session = self.service.sessions.get(user_id)
+        value = None if session is None else getattr(session, self.field)
+        return default if value is None else value
+
+    def __iter__(self) -> Iterator[int]:
+        field = self.field
+        return iter([user_id for user_id, session in self.service.sessions.items()
+                     if getattr(session, field) is not None])
+
+    def __len__(self) -> int:
+        field = self.field
+        return sum(1 for session in self.service.sessions.values() if getattr(session, field) is not None)
+
+    def __repr__(self) -> str:
+        return f"SessionFieldView({self.field}, {dict(self)})"
+
+class SessionFlagView(MutableSet):
+    """Булево поле сессий как множество user_id"""
+
+    def __init__(self, service: 'SessionService', field: str):
+        self.service = service
+        self.field = field
+
+    def __contains__(self, user_id) -> bool:
+        session = self.service.sessions.get(user_id)
+        return session is not None and bool(getattr(session, self.field))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([user_id for user_id in list(self.service.sessions) if user_id in self])
+
+    def __len__(self) -> int:
+        return sum(1 for session in self.service.sessions.values() if getattr(session, self.field))
+
+    def add(self, user_id: int):
+        setattr(self.service.get_or_create(user_id), self.field, True)
+        self.service.notify(user_id, self.field)
+
+    def discard(self, user_id: int):
+        session = self.service.sessions.get(user_id)
+        if session is not None:
+            setattr(session, self.field, None)
+            self.service.notify(user_id, self.field)
+            self.service.drop_if_empty(user_id)
+
+class SessionService:
+    """Единый реестр сессий пользователей"""
+
+    def __init__(self):
+        self.sessions: Dict[int, UserSession] = {}
+        # Подписчики на изменения полей (user_id, поле; None - вся сессия)
+        self.listeners: List[Callable[[int, Optional[str]], None]] = []
+
+    def notify(self, user_id: int, field: Optional[str]):
+        for listener in self.listeners:
+            listener(user_id, field)
+
+    def get(self, user_id: int) -> Optional[UserSession]:
+        return self.sessions.get(user_id)
+
+    def get_or_create(self, user_id: int) -> UserSession:
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = self.sessions[user_id] = UserSession(user_id)
+        return session
+
+    def drop(self, user_id: int, notify: bool = True) -> Optional[UserSession]:
+        """Удаление всех данных пользователя одной операцией
+        (notify=False - только выгрузка из памяти, без удаления из хранилища)"""
+        session = self.sessions.pop(user_id, None)
+        if session is not None and notify:
+            self.notify(user_id, None)
+        return session
+
+    def drop_if_empty(self, user_id: int):
+        session = self.sessions.get(user_id)
+        if session is not None and session.is_empty():
+            del self.sessions[user_id]
+
+    def clear_fields(self, user_id: int, fields):
+        """Сброс группы полей; пустая сессия удаляется"""
+        session = self.sessions.get(user_id)
+        if session is not None:
+            session.clear(fields)
+            for field in fields:
+                self.notify(user_id, field)
+            self.drop_if_empty(user_id)
+
+    def view(self, field: str) -> SessionFieldView:
+        return SessionFieldView(self, field)
+
+    def flag_view(self, field: str) -> SessionFlagView:
+        return SessionFlagView(self, field)
+
+# Глобальный экземпляр
+session_service = SessionService()
+
+# Бывшие глобальные словари config
+subscribed_users = session_service.flag_view('subscribed')
+running_analyses = session_service.view('analysis_task')
@@ -0,0 +1,236 @@
+# signal_journal.py
+import json
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from config import SIGNAL_EXPIRY_BARS, SIGNAL_OUTCOME_RR
+from services.interval_index import IntervalIndex
+from services.metrics import metrics
+from services.models import Candle, Zone
+
+logger = logging.getLogger(__name__)
+
+GroupKey = Tuple[str, str]  # (символ, таймфрейм)
+ID_BLOCK = 10 ** 12  # id сигналов воркера N: N * ID_BLOCK + номер, уникальны по всем журналам
+
+signal_outcomes = metrics.counter('signal_outcomes_total', "Исходы сигналов по тейку и стопу", ('timeframe', 'outcome'))
+
+class SignalJournal:
+    """Журнал отправленных сигналов и их исходов: строка JSON на событие, только дозапись.
+    Открытые сигналы лежат уровнями тейка и стопа в индексе по символу - свеча
+    проверяет только задетые уровни. Пока журнал не открыт, запись ничего не делает.
+    Рядом лежит контрольная точка (открытые сигналы и статистика на смещение в журнале):
+    при открытии перечитывается только хвост после нее, сам журнал целиком остается для выгрузки"""
+
+    def __init__(self, risk_reward: float = 2.0, window: int = 50, expiry_bars: int = SIGNAL_EXPIRY_BARS):
+        self.risk_reward = risk_reward
+        self.window = window  # Сколько последних исходов в скользящей статистике
+        self.expiry_bars = expiry_bars
+        self.path: Optional[str] = None
+        self._file = None
+        self.last_id = 0
+        self.open_signals: Dict[int, dict] = {}
+        self.levels: Dict[str, IntervalIndex] = {}  # По символу, ключи (id сигнала, 'tp' | 'sl')
+        self.results: Dict[GroupKey, Deque[float]] = {}  # Исходы в R: +risk_reward или -1
+        self.last_close: Dict[str, float] = {}
+
+    @property
+    def checkpoint_path(self) -> str:
+        return f"{self.path}.checkpoint"
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def open(self, path: str, worker: int = 0):
+        """Открывает журнал и поднимает открытые сигналы и статистику из прошлых записей.
+        worker - номер воркера: его id сигналов идут в своем блоке"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.last_id = worker * ID_BLOCK
+        self.open_signals.clear()
+        self.levels.clear()
+        self.results.clear()
+        offset = self._restore_checkpoint()
+        replayed = 0
+        for entry in self.read(offset=offset):
+            replayed += 1
+            if 'outcome' in entry:
+                signal = self.open_signals.get(entry['id'])
+                if signal is not None:
+                    self._close(signal, entry['outcome'])
+            else:
+                self.last_id = max(self.last_id, entry['id'])
+                if 'target' in entry:
+                    self._track(entry)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._checkpoint()
+        logger.info(f"📒 Журнал сигналов: {path} (последний id: {self.last_id}, открытых: {len(self.open_signals)}, "
+                    f"перечитано записей: {replayed})")
+
+    def close(self):
+        if self._file is not None:
+            self._checkpoint()
+            self._file.close()
+            self._file = None
+
+    def _restore_checkpoint(self) -> int:
+        """Состояние из контрольной точки; смещение, с которого дочитывать журнал (0 - с начала)"""
+        if not os.path.exists(self.checkpoint_path) or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as file:
+                state = json.load(file)
+        except ValueError:
+            logger.warning(f"Поврежденная контрольная точка журнала: {self.checkpoint_path}")
+            return 0
+        if state['offset'] > os.path.getsize(self.path):
+            return 0  # Журнал заменили или обрезали - читаем целиком
+        self.last_id = max(self.last_id, state['last_id'])
+        for entry in state['open']:
+            self._track(entry)
+        for symbol, timeframe, results in state['results']:
+            self.results[(symbol, timeframe)] = deque(results, maxlen=self.window)
+        return state['offset']
+
+    def _checkpoint(self):
+        """Открытые сигналы и статистика на текущий конец журнала (запись через временный файл)"""
+        state = {
+            'offset': os.path.getsize(self.path), 'last_id': self.last_id,
+            'open': list(self.open_signals.values()),
+            'results': [[symbol, timeframe, list(results)] for (symbol, timeframe), results in self.results.items()],
+        }
+        with open(self.checkpoint_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def _write(self, entry: dict):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def record(self, zone: Zone, price: float, timestamp: int) -> Optional[int]:
+        """Сигнал по зоне ордерблока; timestamp - открытие свечи-импульса, мс.
+        Вход - цена закрытия импульса, стоп - за зоной, тейк - как в калькуляторе позиции"""
+        from services.trade_calculator import trade_calculator
+
+        if self._file is None:
+            return None
+        self.last_id += 1
+        entry = {'id': self.last_id, 'symbol': zone.symbol, 'timeframe': zone.timeframe,
+                 'type': zone.block_type, 'time': timestamp, 'price': price,
+                 'low': zone.low, 'high': zone.high}
+        stop = zone.limit_levels[1]
+        risk = price - stop if zone.block_type == 'buy' else stop - price
+        if risk > 0:
+            direction = 'long' if zone.block_type == 'buy' else 'short'
+            entry['stop'] = stop
+            entry['target'] = trade_calculator._calculate_take_profit(price, direction, risk, self.risk_reward)
+            self._track(entry)
+        self._write(entry)
+        return self.last_id
+
+    def _track(self, entry: dict):
+        index = self.levels.get(entry['symbol'])
+        if index is None:
+            index = self.levels[entry['symbol']] = IntervalIndex()
+        index.add((entry['id'], 'tp'), entry['target'], entry['target'])
+        index.add((entry['id'], 'sl'), entry['stop'], entry['stop'])
+        self.open_signals[entry['id']] = entry
+
+    def _close(self, signal: dict, outcome: str):
+        del self.open_signals[signal['id']]
+        index = self.levels[signal['symbol']]
+        index.remove((signal['id'], 'tp'))
+        index.remove((signal['id'], 'sl'))
+        if not index:
+            del self.levels[signal['symbol']]
+        if outcome == 'expired':
+            return  # Исход неизвестен - в статистику не идет
+        key = (signal['symbol'], signal['timeframe'])
+        results = self.results.get(key)
+        if results is None:
+            results = self.results[key] = deque(maxlen=self.window)
+        results.append(self.risk_reward if outcome == 'tp' else -1.0)
+
+    def _resolve(self, signal: dict, outcome: str, timestamp: int, price: Optional[float]):
+        self._close(signal, outcome)
+        signal_outcomes.inc(signal['timeframe'], outcome)
+        if self._file is not None:
+            self._write({'id': signal['id'], 'symbol': signal['symbol'], 'timeframe': signal['timeframe'],
+                         'outcome': outcome, 'time': timestamp, 'price': price})
+
+    def on_candle(self, symbol: str, candle: Candle) -> List[Tuple[int, str]]:
+        """Закрывает сигналы символа любого таймфрейма, чей тейк или стоп задела свеча
+        (с гэпом от прошлого закрытия). Свечи приходят из общего потока символа, поэтому
+        исходы считаются, пока символ опрашивается хоть на одном таймфрейме.
+        Если задеты оба уровня, порядок внутри свечи неизвестен - засчитывается стоп"""
+        previous = self.last_close.get(symbol, candle.open)
+        self.last_close[symbol] = candle.close
+        index = self.levels.get(symbol)
+        if index is None:
+            return []
+        touched: Dict[int, set] = {}
+        for signal_id, level in index.overlap(min(candle.low, previous), max(candle.high, previous)):
+            touched.setdefault(signal_id, set()).add(level)
+
+        resolved = []
+        for signal_id, levels in touched.items():
+            outcome = 'sl' if 'sl' in levels else 'tp'
+            signal = self.open_signals[signal_id]
+            self._resolve(signal, outcome, candle.timestamp, signal['target'] if outcome == 'tp' else signal['stop'])
+            resolved.append((signal_id, outcome))
+        return resolved
+
+    def expire(self, now_ms: int) -> List[int]:
+        """Закрывает как expired сигналы старше expiry_bars свечей своего таймфрейма:
+        символ мог перестать опрашиваться, и исхода тогда не будет"""
+        from services.time_utils import time_service
+
+        expired = []
+        for signal in list(self.open_signals.values()):
+            period_ms = time_service.timeframe_minutes.get(signal['timeframe'], 0) * 60000
+            if period_ms and now_ms - signal['time'] > self.expiry_bars * period_ms:
+                self._resolve(signal, 'expired', now_ms, None)
+                expired.append(signal['id'])
+        return expired
+
+    def performance(self, symbol: Optional[str] = None) -> Dict[GroupKey, dict]:
+        """Скользящая статистика по группам: исходы последних window сигналов и открытые"""
+        open_counts: Dict[GroupKey, int] = {}
+        for signal in self.open_signals.values():
+            key = (signal['symbol'], signal['timeframe'])
+            open_counts[key] = open_counts.get(key, 0) + 1
+        stats = {}
+        for key in sorted(set(self.results) | set(open_counts)):
+            if symbol is not None and key[0] != symbol:
+                continue
+            results = self.results.get(key, ())
+            wins = sum(1 for result in results if result > 0)
+            stats[key] = {
+                'tp': wins, 'sl': len(results) - wins, 'open': open_counts.get(key, 0),
+                'win_rate': wins / len(results) if results else None,
+                'avg_r': sum(results) / len(results) if results else None,
+            }
+        return stats
+
+    def read(self, path: Optional[str] = None, offset: int = 0) -> Iterator[dict]:
+        """Записи журнала по порядку, начиная с байта offset (недописанная последняя строка пропускается)"""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Поврежденная строка журнала сигналов: {line[:80]!r}")
+
+# Глобальный экземпляр
+signal_journal = SignalJournal(SIGNAL_OUTCOME_RR)
+
+metrics.gauge('open_signals', "Сигналы без исхода", (), lambda: {(): len(signal_journal.open_signals)})
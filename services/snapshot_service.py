@@ -0,0 +1,147 @@
+# snapshot_service.py
+import asyncio
+import logging
+import os
+import pickle
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from config import SNAPSHOT_PATH
+from services.session_service import session_service, running_analyses
+from services.models import Candle
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'HPSNAP2'
+
+class SnapshotService:
+    """Снимок запущенных анализов, буферов свечей и кэша котировок для теплого перезапуска.
+    Файл пишет и читает только сам бот (pickle + zlib)"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._saved = False
+
+    @staticmethod
+    def _price_services():
+        from services.moex_service import moex_service
+        from services.price_service import crypto_service, forex_service
+        return {'crypto': crypto_service, 'forex': forex_service, 'moex': moex_service}
+
+    def collect(self) -> dict:
+        """Состояние для снимка (синхронно, без ожиданий)"""
+        from services.analysis_service import analysis_service
+
+        analyses = []
+        for user_id, session in session_service.sessions.items():
+            if not session.analysis_active or not session.timeframe:
+                continue
+            analyses.append({
+                'user_id': user_id,
+                'timeframe': session.timeframe,
+                'progress_message': session.progress_message,
+            })
+        # Буферы свечей общие для группы (символ, таймфрейм)
+        candles = {
+            key: [(c.open, c.high, c.low, c.close, c.volume, c.timestamp) for c in history]
+            for key, history in analysis_service.candle_history.items()
+        }
+
+        caches = {}
+        for name, service in self._price_services().items():
+            entries = {}
+            for key, entry in service.cache.items():
+                try:
+                    pickle.dumps(entry)
+                except Exception:
+                    continue  # Непереносимые объекты провайдера пропускаем
+                entries[key] = entry
+            caches[name] = entries
+
+        return {'created': time.time(), 'analyses': analyses, 'candles': candles, 'caches': caches}
+
+    def save(self) -> Optional[int]:
+        """Запись снимка при остановке (один раз за процесс)"""
+        if not self.path or self._saved:
+            return None
+        started = time.perf_counter()
+        payload = zlib.compress(pickle.dumps(self.collect(), protocol=pickle.HIGHEST_PROTOCOL))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC + payload)
+        os.replace(temporary, self.path)
+        self._saved = True
+        logger.info(f"📸 Снимок состояния: {len(payload)} байт за {(time.perf_counter() - started) * 1000:.0f} мс")
+        return len(payload)
+
+    def load(self) -> Optional[dict]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as file:
+                raw = file.read()
+            if not raw.startswith(SNAPSHOT_MAGIC):
+                logger.warning(f"Неизвестный формат снимка {self.path}")
+                return None
+            return pickle.loads(zlib.decompress(raw[len(SNAPSHOT_MAGIC):]))
+        except Exception as e:
+            logger.error(f"Не удалось прочитать снимок {self.path}: {e}")
+            return None
+
+    @staticmethod
+    def _fresh_candles(candles: List[tuple], period_ms: int, now_ms: float) -> List[Candle]:
+        """Буфер годен, только если последняя свеча - предыдущая закрытая"""
+        if not candles or now_ms - candles[-1][5] > period_ms * 1.5:
+            return []
+        return [Candle(*candle) for candle in candles]
+
+    async def restore(self) -> Dict[str, int]:
+        """Поднимает кэши и возобновляет анализы до начала приема апдейтов"""
+        from services.analysis_service import analysis_service
+        from services.cleanup_service import cleanup_service
+        from services.time_utils import time_service
+
+        snapshot = self.load()
+        if snapshot is None:
+            return {'analyses': 0, 'cache_entries': 0}
+        started = time.perf_counter()
+
+        cache_entries = 0
+        for name, service in self._price_services().items():
+            for key, (data, timestamp) in snapshot['caches'].get(name, {}).items():
+                if time.time() - timestamp < service.cache_ttl:
+                    service.cache.setdefault(key, (data, timestamp))
+                    cache_entries += 1
+
+        now_ms = time_service.clock.time() * 1000
+        for (symbol, timeframe), candles in snapshot['candles'].items():
+            if timeframe not in time_service.timeframe_minutes:
+                continue
+            period_ms = time_service.timeframe_minutes[timeframe] * 60000
+            # Задача группы подхватит буфер при первой подписке
+            analysis_service.candle_history[(symbol, timeframe)] = self._fresh_candles(candles, period_ms, now_ms)
+
+        restored = 0
+        for analysis in snapshot['analyses']:
+            user_id, timeframe = analysis['user_id'], analysis['timeframe']
+            if user_id in running_analyses or timeframe not in time_service.timeframe_minutes:
+                continue
+            if analysis['progress_message']:
+                # Старое сообщение ожидания заменит новое
+                cleanup_service.schedule(user_id, [analysis['progress_message']])
+
+            task = asyncio.create_task(analysis_service.analyze_candles_with_progress(user_id, timeframe))
+            running_analyses[user_id] = task
+            restored += 1
+
+        os.remove(self.path)  # Снимок одноразовый: повторный старт не поднимет устаревшее
+        logger.info(f"♻️ Восстановлено анализов: {restored}, записей кэша: {cache_entries} "
+                    f"за {(time.perf_counter() - started) * 1000:.0f} мс")
+        return {'analyses': restored, 'cache_entries': cache_entries}
+
+# Глобальный экземпляр
+snapshot_service = SnapshotService(SNAPSHOT_PATH or None)
@@ -2,40 +2,62 @@ from typing import Dict, Optional
 import time
 import logging
 
+from services.cleanup_service import cleanup_service
+from services.session_service import UserSession, session_service
+from services.expiry_service import expiry_service
+from services.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 class StateService:
     """Сервис для управления состоянием пользователей"""
     
     def __init__(self):
-        self.user_navigation_ids: Dict[int, int] = {}
-        self.user_states: Dict[int, dict] = {}
-        self.user_last_activity: Dict[int, float] = {}
-        self.user_calculation_data: Dict[int, dict] = {}  # Отдельное хранилище для данных калькулятора
+        # Поля UserSession в виде словарей user_id → значение
+        self.user_navigation_ids = session_service.view('navigation_id')
+        self.user_states = session_service.view('state')
+        self.user_last_activity = session_service.view('last_activity')
+        self.user_calculation_data = session_service.view('calculation_data')  # Данные калькулятора
     
     def set_navigation_id(self, user_id: int, message_id: int):
         """Установка ID навигационного сообщения для пользователя"""
-        self.user_navigation_ids[user_id] = message_id
-        self.user_last_activity[user_id] = time.time()
+        session = session_service.get_or_create(user_id)
+        session.navigation_id = message_id
+        session.last_activity = time.time()
+        expiry_service.track(user_id)
     
     def get_navigation_id(self, user_id: int) -> Optional[int]:
         """Получение ID навигационного сообщения"""
-        self.user_last_activity[user_id] = time.time()
-        return self.user_navigation_ids.get(user_id)
+        session = session_service.get_or_create(user_id)
+        session.last_activity = time.time()
+        expiry_service.track(user_id)
+        return session.navigation_id
     
     def clear_navigation_id(self, user_id: int):
-        """Очистка ID навигационного сообщения"""
-        if user_id in self.user_navigation_ids:
-            del self.user_navigation_ids[user_id]
-        if user_id in self.user_last_activity:
-            del self.user_last_activity[user_id]
-        if user_id in self.user_states:
-            del self.user_states[user_id]
-        if user_id in self.user_calculation_data:
-            del self.user_calculation_data[user_id]
+        """Очистка ID навигационного сообщения и ввода (настройки и анализ не трогаются)"""
+        session_service.clear_fields(user_id, UserSession.INTERACTION_FIELDS)
+
+    def expire_user(self, user_id: int):
+        """Освобождение данных пользователя (все реестры, см. ExpiryService.expire)"""
+        session = session_service.get(user_id)
+        if session is not None:
+            expiry_service.expire(session)
+        else:
+            cleanup_service.forget(user_id)
     
+    def users_by_state(self) -> Dict[tuple, int]:
+        """Число пользователей по шагу ввода (idle - без активного ввода)"""
+        counts = {('idle',): 0}
+        for session in session_service.sessions.values():
+            if session.state is not None:
+                key = (session.state.get('waiting_for', 'unknown'),)
+                counts[key] = counts.get(key, 0) + 1
+            elif session.last_activity is not None:
+                counts[('idle',)] += 1
+        return counts
+
     def cleanup_inactive_users(self, inactive_time: int = 3600):
-        """Очистка неактивных пользователей"""
+        """Полный проход по неактивным (в работе бот выгружает их порциями через expiry_service)"""
         current_time = time.time()
         users_to_remove = [
             user_id for user_id, last_activity in self.user_last_activity.items()
@@ -43,8 +65,9 @@ class StateService:
         ]
         
         for user_id in users_to_remove:
-            self.clear_navigation_id(user_id)
-            logger.info(f"Cleaned up inactive user: {user_id}")
+            self.expire_user(user_id)
 
 # Глобальный экземпляр сервиса состояния
-state_service = StateService()
\ No newline at end of file
+state_service = StateService()
+
+metrics.gauge('users_by_state', "Пользователи по состоянию ввода", ('state',), state_service.users_by_state)
\ No newline at end of file
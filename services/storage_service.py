@@ -0,0 +1,253 @@
+# storage_service.py
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+
+from services.metrics import metrics
+from services.session_service import session_service
+
+logger = logging.getLogger(__name__)
+
+# Поля UserSession, которые переживают перезапуск
+PERSISTENT_FIELDS = (
+    'subscribed', 'timezone', 'trade_data',
+    'settings_timeframe', 'symbols', 'profiles', 'alerts', 'early_warning',
+    'navigation_id', 'state', 'calculation_data', 'last_activity',
+)
+
+store_writes = metrics.counter('state_store_writes_total', "Записанные в SQLite сессии")
+store_loads = metrics.counter('state_store_loads_total', "Загрузки сессий из SQLite", ('result',))
+
+class SQLiteStore:
+    """Таблица сессий в SQLite (WAL). Все вызовы - из одного потока"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS user_sessions ('
+            'user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)'
+        )
+        self.connection.commit()
+
+    def load(self, user_id: int) -> Optional[dict]:
+        row = self.connection.execute(
+            'SELECT data FROM user_sessions WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_batch(self, upserts: List[Tuple[int, str]], deletes: List[int]):
+        """Одна транзакция на пачку изменений"""
+        now = time.time()
+        with self.connection:
+            if upserts:
+                self.connection.executemany(
+                    'INSERT INTO user_sessions (user_id, data, updated) VALUES (?, ?, ?) '
+                    'ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated = excluded.updated',
+                    [(user_id, data, now) for user_id, data in upserts],
+                )
+            if deletes:
+                self.connection.executemany(
+                    'DELETE FROM user_sessions WHERE user_id = ?', [(user_id,) for user_id in deletes]
+                )
+
+    def field_rows(self, field: str) -> List[Tuple[int, Any]]:
+        """Значение одного поля у всех, у кого оно задано (без загрузки сессий)"""
+        rows = self.connection.execute(
+            'SELECT user_id, json_extract(data, ?) FROM user_sessions WHERE json_extract(data, ?) IS NOT NULL',
+            (f'$.{field}', f'$.{field}'),
+        )
+        return [(user_id, json.loads(value)) for user_id, value in rows]
+
+    def user_ids(self) -> List[int]:
+        return [row[0] for row in self.connection.execute('SELECT user_id FROM user_sessions')]
+
+    def close(self):
+        self.connection.close()
+
+class PersistenceService:
+    """Кэш в памяти (сами сессии) + ленивая загрузка и отложенная пакетная запись в SQLite"""
+
+    def __init__(self, flush_interval: float = 0.5):
+        self.flush_interval = flush_interval
+        self.store: Optional[SQLiteStore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loaded: set = set()  # Пользователи, чьи данные уже подняты из базы
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._dirty: set = set()
+        self._unloaded: Dict[int, Optional[str]] = {}  # Выгруженные, но еще не записанные строки
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    async def start(self, path: str):
+        """Открывает базу в отдельном потоке и запускает фоновую запись"""
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        loop = asyncio.get_running_loop()
+        self.store = await loop.run_in_executor(self._executor, SQLiteStore, path)
+        session_service.listeners.append(self._on_change)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"💾 Состояние пользователей хранится в {path}")
+
+    async def stop(self):
+        if not self.enabled:
+            return
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        session_service.listeners.remove(self._on_change)
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.store.close)
+        self._executor.shutdown(wait=True)
+        self.store = None
+        self._loaded.clear()
+
+    def _on_change(self, user_id: int, field: Optional[str]):
+        if field is None or field in PERSISTENT_FIELDS:
+            self._dirty.add(user_id)
+
+    def mark_dirty(self, user_id: int):
+        if self.enabled:
+            self._dirty.add(user_id)
+
+    async def load(self, user_id: int):
+        """Поднимает данные пользователя при первом обращении"""
+        if not self.enabled or user_id in self._loaded:
+            return
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            await pending
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            if user_id in self._unloaded:
+                # Строка еще не дошла до базы - берем ее из очереди записи
+                row = self._unloaded[user_id]
+                data = json.loads(row) if row else None
+            else:
+                data = await asyncio.get_running_loop().run_in_executor(self._executor, self.store.load, user_id)
+            if data:
+                session = session_service.get_or_create(user_id)
+                for field, value in data.items():
+                    # Изменения, сделанные пока шла загрузка, важнее
+                    if field in PERSISTENT_FIELDS and getattr(session, field) is None:
+                        setattr(session, field, value)
+            store_loads.inc('hit' if data else 'miss')
+            self._loaded.add(user_id)
+        finally:
+            del self._loading[user_id]
+            future.set_result(None)
+
+    async def field_rows(self, field: str) -> List[Tuple[int, Any]]:
+        if not self.enabled:
+            return []
+        await self.flush()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.store.field_rows, field)
+
+    @staticmethod
+    def fields(session) -> dict:
+        return {field: getattr(session, field) for field in PERSISTENT_FIELDS
+                if getattr(session, field) is not None}
+
+    @classmethod
+    def serialize(cls, user_id: int) -> Optional[str]:
+        session = session_service.get(user_id)
+        if session is None:
+            return None
+        data = cls.fields(session)
+        return json.dumps(data, ensure_ascii=False) if data else None
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        if not self.enabled or not (self._dirty or self._unloaded):
+            return
+        dirty, self._dirty = self._dirty, set()
+        unloaded, self._unloaded = self._unloaded, {}
+        rows = dict(unloaded)
+        partial: Dict[int, dict] = {}
+        for user_id in dirty:
+            session = session_service.get(user_id)
+            if session is None or user_id in self._loaded:
+                rows[user_id] = self.serialize(user_id)
+            else:
+                # Сессия создана заново без загрузки (фоновые сервисы) - в ней только измененные поля
+                partial[user_id] = self.fields(session)
+        try:
+            written = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._write, rows, partial
+            )
+            store_writes.inc(value=written)
+        except Exception as e:
+            logger.error(f"Ошибка записи состояния в SQLite: {e}")
+            # Повторим в следующий раз, не затирая более свежие выгрузки
+            self._dirty |= dirty
+            for user_id, data in unloaded.items():
+                self._unloaded.setdefault(user_id, data)
+
+    def _write(self, rows: Dict[int, Optional[str]], partial: Dict[int, dict]) -> int:
+        """В потоке базы: неполные сессии накладываются на сохраненную строку, затем пачка пишется"""
+        rows = dict(rows)
+        for user_id, fields in partial.items():
+            if user_id in rows:
+                base = json.loads(rows[user_id]) if rows[user_id] else {}
+            else:
+                base = self.store.load(user_id) or {}
+            base.update(fields)
+            rows[user_id] = json.dumps(base, ensure_ascii=False) if base else None
+        upserts = [(user_id, data) for user_id, data in rows.items() if data is not None]
+        deletes = [user_id for user_id, data in rows.items() if data is None]
+        self.store.write_batch(upserts, deletes)
+        return len(upserts) + len(deletes)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def unload(self, user_id: int):
+        """Готовит выгрузку сессии из памяти: данные остаются в базе и загрузятся заново при обращении"""
+        if user_id in self._dirty:
+            self._dirty.discard(user_id)
+            self._unloaded[user_id] = self.serialize(user_id)
+        self._loaded.discard(user_id)
+
+class SessionLoadMiddleware(BaseMiddleware):
+    """Загружает сессию до обработчика и помечает ее для записи после"""
+
+    def __init__(self, persistence: PersistenceService):
+        self.persistence = persistence
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+                       event: Any, data: Dict[str, Any]) -> Any:
+        user = data.get('event_from_user')
+        if user is None or not self.persistence.enabled:
+            return await handler(event, data)
+
+        await self.persistence.load(user.id)
+        try:
+            return await handler(event, data)
+        finally:
+            # Обработчики меняют вложенные словари сессии напрямую
+            self.persistence.mark_dirty(user.id)
+
+# Глобальный экземпляр
+persistence_service = PersistenceService()
@@ -0,0 +1,66 @@
+# subscription_service.py
+import logging
+from typing import Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+GroupKey = Tuple[str, str]  # (символ, таймфрейм)
+
+class SubscriptionIndex:
+    """Подписчики анализа, сгруппированные по (символ, таймфрейм): одна группа - одна задача опроса"""
+
+    def __init__(self):
+        self.groups: Dict[GroupKey, Set[int]] = {}
+        self.by_user: Dict[int, Set[GroupKey]] = {}
+
+    def subscribe(self, user_id: int, symbols: Iterable[str], timeframe: str) -> List[GroupKey]:
+        """Заменяет подписки пользователя, возвращает группы, которые появились впервые"""
+        self.unsubscribe(user_id)
+        created = []
+        keys = {(symbol, timeframe) for symbol in symbols}
+        for key in keys:
+            members = self.groups.get(key)
+            if members is None:
+                members = self.groups[key] = set()
+                created.append(key)
+            members.add(user_id)
+        if keys:
+            self.by_user[user_id] = keys
+        return created
+
+    def unsubscribe(self, user_id: int) -> List[GroupKey]:
+        """Снимает все подписки пользователя, возвращает опустевшие группы"""
+        emptied = []
+        for key in self.by_user.pop(user_id, ()):
+            members = self.groups.get(key)
+            if members is None:
+                continue
+            members.discard(user_id)
+            if not members:
+                del self.groups[key]
+                emptied.append(key)
+        return emptied
+
+    def recipients(self, symbol: str, timeframe: str) -> Set[int]:
+        return self.groups.get((symbol, timeframe), set())
+
+    def timeframes(self, symbol: str) -> List[str]:
+        """Таймфреймы, на которые подписаны по символу"""
+        return [timeframe for group_symbol, timeframe in self.groups if group_symbol == symbol]
+
+    def __contains__(self, key: GroupKey) -> bool:
+        return key in self.groups
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def users_by_timeframe(self) -> Dict[tuple, int]:
+        """Число подписчиков по таймфреймам (для метрик)"""
+        counts: Dict[tuple, int] = {}
+        for keys in self.by_user.values():
+            for timeframe in {timeframe for _, timeframe in keys}:
+                counts[(timeframe,)] = counts.get((timeframe,), 0) + 1
+        return counts
+
+# Глобальный экземпляр
+subscription_index = SubscriptionIndex()
@@ -2,9 +2,13 @@ import pytz
 import datetime
 import asyncio
 import aiohttp
+import functools
 import logging
 from typing import Dict, Tuple, Optional
 
+from services.clock import SystemClock
+from services.session_service import session_service
+
 logger = logging.getLogger(__name__)
 
 class TimeService:
@@ -15,6 +19,15 @@ class TimeService:
         }
         self.binance_server_time_diff = 0
         self.last_sync_time = 0
+        self.clock = SystemClock()  # В реплее подменяется на VirtualClock
+
+    def set_clock(self, clock):
+        """Подмена часов (виртуальное время для реплея и тестов)"""
+        self.clock = clock
+
+    async def sleep(self, seconds: float):
+        """Ожидание по часам сервиса"""
+        await self.clock.sleep(seconds)
     
     async def sync_binance_time(self):
         """Синхронизация времени с Binance API"""
@@ -36,7 +49,9 @@ class TimeService:
     
     def get_binance_time(self) -> datetime.datetime:
         """Получение текущего времени по Binance"""
-        local_time = datetime.datetime.now().timestamp()
+        local_time = self.clock.time()
+        if not self.clock.real:
+            return datetime.datetime.fromtimestamp(local_time, pytz.UTC)
         if local_time - self.last_sync_time > 3600:
             asyncio.create_task(self.sync_binance_time())
         
@@ -78,7 +93,8 @@ class TimeService:
 
 class TimeframeManager:
     def __init__(self):
-        self.current_timeframe: Optional[str] = None
+        self.current_timeframe: Optional[str] = None  # По умолчанию для тех, кто не выбирал
+        self.user_timeframes = session_service.view('settings_timeframe')
         self.timeframe_texts = {
             '1d': "1 день",
             '4h': "4 часа", 
@@ -88,26 +104,36 @@ class TimeframeManager:
             '5m': "5 минут"
         }
     
-    def set_timeframe(self, timeframe: str):
-        """Установка текущего таймфрейма"""
+    def set_timeframe(self, timeframe: str, user_id: Optional[int] = None):
+        """Установка таймфрейма пользователя (без user_id - значения по умолчанию)"""
         valid_timeframes = ['1d', '4h', '1h', '30m', '15m', '5m']
         if timeframe in valid_timeframes:
-            self.current_timeframe = timeframe
-            logger.info(f"Timeframe set to {timeframe}")
+            if user_id is None:
+                self.current_timeframe = timeframe
+            else:
+                self.user_timeframes[user_id] = timeframe
+            logger.info(f"Timeframe set to {timeframe} for user {user_id}")
         else:
             logger.warning(f"Invalid timeframe attempt: {timeframe}")
     
-    def get_timeframe(self) -> Optional[str]:
-        """Получение текущего таймфрейма"""
-        return self.current_timeframe
+    def get_timeframe(self, user_id: Optional[int] = None) -> Optional[str]:
+        """Получение таймфрейма пользователя"""
+        if user_id is None:
+            return self.current_timeframe
+        return self.user_timeframes.get(user_id, self.current_timeframe)
     
     def get_timeframe_text(self, timeframe: str) -> str:
         """Получение текстового описания таймфрейма"""
         return self.timeframe_texts.get(timeframe, timeframe)
 
+@functools.lru_cache(maxsize=None)
+def get_tz(name: str):
+    """pytz.timezone с кэшем: без него каждый вызов читает zoneinfo"""
+    return pytz.timezone(name)
+
 class TimezoneService:
     def __init__(self):
-        self.user_timezones: Dict[int, str] = {}
+        self.user_timezones = session_service.view('timezone')
         self.common_timezones = {
             'MSK': 'Europe/Moscow',
             'UTC': 'UTC',
@@ -137,7 +163,7 @@ class TimezoneService:
         """Форматирование времени для пользователя"""
         timezone = self.get_user_timezone(user_id)
         try:
-            user_tz = pytz.timezone(timezone)
+            user_tz = get_tz(timezone)
             user_time = dt.astimezone(user_tz)
             
             tz_abbr = self.get_timezone_abbreviation(timezone)
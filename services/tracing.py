@@ -0,0 +1,100 @@
+# tracing.py
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from config import TRACING_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин в секундах: от 1 мс до суток (ожидание закрытия 1d свечи)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 300, 900, 3600, 14400, 86400,
+)
+
+# Стадии конвейера сигнала в порядке прохождения
+PIPELINE_STAGES = ('wait_close', 'fetch', 'detect', 'send', 'close_to_delivered')
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: запись - bisect и два сложения"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """Накопленные счетчики (граница, число) в формате Prometheus"""
+        result, total = [], 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), self.counts):
+            total += bucket_count
+            result.append((bound, total))
+        return result
+
+class PipelineTracer:
+    """Замеры стадий analyze_group и доставки по символу и таймфрейму"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.histograms: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def observe(self, stage: str, symbol: str, timeframe: str, seconds: float):
+        if not self.enabled:
+            return
+        key = (stage, symbol, timeframe)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage: str, symbol: str, timeframe: str):
+        """Замер стадии по монотонным часам"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, symbol, timeframe, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 по ключу 'стадия symbol timeframe'"""
+        return {
+            f"{stage} {symbol} {timeframe}": {
+                'count': histogram.count,
+                'mean': histogram.sum / histogram.count,
+                'p50': histogram.quantile(0.50),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+            }
+            for (stage, symbol, timeframe), histogram in sorted(self.histograms.items())
+            if histogram.count
+        }
+
+    def reset(self):
+        self.histograms.clear()
+
+# Глобальный экземпляр
+pipeline_tracer = PipelineTracer(enabled=TRACING_ENABLED)
@@ -1,9 +1,14 @@
 # trade_calculator.py
 import logging
-from typing import Dict, Optional
+from typing import Dict, Optional, Sequence
 from dataclasses import dataclass
 import math
 
+import numpy as np
+
+from services.instrument_registry import instrument_registry
+from services.session_service import session_service
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -30,8 +35,9 @@ class TradeParameters:
 class TradeCalculator:
     def __init__(self):
         self.default_risk_percent = 0.005  # 0.5% по умолчанию
-        self.user_data: Dict[int, Dict] = {}  # Хранение данных пользователей
-        self.max_decimal_places = 4  # Максимум 4 знака после запятой
+        self.user_data = session_service.view('trade_data')  # Хранение данных пользователей
+        self.max_decimal_places = 4  # Максимум 4 знака после запятой (если инструмент не указан)
+        self.instruments = instrument_registry  # Шаг лота и минимальная сумма по символу
 
     def save_user_data(self, user_id: int, data: Dict):
         """Сохраняет данные пользователя"""
@@ -48,8 +54,11 @@ class TradeCalculator:
         if user_id in self.user_data:
             del self.user_data[user_id]
 
-    def adjust_volume_to_precision(self, volume: float) -> float:
-        """Округляет объем до 4 знаков после запятой"""
+    def adjust_volume_to_precision(self, volume: float, symbol: Optional[str] = None) -> float:
+        """Округляет объем до шага лота инструмента (без инструмента - до 4 знаков после запятой)"""
+        instrument = self.instruments.get(symbol) if symbol else None
+        if instrument is not None:
+            return instrument.round_volume(volume)
         return round(volume, self.max_decimal_places)
 
     def calculate_required_leverage(self, position_value: float, balance: float) -> float:
@@ -71,6 +80,7 @@ class TradeCalculator:
             risk_reward_ratio = user_data['risk_reward']
             balance = user_data['balance']
             risk_percent = user_data.get('risk_percent', self.default_risk_percent)
+            symbol = user_data.get('symbol')
             
             # Валидация входных данных
             validation_error = self._validate_inputs(
@@ -94,7 +104,10 @@ class TradeCalculator:
             ideal_volume = risk_money / risk_per_unit
             
             # Корректируем объем под ограничения биржи
-            adjusted_volume = self.adjust_volume_to_precision(ideal_volume)
+            adjusted_volume = self.adjust_volume_to_precision(ideal_volume, symbol)
+            notional_error = self._validate_notional(symbol, adjusted_volume, entry_price)
+            if notional_error:
+                return {'error': notional_error}
             
             # Пересчитываем сумму риска с учетом скорректированного объема
             actual_risk_money = adjusted_volume * risk_per_unit
@@ -140,6 +153,91 @@ class TradeCalculator:
             logger.error(f"Unexpected error in trade calculation: {e}")
             return {'error': f'Неожиданная ошибка: {str(e)}'}
 
+    def calculate_batch(self, direction, balance, entry_price, stop_loss, risk_reward,
+                        risk_percent=None, symbol: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Векторный calculate_trade: аргументы - числа или массивы, приводятся друг к другу
+        по правилам broadcasting NumPy (например, стопы столбцом и RR строкой дают сетку).
+        Возвращает поля TradeParameters массивами и маску valid; в невалидных строках NaN.
+        symbol - один инструмент на весь расчет (шаг лота и минимальная сумма).
+        """
+        instrument = self.instruments.get(symbol) if symbol else None
+        if risk_percent is None:
+            risk_percent = self.default_risk_percent
+        direction, balance, entry_price, stop_loss, risk_reward, risk_percent = np.broadcast_arrays(
+            np.char.lower(np.asarray(direction, dtype=str)), np.asarray(balance, dtype=float),
+            np.asarray(entry_price, dtype=float), np.asarray(stop_loss, dtype=float),
+            np.asarray(risk_reward, dtype=float), np.asarray(risk_percent, dtype=float),
+        )
+        is_long = direction == 'long'
+
+        # Те же условия, что в _validate_inputs
+        valid = ((balance > 0) & (entry_price > 0) & (stop_loss > 0) & (risk_reward > 0)
+                 & (entry_price != stop_loss) & (is_long | (direction == 'short'))
+                 & (risk_percent > 0) & (risk_percent <= 0.1)
+                 & np.where(is_long, stop_loss < entry_price, stop_loss > entry_price))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            risk_per_unit = np.abs(entry_price - stop_loss)
+            risk_distance_percent = (risk_per_unit / entry_price) * 100
+            take_profit = np.where(is_long, entry_price + risk_per_unit * risk_reward,
+                                   entry_price - risk_per_unit * risk_reward)
+            risk_money = balance * risk_percent
+            ideal_volume = risk_money / risk_per_unit
+            if instrument is not None:
+                adjusted_volume = np.round(np.round(ideal_volume / instrument.lot_step) * instrument.lot_step,
+                                           instrument.volume_decimals)
+            else:
+                adjusted_volume = np.round(ideal_volume, self.max_decimal_places)
+            position_value = adjusted_volume * entry_price
+            if instrument is not None:
+                valid &= (adjusted_volume > 0) & (position_value >= instrument.min_notional)
+            leverage = np.where(balance > 0, np.maximum(1.0, np.round(position_value / balance, 2)), 1.0)
+            potential_loss = adjusted_volume * np.where(is_long, entry_price - stop_loss, stop_loss - entry_price)
+            potential_profit = adjusted_volume * np.where(is_long, take_profit - entry_price, entry_price - take_profit)
+
+        result = {
+            'entry_price': entry_price, 'direction': direction, 'stop_loss': stop_loss,
+            'take_profit': take_profit, 'risk_reward_ratio': risk_reward, 'balance': balance,
+            'risk_percent': risk_percent, 'risk_money': risk_money, 'volume': ideal_volume,
+            'adjusted_volume': adjusted_volume, 'position_value': position_value,
+            'required_leverage': leverage, 'adjusted_leverage': np.round(leverage, 2),
+            'potential_loss': potential_loss, 'potential_profit': potential_profit,
+            'risk_per_unit': risk_per_unit, 'risk_distance_percent': risk_distance_percent,
+        }
+        for name, values in result.items():
+            if values.dtype.kind == 'f':
+                result[name] = np.where(valid, values, np.nan)
+        result['valid'] = valid
+        return result
+
+    def sizing_grid(self, user_data: Dict, stop_factors: Sequence[float] = (0.5, 0.75, 1, 1.5, 2),
+                    risk_rewards: Sequence[float] = (1, 2, 3, 5)) -> str:
+        """Таблица для одного сообщения: стопы на долях введенной дистанции × варианты RR"""
+        entry_price = user_data['entry_price']
+        distance = entry_price - user_data['stop_loss']
+        stops = entry_price - distance * np.asarray(stop_factors, dtype=float)
+        grid = self.calculate_batch(
+            user_data['direction'], user_data['balance'], entry_price,
+            stops[:, None], np.asarray(risk_rewards, dtype=float)[None, :],
+            user_data.get('risk_percent', self.default_risk_percent), user_data.get('symbol'),
+        )
+        header = f"{'Стоп':>10} {'Объем':>10} {'Плечо':>6}" + "".join(f"{f'TP 1:{rr:g}':>10}" for rr in risk_rewards)
+        lines = [header]
+        for row, stop in enumerate(stops):
+            if not grid['valid'][row, 0]:
+                lines.append(f"{stop:>10.2f} {'-':>10} {'-':>6}")
+                continue
+            lines.append(
+                f"{stop:>10.2f} {self.format_volume(grid['adjusted_volume'][row, 0], user_data.get('symbol')):>10} "
+                f"{grid['adjusted_leverage'][row, 0]:>6.2f}"
+                + "".join(f"{take_profit:>10.2f}" for take_profit in grid['take_profit'][row])
+            )
+        # Риск в деньгах фиксирован, поэтому прибыль зависит только от RR (с точностью до округления объема)
+        profits = np.nanmedian(grid['potential_profit'], axis=0) if grid['valid'].any() else []
+        lines.append("Прибыль: " + ", ".join(f"1:{rr:g} ${profit:.2f}" for rr, profit in zip(risk_rewards, profits)))
+        return "\n".join(lines)
+
     def _validate_inputs(self, entry_price, direction, stop_loss, 
                         risk_reward_ratio, balance, risk_percent):
         """Валидация входных параметров"""
@@ -165,6 +263,17 @@ class TradeCalculator:
         
         return None
 
+    def _validate_notional(self, symbol, volume, entry_price):
+        """Ограничения биржи для инструмента: ненулевой объем и минимальная сумма позиции"""
+        instrument = self.instruments.get(symbol) if symbol else None
+        if instrument is None:
+            return None
+        if volume <= 0:
+            return f'Объем меньше шага лота {symbol} ({instrument.lot_step:g})'
+        if volume * entry_price < instrument.min_notional:
+            return f'Сумма позиции меньше минимальной для {symbol} ({instrument.min_notional:g})'
+        return None
+
     def _calculate_take_profit(self, entry_price, direction, risk_per_unit, risk_reward_ratio):
         """Расчет тейк-профита"""
         if direction.lower() == 'long':
@@ -183,9 +292,11 @@ class TradeCalculator:
         
         return potential_loss, potential_profit
 
-    def format_volume(self, volume: float) -> str:
-        """Форматирование объема для вывода"""
-        return f"{volume:.{self.max_decimal_places}f}"
+    def format_volume(self, volume: float, symbol: Optional[str] = None) -> str:
+        """Форматирование объема для вывода (знаков как в шаге лота инструмента)"""
+        instrument = self.instruments.get(symbol) if symbol else None
+        decimals = instrument.volume_decimals if instrument is not None else self.max_decimal_places
+        return f"{volume:.{decimals}f}"
 
     def format_leverage(self, leverage: float) -> str:
         """Форматирование плеча для вывода"""
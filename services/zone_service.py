@@ -0,0 +1,116 @@
+# zone_service.py
+import bisect
+import itertools
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from services.interval_index import IntervalIndex
+from services.metrics import metrics
+from services.models import Candle, Zone
+
+logger = logging.getLogger(__name__)
+
+zone_events = metrics.counter('order_block_zone_events_total', "События зон ордерблоков", ('event',))
+
+class ZoneBook:
+    """Открытые зоны одной пары (символ, таймфрейм)"""
+
+    def __init__(self):
+        self.zones: Dict[int, Zone] = {}
+        self.index = IntervalIndex()  # Касание ценой: пересечение с диапазоном свечи
+        self.bull_lows: List[Tuple[float, int]] = []  # Бычья зона сломана закрытием ниже low
+        self.bear_highs: List[Tuple[float, int]] = []  # Медвежья - закрытием выше high
+        self.order: Deque[Tuple[int, int]] = deque()  # (время создания, id) для истечения по возрасту
+
+    def add(self, zone: Zone):
+        self.zones[zone.zone_id] = zone
+        self.index.add(zone.zone_id, zone.low, zone.high)
+        if zone.block_type == 'buy':
+            bisect.insort(self.bull_lows, (zone.low, zone.zone_id))
+        else:
+            bisect.insort(self.bear_highs, (zone.high, zone.zone_id))
+        self.order.append((zone.created, zone.zone_id))
+
+    def remove(self, zone_id: int) -> Optional[Zone]:
+        zone = self.zones.pop(zone_id, None)
+        if zone is None:
+            return None
+        self.index.remove(zone_id)
+        if zone.block_type == 'buy':
+            entries, entry = self.bull_lows, (zone.low, zone_id)
+        else:
+            entries, entry = self.bear_highs, (zone.high, zone_id)
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+        return zone
+
+    def invalidated(self, close: float) -> List[int]:
+        """Зоны, которые пробиты закрытием"""
+        broken = [zone_id for _, zone_id in self.bull_lows[bisect.bisect_right(self.bull_lows, (close, float('inf'))):]]
+        broken += [zone_id for _, zone_id in self.bear_highs[:bisect.bisect_left(self.bear_highs, (close, -1))]]
+        return broken
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+class ZoneTracker:
+    """Реестр зон ордерблоков: каждая новая свеча проверяется против всех открытых зон
+    через индексы (пробой - bisect по границам, касание - индекс интервалов)"""
+
+    def __init__(self, max_age_candles: int = 100):
+        self.max_age_candles = max_age_candles
+        self.books: Dict[Tuple[str, str], ZoneBook] = {}
+        self._ids = itertools.count(1)
+
+    def add_zone(self, symbol: str, timeframe: str, block_type: str, candle: Candle) -> Zone:
+        """Зона ордерблока - диапазон свечи перед импульсом"""
+        zone = Zone(next(self._ids), symbol, timeframe, block_type, candle.low, candle.high, int(candle.timestamp))
+        book = self.books.get((symbol, timeframe))
+        if book is None:
+            book = self.books[(symbol, timeframe)] = ZoneBook()
+        book.add(zone)
+        zone_events.inc('created')
+        return zone
+
+    def on_candle(self, symbol: str, timeframe: str, candle: Candle, period_ms: int) -> List[Zone]:
+        """Снимает устаревшие и пробитые зоны, возвращает зоны, которые цена проверила впервые"""
+        book = self.books.get((symbol, timeframe))
+        if book is None:
+            return []
+
+        oldest = candle.timestamp - self.max_age_candles * period_ms
+        while book.order and book.order[0][0] < oldest:
+            _, zone_id = book.order.popleft()
+            if book.remove(zone_id) is not None:
+                zone_events.inc('expired')
+
+        for zone_id in book.invalidated(candle.close):
+            book.remove(zone_id)
+            zone_events.inc('invalidated')
+
+        retested = []
+        for zone_id in book.index.overlap(candle.low, candle.high):
+            zone = book.zones[zone_id]
+            if zone.created >= candle.timestamp:
+                continue  # Свеча самой зоны
+            book.remove(zone_id)
+            retested.append(zone)
+            zone_events.inc('retested')
+
+        if not book:
+            del self.books[(symbol, timeframe)]
+        return retested
+
+    def drop(self, symbol: str, timeframe: str):
+        """Группа больше не опрашивается - ее зоны не отследить"""
+        self.books.pop((symbol, timeframe), None)
+
+    def __len__(self) -> int:
+        return sum(len(book) for book in self.books.values())
+
+# Глобальный экземпляр
+zone_tracker = ZoneTracker()
+
+metrics.gauge('order_block_zones', "Открытые зоны ордерблоков", (), lambda: {(): len(zone_tracker)})
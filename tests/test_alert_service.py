@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from services.alert_service import AlertService
+from services.session_service import session_service
+from services.storage_service import PersistenceService
+
+def test_alert_fires_when_price_crosses_level(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    alerts = AlertService()
+    level = alerts.add_alert(1, 'BTCUSDT', 100000)
+    zone = alerts.add_alert(2, 'BTCUSDT', 90000, 95000)
+    alerts.add_alert(3, 'ETHUSDT', 100000)
+
+    assert alerts.check('BTCUSDT', 98000) == []  # Первая цена только запоминается
+    assert alerts.check('BTCUSDT', 101000) == [(1, level)]  # Уровень пересечен между проверками
+    assert sorted(alerts.check('BTCUSDT', 94000)) == [(1, level), (2, zone)]
+
+    assert alerts.remove_alert(1, level)
+    assert 1 not in alerts.user_alerts
+    with pytest.raises(ValueError):
+        alerts.add_alert(1, 'BTCUSDT', 5, 1)
+
+def test_persisted_alerts_are_indexed_without_loading_sessions(monkeypatch, tmp_path):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    sent = []
+
+    class FakeBot:
+        async def send_message(self, chat_id, text):
+            sent.append((chat_id, text))
+
+    monkeypatch.setattr('config.bot', FakeBot())
+
+    async def scenario():
+        persistence = PersistenceService()
+        monkeypatch.setattr('services.storage_service.persistence_service', persistence)
+        await persistence.start(str(tmp_path / 'state.db'))
+        AlertService().add_alert(7, 'EURUSD', 1.1)
+        await persistence.flush()
+        session_service.sessions.clear()
+        persistence._loaded.clear()
+
+        restarted = AlertService()
+        restarted.restore(await persistence.field_rows('alerts'))
+        assert 7 not in session_service.sessions
+        await restarted.fire('EURUSD', 1.09)
+        await restarted.fire('EURUSD', 1.11)
+        await persistence.flush()
+        remaining = await persistence.field_rows('alerts')
+        await persistence.stop()
+        return restarted, remaining
+
+    restarted, remaining = asyncio.run(scenario())
+    assert [chat_id for chat_id, _ in sent] == [7]
+    assert remaining == [] and restarted.levels == {}
@@ -0,0 +1,34 @@
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.load_test import compare, percentiles
+
+def test_fake_api_enforces_per_chat_and_global_limits():
+    api = FakeBotAPI(global_rate=3, per_chat_rate=1, jitter=0)
+
+    assert not api._is_rate_limited('sendmessage', 1, 0.0)
+    assert api._is_rate_limited('sendmessage', 1, 0.5)
+    assert not api._is_rate_limited('editmessagetext', 1, 0.5)
+    assert not api._is_rate_limited('sendmessage', 2, 0.6)
+    # Глобальное окно заполнено тремя успешными вызовами
+    assert api._is_rate_limited('sendmessage', 3, 0.7)
+    assert not api._is_rate_limited('sendmessage', 1, 1.1)
+
+def test_percentiles_in_milliseconds():
+    stats = percentiles([0.001 * value for value in range(1, 101)])
+    assert stats['count'] == 100
+    assert round(stats['p50']) == 51
+    assert round(stats['p99']) == 100
+
+def test_compare_flags_p95_and_api_call_regressions():
+    previous = {
+        'handler_latency_ms': {'/start': {'p95': 100.0}},
+        'close_to_signal_ms': {'p95': 50.0},
+        'api_calls': {'start': {'per_flow': 2.0}},
+    }
+    current = {
+        'handler_latency_ms': {'/start': {'p95': 130.0}},
+        'close_to_signal_ms': {'p95': 52.0},
+        'api_calls': {'start': {'per_flow': 3.0}},
+    }
+    regressions = compare(current, previous, threshold=0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('handler_latency_ms[/start]')
@@ -0,0 +1,158 @@
+import asyncio
+
+from services.analysis_service import analysis_service
+from services.candle_aggregator import CandleFeed, SymbolAggregator
+from services.models import Candle
+from services.time_utils import time_service
+
+START = 1735689600000  # 2025-01-01 00:00 UTC
+
+def _candles(count, minutes=5, start=START):
+    return [Candle(100 + i, 101 + i + (i % 7), 99 + i - (i % 5), 100.5 + i, 10, start + i * minutes * 60000)
+            for i in range(count)]
+
+def test_rollup_matches_direct_aggregation():
+    aggregator = SymbolAggregator(time_service.timeframe_minutes)
+    aggregator.configure('5m')
+    closes = {}
+    for candle in _candles(288):
+        for timeframe, rolled in aggregator.ingest(candle).items():
+            closes.setdefault(timeframe, []).append(rolled)
+
+    assert {timeframe: len(candles) for timeframe, candles in closes.items()} == {
+        '5m': 288, '15m': 96, '30m': 48, '1h': 24, '4h': 6, '1d': 1}
+    source = _candles(288)
+    for index, hour in enumerate(closes['1h']):
+        part = source[index * 12:(index + 1) * 12]
+        assert hour.timestamp == START + index * 3600000
+        assert (hour.open, hour.close) == (part[0].open, part[-1].close)
+        assert hour.high == max(c.high for c in part) and hour.low == min(c.low for c in part)
+        assert hour.volume == 120
+    assert closes['1d'][0].high == max(c.high for c in source)
+
+def test_warmup_and_session_gap():
+    aggregator = SymbolAggregator(time_service.timeframe_minutes)
+    aggregator.configure('1h')
+    # Старт в 02:00: свеча 4h 00:00-04:00 неполная и не выдается
+    hours = _candles(10, minutes=60, start=START + 2 * 3600000)
+    assert '4h' not in aggregator.ingest(hours[0]) and '4h' not in aggregator.ingest(hours[1])
+    # 04:00-08:00 без последнего часа (перерыв сессии): закрывается на границе периода
+    for candle in hours[2:5]:
+        aggregator.ingest(candle)
+    flushed = aggregator.flush(START + 8 * 3600000)
+    assert flushed['4h'].timestamp == START + 4 * 3600000
+    assert flushed['4h'].close == hours[4].close
+    # После перерыва (08:00 нет) период с первой же свечи считается полным
+    for candle in hours[7:9]:
+        aggregator.ingest(candle)
+    closed = aggregator.ingest(hours[9])
+    assert closed['4h'].timestamp == START + 8 * 3600000 and closed['4h'].open == hours[7].open
+
+def _bar(candle):
+    return {'open': candle.open, 'high': candle.high, 'low': candle.low,
+            'close': candle.close, 'volume': candle.volume}
+
+def test_one_fetch_per_base_period_for_all_timeframes(monkeypatch):
+    source = iter(_candles(24))
+    fetched = []
+
+    async def fetch_bar(symbol, timeframe):
+        fetched.append(symbol)
+        await asyncio.sleep(0)
+        return _bar(next(source))
+
+    monkeypatch.setattr(analysis_service, 'fetch_bar', fetch_bar)
+    for user_id, timeframe in ((1, '5m'), (2, '15m'), (3, '1h')):
+        analysis_service.subscriptions.subscribe(user_id, ['BTCUSDT'], timeframe)
+    feed = CandleFeed()
+
+    async def scenario():
+        received = {}
+        for index in range(1, 25):
+            close = (START + index * 300000) / 1000
+            # Все группы, чья свеча закрылась сейчас, просят ее одновременно
+            closing = [tf for tf in ('5m', '15m', '1h') if index % (time_service.timeframe_minutes[tf] // 5) == 0]
+            candles = await asyncio.gather(*(feed.candle('BTCUSDT', tf, close) for tf in closing))
+            for timeframe, candle in zip(closing, candles):
+                received.setdefault(timeframe, []).append(candle)
+        return received
+
+    try:
+        received = asyncio.run(scenario())
+    finally:
+        for user_id in (1, 2, 3):
+            analysis_service.subscriptions.unsubscribe(user_id)
+
+    assert len(fetched) == 24
+    assert [len(received[tf]) for tf in ('5m', '15m', '1h')] == [24, 8, 2]
+    assert received['1h'][1].open == _candles(24)[12].open
+    assert feed.latest('BTCUSDT', '1h') is received['1h'][1]
+
+def test_feed_rolls_up_closed_intraday_bars_not_day_snapshots(monkeypatch):
+    from services.price_service import crypto_service
+
+    # Разные внутридневные бары: экстремумы часа у отдельных свечей, объемы разные
+    bars = [{'open': 100 + i, 'high': 101 + i + (5 if i == 7 else 0), 'low': 99 + i - (4 if i == 3 else 0),
+             'close': 100.5 + i, 'volume': 10 + i} for i in range(12)]
+    requested = []
+
+    def get_bar_from_api(symbol, interval):
+        requested.append((symbol, interval))
+        return dict(bars[len(requested) - 1])
+
+    monkeypatch.setattr(crypto_service, '_get_bar_from_api', get_bar_from_api)
+    monkeypatch.setattr(crypto_service, 'cache', {})
+    for user_id, timeframe in ((1, '5m'), (2, '1h')):
+        analysis_service.subscriptions.subscribe(user_id, ['BTCUSDT'], timeframe)
+    feed = CandleFeed()
+
+    async def scenario():
+        for index in range(1, 13):
+            await feed.candle('BTCUSDT', '5m', (START + index * 300000) / 1000)
+        return await feed.candle('BTCUSDT', '1h', (START + 12 * 300000) / 1000)
+
+    try:
+        hour = asyncio.run(scenario())
+    finally:
+        for user_id in (1, 2):
+            analysis_service.subscriptions.unsubscribe(user_id)
+
+    # Каждое закрытие - свежий запрос бара базового таймфрейма, мимо кэша котировок
+    assert requested == [('BTCUSDT', '5m')] * 12 and crypto_service.cache == {}
+    assert (hour.open, hour.close) == (100, 111.5)
+    assert hour.high == 113 and hour.low == 98
+    assert hour.volume == sum(bar['volume'] for bar in bars)
+
+def test_feed_resolves_signals_of_unsubscribed_timeframes(tmp_path, monkeypatch):
+    import sys
+    from services.models import Zone
+    from services.signal_journal import SignalJournal
+
+    journal = SignalJournal(risk_reward=2)
+    journal.open(str(tmp_path / 'signals.jsonl'))
+    # Сигнал 4h остался после отписки: стоп 95, тейк 110
+    signal_id = journal.record(Zone(1, 'BTCUSDT', '4h', 'buy', 95, 98, START), 100, START)
+    monkeypatch.setattr(sys.modules['services.candle_aggregator'], 'signal_journal', journal)
+    bars = iter([{'open': 100, 'high': 104, 'low': 99, 'close': 103, 'volume': 1},
+                 {'open': 103, 'high': 111, 'low': 102, 'close': 109, 'volume': 1}])
+
+    async def fetch_bar(symbol, timeframe):
+        return next(bars)
+
+    monkeypatch.setattr(analysis_service, 'fetch_bar', fetch_bar)
+    analysis_service.subscriptions.subscribe(1, ['BTCUSDT'], '5m')
+    feed = CandleFeed()
+
+    async def scenario():
+        for index in (1, 2):
+            await feed.candle('BTCUSDT', '5m', (START + index * 300000) / 1000)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        analysis_service.subscriptions.unsubscribe(1)
+        journal.close()
+
+    assert journal.open_signals == {}
+    assert journal.performance()[('BTCUSDT', '4h')]['tp'] == 1
+    assert signal_id == 1
@@ -0,0 +1,114 @@
+import asyncio
+
+import numpy as np
+
+from benchmarks.replay import load_store
+from services.analysis_service import analysis_service
+from services.candle_aggregator import CandleFeed
+from services.candle_store import CANDLE_DTYPE, GROW_RECORDS, MAGIC, CandleSeries, CandleStore, candle_store
+from services.clock import VirtualClock
+from services.models import Candle
+from services.time_utils import time_service
+
+START = 1735689600000  # 2025-01-01 00:00 UTC
+HOUR = 3600000
+
+def _candle(index, period=HOUR):
+    return Candle(100 + index, 102 + index, 99 + index, 101 + index, 5, START + index * period)
+
+def test_append_range_and_reopen(tmp_path):
+    path = str(tmp_path / 'BTCUSDT_1h.candles')
+    series = CandleSeries(path)
+    for index in range(1000):
+        assert series.append(_candle(index))
+    assert not series.append(_candle(500))  # Только по возрастанию времени
+
+    records = series.range(START + 10 * HOUR, START + 20 * HOUR)
+    assert list(records['timestamp']) == [START + i * HOUR for i in range(10, 20)]
+    assert records['close'][0] == 111
+    # Срез смотрит прямо в отображенный файл
+    assert not records.flags.owndata and not records.flags.writeable
+    assert np.shares_memory(records, series.records())
+    series.close()
+
+    # Недописанная запись после падения отрезается
+    with open(path, 'ab') as file:
+        file.write(b'\0' * (CANDLE_DTYPE.itemsize // 2))
+    series = CandleSeries(path)
+    assert len(series) == 1000 and series.last_timestamp == START + 999 * HOUR
+    assert series.append(_candle(1000))
+    assert len(series.range(START + 995 * HOUR)) == 6
+    series.close()
+
+def test_map_grows_in_chunks_and_reads_create_nothing(tmp_path):
+    store = CandleStore()
+    store.open(str(tmp_path))
+    assert len(store.range('ETHUSDT', '1h')) == 0 and store.candles('ETHUSDT', '4h') == []
+    assert store.keys() == [] and list(tmp_path.iterdir()) == []
+
+    for index in range(GROW_RECORDS + 10):
+        store.append('BTCUSDT', '1h', _candle(index))
+        assert len(store.range('BTCUSDT', '1h')) == index + 1
+    series = store.series('BTCUSDT', '1h')
+    assert series.remaps == 2  # Отображение пересоздается по мере роста запаса, а не на каждую запись
+    path = tmp_path / 'BTCUSDT_1h.candles'
+    assert path.stat().st_size == len(MAGIC) + 2 * GROW_RECORDS * CANDLE_DTYPE.itemsize
+
+    # Читатель другого процесса видит записи без нулевого запаса и ничего не меняет
+    reader = CandleStore()
+    reader.open(str(tmp_path), writable=False)
+    assert len(reader.range('BTCUSDT', '1h')) == GROW_RECORDS + 10
+    assert not reader.append('BTCUSDT', '1h', _candle(GROW_RECORDS + 10))
+    reader.close()
+    assert path.stat().st_size == len(MAGIC) + 2 * GROW_RECORDS * CANDLE_DTYPE.itemsize
+
+    store.close()
+    assert path.stat().st_size == len(MAGIC) + (GROW_RECORDS + 10) * CANDLE_DTYPE.itemsize
+    assert store.keys() == [] and CandleStore().keys() == []
+    store.open(str(tmp_path))
+    assert store.keys() == [('BTCUSDT', '1h')]
+    store.close()
+
+def _bar(candle):
+    return {'open': candle.open, 'high': candle.high, 'low': candle.low,
+            'close': candle.close, 'volume': candle.volume}
+
+def test_closed_candles_are_stored_and_seed_history(tmp_path, monkeypatch):
+    source = iter([_candle(index, 300000) for index in range(24)])
+
+    async def fetch_bar(symbol, timeframe):
+        return _bar(next(source))
+
+    monkeypatch.setattr(analysis_service, 'fetch_bar', fetch_bar)
+    analysis_service.subscriptions.subscribe(1, ['BTCUSDT'], '1h')
+    analysis_service.subscriptions.subscribe(2, ['BTCUSDT'], '5m')
+    candle_store.open(str(tmp_path))
+    previous = time_service.clock
+    try:
+        feed = CandleFeed()
+
+        async def scenario():
+            for index in range(1, 25):
+                await feed.candle('BTCUSDT', '5m', (START + index * 300000) / 1000)
+
+        asyncio.run(scenario())
+        assert len(candle_store.range('BTCUSDT', '5m')) == 24
+        hours = candle_store.candles('BTCUSDT', '1h')
+        assert [candle.timestamp for candle in hours] == [START, START + HOUR]
+        assert hours[1].open == 112 and hours[1].close == 124
+
+        # Свечи закрылись на прошлой границе - история поднимается из хранилища
+        time_service.set_clock(VirtualClock((START + 2 * HOUR) / 1000 + 30))
+        assert [c.timestamp for c in analysis_service.stored_history('BTCUSDT', '1h')] == [START, START + HOUR]
+        # Через час простоя последняя свеча уже не соседняя
+        time_service.set_clock(VirtualClock((START + 3 * HOUR) / 1000 + 30))
+        assert analysis_service.stored_history('BTCUSDT', '1h') == []
+
+        candle_store.close()
+        streams = load_store(str(tmp_path), ['BTCUSDT'], '5m')
+        assert np.allclose([c.close for c in streams['BTCUSDT']], [101 + i for i in range(24)])
+    finally:
+        time_service.set_clock(previous)
+        candle_store.close()
+        for user_id in (1, 2):
+            analysis_service.subscriptions.unsubscribe(user_id)
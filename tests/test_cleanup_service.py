@@ -0,0 +1,95 @@
+import asyncio
+import sys
+
+import pytest
+
+from services.cleanup_service import CleanupService
+
+cleanup_module = sys.modules['services.cleanup_service']
+
+class FakeBot:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.calls.append(('delete_messages', chat_id, list(message_ids)))
+        await asyncio.sleep(self.delay)
+
+    async def delete_message(self, chat_id, message_id):
+        self.calls.append(('delete_message', chat_id, message_id))
+        await asyncio.sleep(self.delay)
+
+@pytest.fixture
+def fake_bot(monkeypatch):
+    bot = FakeBot()
+    monkeypatch.setattr(cleanup_module, 'bot', bot)
+    return bot
+
+def test_delete_splits_into_batches_of_100(fake_bot):
+    service = CleanupService()
+    deleted = asyncio.run(service.delete(1, range(1, 251)))
+
+    assert deleted == 250
+    assert [len(call[2]) for call in fake_bot.calls] == [100, 100, 50]
+    assert all(call[0] == 'delete_messages' for call in fake_bot.calls)
+
+def test_single_id_uses_delete_message(fake_bot):
+    service = CleanupService()
+    asyncio.run(service.delete(1, [42]))
+
+    assert fake_bot.calls == [('delete_message', 1, 42)]
+
+def test_delete_range_only_known(fake_bot):
+    service = CleanupService()
+    for message_id in (5, 7, 30):
+        service.track(1, message_id)
+
+    deleted = asyncio.run(service.delete_range(1, 1, 10, only_known=True))
+
+    assert deleted == 2
+    assert fake_bot.calls == [('delete_messages', 1, [5, 7])]
+    assert list(service.known_messages[1]) == [30]
+
+def test_delete_range_includes_user_messages(fake_bot):
+    service = CleanupService()
+    service.track(1, 5)
+
+    deleted = asyncio.run(service.delete_range(1, 4, 6))
+
+    assert deleted == 3
+    assert fake_bot.calls == [('delete_messages', 1, [4, 5, 6])]
+    assert 1 not in service.known_messages
+
+def test_track_evicts_oldest_above_cap():
+    service = CleanupService(max_known_per_chat=3)
+    for message_id in (1, 2, 3, 4):
+        service.track(1, message_id)
+
+    assert list(service.known_messages[1]) == [2, 3, 4]
+
+def test_forget_chat_drops_known_and_pending():
+    service = CleanupService()
+    service.track(1, 5)
+    service.pending[1] = {6}
+    service.forget(1)
+
+    assert 1 not in service.known_messages
+    assert 1 not in service.pending
+
+def test_schedule_during_inflight_flush(monkeypatch):
+    bot = FakeBot(delay=0.2)
+    monkeypatch.setattr(cleanup_module, 'bot', bot)
+
+    async def scenario():
+        service = CleanupService(flush_delay=0.05)
+        service.schedule(1, [10])
+        await asyncio.sleep(0.1)  # flush уже ждет ответа сети
+        service.schedule(2, [20])
+        await asyncio.sleep(1)
+        return service
+
+    service = asyncio.run(scenario())
+
+    assert service.pending == {}
+    assert ('delete_message', 2, 20) in bot.calls
@@ -0,0 +1,56 @@
+import asyncio
+import tracemalloc
+
+from services.analysis_service import analysis_service
+from services.diagnostics import approx_size, memory_diagnostics
+from services.metrics import metrics
+from services.state_service import state_service
+
+def test_approx_size_counts_nested_content():
+    small = {1: 'x'}
+    big = {1: [str(index) * 1000 for index in range(10)]}
+    assert approx_size(big) > approx_size(small) + 10000
+
+def test_registry_sizes_cover_every_per_user_store():
+    sizes = memory_diagnostics.registry_sizes()
+    for name in ('state.user_states', 'trade_calculator.user_data', 'timezone.user_timezones',
+                 'analysis.subscriptions', 'progress.progress_messages', 'session.running_analyses', 'session.sessions'):
+        assert {'entries', 'bytes'} <= set(sizes[name])
+
+def test_cleanup_user_analysis_leaves_nothing_behind():
+    user_id = 424242
+    leaks = metrics.metrics['analysis_cleanup_leaks_total'].values
+    before = sum(leaks.values())
+
+    async def scenario():
+        analysis_service.active_analyses[user_id] = True
+        analysis_service.subscriptions.subscribe(user_id, ['BTCUSDT'], '5m')
+        analysis_service.last_prices[user_id] = 1.0
+        analysis_service.user_tasks[user_id] = asyncio.current_task()
+        analysis_service.user_timeframes[user_id] = '5m'
+        await analysis_service.cleanup_user_analysis(user_id)
+
+    asyncio.run(scenario())
+    assert memory_diagnostics.survivors(user_id) == []
+    assert sum(leaks.values()) == before
+
+def test_check_cleanup_flags_survivors(monkeypatch):
+    monkeypatch.setitem(analysis_service.last_prices, 7, 1.0)
+    assert memory_diagnostics.check_cleanup(7) == ['analysis.last_prices']
+    assert metrics.metrics['analysis_cleanup_leaks_total'].values[('analysis.last_prices',)] >= 1
+
+def test_stale_users_and_tracemalloc_diff(monkeypatch):
+    monkeypatch.setattr(state_service, 'user_last_activity', {})
+    monkeypatch.setitem(analysis_service.last_prices, 99, 1.0)
+    assert memory_diagnostics.stale_users()['analysis.last_prices'] == [99]
+
+    memory_diagnostics.start_tracing(1)
+    try:
+        memory_diagnostics.snapshot_diff()
+        hold = [bytearray(1024) for _ in range(200)]
+        diff = memory_diagnostics.snapshot_diff()
+        assert any('test_diagnostics.py' in line for line in diff)
+        del hold
+    finally:
+        tracemalloc.stop()
+        memory_diagnostics._previous = None
@@ -0,0 +1,131 @@
+import asyncio
+import sys
+
+from services.analysis_service import analysis_service
+from services.clock import VirtualClock
+from services.early_warning import EarlyWarningService
+from services.models import Candle, ScanProfile
+from services.session_service import session_service
+from services.time_utils import time_service
+
+analysis_module = sys.modules['services.analysis_service']
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+class Data:
+    def __init__(self, close):
+        self.indicators = {'close': close}
+
+def _setup(monkeypatch, prices):
+    fake_bot = FakeBot()
+    fetched = []
+    monkeypatch.setattr(analysis_module, 'bot', fake_bot)
+    monkeypatch.setattr(session_service, 'sessions', {})
+
+    async def fetch_price(symbol, max_age=None):
+        fetched.append(symbol)
+        return Data(prices.pop(0) if prices else 95.0)
+
+    monkeypatch.setattr(analysis_service, 'fetch_price', fetch_price)
+    service = EarlyWarningService(interval=60, min_gap=300)
+    for user_id in (1, 2, 3):
+        analysis_service.active_analyses[user_id] = True
+        analysis_service.profiles.compile(user_id, [ScanProfile('p', ['BTCUSDT'])], '4h')
+        analysis_service.subscriptions.subscribe(user_id, ['BTCUSDT'], '4h')
+    service.users.add(1)
+    service.users.add(2)
+    return service, fake_bot, fetched
+
+def _teardown():
+    for user_id in (1, 2, 3):
+        analysis_service.profiles.remove(user_id)
+        analysis_service.subscriptions.unsubscribe(user_id)
+
+def _run(service, until, *watch_args):
+    async def scenario():
+        clock = VirtualClock(0)
+        previous = time_service.clock
+        time_service.set_clock(clock)
+        try:
+            tasks = [asyncio.create_task(service.watch(*args)) for args in watch_args]
+            await clock.run(tasks, until)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            time_service.set_clock(previous)
+
+    asyncio.run(scenario())
+
+def test_provisional_alert_once_per_candle_then_confirmed(monkeypatch):
+    prev = Candle(100, 101.5, 99.5, 101, 0, 0)  # Зеленая, тело 1
+    service, fake_bot, fetched = _setup(monkeypatch, [100.5, 99.2, 98.0, 97.5])
+    monkeypatch.setattr(time_service, 'sleep', lambda seconds: time_service.clock.sleep(seconds))
+    try:
+        assert service.wanted('BTCUSDT', '4h')
+        # Две группы одного символа делят опрос цены
+        _run(service, 600, ('BTCUSDT', '4h', prev), ('BTCUSDT', '1h', prev))
+        assert len(fetched) <= 10
+
+        warned = [chat_id for chat_id, text in fake_bot.sent if 'формируется' in text]
+        assert sorted(warned) == [1, 2]  # Пользователь 3 режим не включал
+
+        asyncio.run(service.resolve('BTCUSDT', '4h', 'sell'))
+        confirmed = [chat_id for chat_id, text in fake_bot.sent if text.startswith('✅')]
+        assert sorted(confirmed) == [1, 2]
+        assert ('BTCUSDT', '4h') not in service.pending
+    finally:
+        _teardown()
+
+def test_cancel_at_close_and_symbol_throttle(monkeypatch):
+    prev = Candle(100, 101.5, 99.5, 101, 0, 0)
+    service, fake_bot, _ = _setup(monkeypatch, [98.0])
+    monkeypatch.setattr(time_service, 'sleep', lambda seconds: time_service.clock.sleep(seconds))
+    try:
+        _run(service, 120, ('BTCUSDT', '4h', prev))
+        asyncio.run(service.resolve('BTCUSDT', '4h', None))
+        assert sum(text.startswith('❌') for _, text in fake_bot.sent) == 2
+
+        # Следующая свеча сразу после предупреждения - в пределах min_gap новое не уходит
+        assert not service._allowed('BTCUSDT', 130)
+        assert service._allowed('BTCUSDT', 60 + 301)
+    finally:
+        _teardown()
+
+def test_polled_price_is_not_older_than_interval(monkeypatch):
+    from services.price_service import crypto_service
+
+    calls = []
+
+    def from_api(symbol):
+        calls.append(time_service.clock.time())
+        return Data(100.0 + len(calls))
+
+    monkeypatch.setattr(analysis_module, 'bot', FakeBot())
+    monkeypatch.setattr(crypto_service, 'cache', {})
+    monkeypatch.setattr(crypto_service, 'now', lambda: time_service.clock.time())
+    monkeypatch.setattr(crypto_service, '_get_price_from_api', from_api)
+    service = EarlyWarningService(interval=60, min_gap=300)
+    seen = []
+
+    async def scenario():
+        clock = VirtualClock(0)
+        previous = time_service.clock
+        time_service.set_clock(clock)
+        try:
+            for step in range(1, 11):
+                clock.now = 60.0 * step
+                seen.append(await service.current_price('BTCUSDT'))
+        finally:
+            time_service.set_clock(previous)
+
+    asyncio.run(scenario())
+    # Кэш котировок живет 300 с, но каждый опрос раз в минуту видит новую цену
+    assert crypto_service.cache_ttl > service.interval
+    assert calls == [60.0 * step for step in range(1, 11)]
+    assert seen == [100.0 + step for step in range(1, 11)]
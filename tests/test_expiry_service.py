@@ -0,0 +1,75 @@
+import asyncio
+
+from services.expiry_service import ExpiryService
+from services.session_service import session_service
+from services.state_service import state_service
+from services.storage_service import persistence_service
+from services.time_utils import timezone_service
+
+def _session(user_id: int, last_activity: float):
+    session = session_service.get_or_create(user_id)
+    session.navigation_id = user_id * 10
+    session.last_activity = last_activity
+    return session
+
+def test_heap_reschedules_active_users_and_evicts_idle(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    expiry = ExpiryService(inactive_time=3600)
+    for user_id in (1, 2, 3):
+        _session(user_id, 0.0)
+        expiry.track(user_id, now=0.0)
+
+    session_service.get(2).last_activity = 3000.0
+    assert expiry.evict_expired(now=3700) == 2
+    assert list(session_service.sessions) == [2]
+
+    assert expiry.evict_expired(now=6599) == 0
+    assert expiry.evict_expired(now=6601) == 1
+    assert session_service.sessions == {} and len(expiry) == 0
+
+def test_eviction_runs_in_bounded_slices(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    expiry = ExpiryService(inactive_time=10, budget=200)
+    for user_id in range(1000):
+        _session(user_id, 0.0)
+        expiry.track(user_id, now=0.0)
+
+    assert [expiry.evict_expired(now=100) for _ in range(6)] == [200, 200, 200, 200, 200, 0]
+
+def test_running_analysis_and_preferences_survive_expiry(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    expiry = ExpiryService(inactive_time=10)
+    _session(1, 0.0).analysis_active = True
+    _session(2, 0.0).timezone = 'UTC'
+    session_service.get(2).trade_data = {'balance': 1}
+    for user_id in (1, 2):
+        expiry.track(user_id, now=0.0)
+
+    assert expiry.evict_expired(now=100) == 2
+    assert session_service.get(1).analysis_active and session_service.get(1).navigation_id is None
+    session = session_service.get(2)
+    assert (session.timezone, session.trade_data, session.navigation_id) == ('UTC', None, None)
+    # Сброс полей не возвращает пользователя в индекс
+    assert len(expiry) == 0
+
+def test_expired_session_is_unloaded_to_sqlite_and_reloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    expiry = ExpiryService(inactive_time=10)
+
+    async def scenario():
+        await persistence_service.start(str(tmp_path / 'state.db'))
+        try:
+            state_service.set_navigation_id(5, 50)
+            timezone_service.set_user_timezone(5, 'Asia/Tokyo')
+            session_service.get(5).last_activity = 0.0
+            expiry.track(5, now=0.0)
+
+            assert expiry.evict_expired(now=100) == 1
+            assert session_service.get(5) is None
+            await persistence_service.load(5)
+            return session_service.get(5)
+        finally:
+            await persistence_service.stop()
+
+    session = asyncio.run(scenario())
+    assert session.timezone == 'Asia/Tokyo' and session.navigation_id is None
@@ -0,0 +1,130 @@
+import time
+
+import numpy as np
+
+import services.export_service as export_module
+from services.candle_store import CandleStore
+from services.export_service import ColumnarExporter
+from services.models import Candle, Zone
+from services.signal_journal import SignalJournal
+
+START = 1735689600000  # 2025-01-01 00:00 UTC
+HOUR = 3600000
+
+def _fill(store, symbol, timeframe, count, offset=0):
+    for index in range(offset, offset + count):
+        store.append(symbol, timeframe, Candle(100 + index, 101 + index, 99 + index, 100.5 + index, 1, START + index * HOUR))
+
+def test_incremental_export_and_pruned_reads(tmp_path, monkeypatch):
+    store = CandleStore()
+    store.open(str(tmp_path / 'candles'))
+    _fill(store, 'BTCUSDT', '1h', 24 * 40)  # Январь и часть февраля
+    _fill(store, 'ETHUSDT', '1h', 24)
+
+    exporter = ColumnarExporter(str(tmp_path / 'export'))
+    assert exporter.export_candles(store) == 24 * 41
+    _fill(store, 'BTCUSDT', '1h', 24, offset=24 * 40)
+    assert exporter.export_candles(store) == 24  # Только новые строки
+    store.close()
+
+    # Манифест переживает перезапуск, чтение всех частей совпадает с исходником
+    exporter = ColumnarExporter(str(tmp_path / 'export'))
+    data = exporter.read('candles', symbols=['BTCUSDT'])
+    assert list(data) == [('BTCUSDT', '1h')]
+    btc = data[('BTCUSDT', '1h')]
+    assert np.array_equal(btc['timestamp'], START + np.arange(24 * 41) * HOUR)
+    assert np.array_equal(btc['close'], 100.5 + np.arange(24 * 41))
+
+    loaded = []
+    load_parts = exporter._load_parts
+
+    def counting(parts, columns):
+        loaded.extend(part['month'] for part in parts)
+        return load_parts(parts, columns)
+
+    monkeypatch.setattr(exporter, '_load_parts', counting)
+    february = START + 31 * 24 * HOUR
+    data = exporter.read('candles', columns=['close'], start=february, end=february + 2 * HOUR)
+    assert set(loaded) == {'2025-02'}  # Январские части и ETHUSDT даже не открываются
+    assert sorted(data[('BTCUSDT', '1h')]) == ['close', 'timestamp']
+    assert list(data[('BTCUSDT', '1h')]['close']) == [100.5 + 31 * 24, 101.5 + 31 * 24]
+
+def test_parts_are_compacted_and_signals_exported(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_module, 'MAX_PARTS', 3)
+    store = CandleStore()
+    store.open(str(tmp_path / 'candles'))
+    exporter = ColumnarExporter(str(tmp_path / 'export'))
+    for day in range(6):
+        _fill(store, 'BTCUSDT', '1h', 24, offset=day * 24)
+        exporter.export_candles(store)
+    store.close()
+    parts = exporter.manifest['candles']['BTCUSDT/1h']['parts']
+    assert len(parts) <= 3 and sum(part['rows'] for part in parts) == 6 * 24
+    assert len(exporter.read('candles')[('BTCUSDT', '1h')]['timestamp']) == 6 * 24
+
+    journal = SignalJournal()
+    journal.open(str(tmp_path / 'signals.jsonl'))
+    for index, block_type in enumerate(('buy', 'sell', 'buy')):
+        zone = Zone(index, 'BTCUSDT', '1h', block_type, 99.0, 101.0, START + index * HOUR)
+        journal.record(zone, 100.0 + index, START + (index + 1) * HOUR)
+    # Продажа от верхней границы зоны без риска не отслеживается
+    journal.on_candle('BTCUSDT', Candle(100, 120, 80, 100, 1, START + 5 * HOUR))
+    journal.close()
+    assert exporter.export_signals(SignalJournal().read(str(tmp_path / 'signals.jsonl'))) == 5
+    signals = exporter.read('signals')[('BTCUSDT', '1h')]
+    assert list(signals['direction']) == [1, -1, 1] and list(signals['id']) == [1, 2, 3]
+    outcomes = exporter.read('outcomes')[('BTCUSDT', '1h')]
+    assert sorted(outcomes['id']) == [1, 3] and set(outcomes['result']) == {-1}
+
+def test_year_of_5m_candles_loads_quickly(tmp_path):
+    exporter = ColumnarExporter(str(tmp_path))
+    rows = 365 * 288
+    timestamps = START + np.arange(rows, dtype=np.int64) * 300000
+    prices = 100 + np.cumsum(np.random.default_rng(1).normal(0, 0.1, rows))
+    for index in range(5):
+        exporter.append('candles', (f"SYM{index}", '5m'), {
+            'timestamp': timestamps, 'open': prices, 'high': prices + 0.1,
+            'low': prices - 0.1, 'close': prices, 'volume': np.ones(rows),
+        })
+
+    started = time.perf_counter()
+    data = ColumnarExporter(str(tmp_path)).read('candles')
+    elapsed = time.perf_counter() - started
+    assert sum(len(columns['close']) for columns in data.values()) == 5 * rows
+    assert elapsed < 2
+
+def test_worker_journals_are_tracked_per_source(tmp_path):
+    journals = []
+    for worker in (0, 1):
+        journal = SignalJournal()
+        journal.open(str(tmp_path / f'signals.jsonl.{worker}'), worker=worker)
+        journals.append(journal)
+
+    def record(worker, hour):
+        zone = Zone(hour, 'BTCUSDT', '1h', 'buy', 99.0, 101.0, START)
+        return journals[worker].record(zone, 100.0, START + hour * HOUR)
+
+    ids = [record(0, 2), record(0, 4), record(1, 1), record(1, 3)]
+    assert len(set(ids)) == 4 and ids[2] > ids[1]  # Блок id воркера 1 - после воркера 0
+
+    exporter = ColumnarExporter(str(tmp_path / 'export'))
+
+    def export():
+        return sum(exporter.export_signals(SignalJournal().read(str(tmp_path / f'signals.jsonl.{worker}')),
+                                           source=f'signals.jsonl.{worker}') for worker in (0, 1))
+
+    # Строки воркера 1 старше последней строки воркера 0, но не теряются
+    assert export() == 4
+    ids.append(record(1, 5))
+    assert export() == 1
+    for journal in journals:
+        journal.close()
+
+    signals = ColumnarExporter(str(tmp_path / 'export')).read('signals')[('BTCUSDT', '1h')]
+    assert list(signals['timestamp']) == [START + hour * HOUR for hour in (1, 2, 3, 4, 5)]
+    assert sorted(signals['id']) == sorted(ids)
+    # Перезапуск воркера продолжает свой блок id
+    restored = SignalJournal()
+    restored.open(str(tmp_path / 'signals.jsonl.1'), worker=1)
+    assert restored.last_id == ids[-1]
+    restored.close()
@@ -0,0 +1,73 @@
+import asyncio
+
+import numpy as np
+
+from services.analysis_service import analysis_service
+from services.instrument_registry import PROVIDERS, InstrumentRegistry, instrument_registry
+from services.price_service import crypto_service, forex_service, tradingview_service
+from services.trade_calculator import trade_calculator
+
+def _write(path, rows):
+    path.write_text("symbol,provider,screener,exchange,tick_size,lot_step,min_notional\n"
+                    + "".join(row + "\n" for row in rows), encoding='utf-8')
+    return str(path)
+
+def test_shipped_database_routes_default_symbols():
+    for symbol in ('BTCUSDT', 'ETHUSDT'):
+        assert instrument_registry.provider(symbol) is crypto_service
+    for symbol in ('EURUSD', 'GBPUSD'):
+        assert instrument_registry.provider(symbol) is forex_service
+    assert instrument_registry.provider('UNKNOWN') is None
+    assert asyncio.run(analysis_service.fetch_price('UNKNOWN')) is None
+
+def test_load_builds_hash_index_and_skips_bad_rows(tmp_path, monkeypatch):
+    calls = []
+
+    class Provider:
+        def __init__(self, instrument):
+            self.instrument = instrument
+
+        async def get_price(self, symbol, max_age=None):
+            calls.append((self.instrument.exchange, symbol))
+            return symbol
+
+    monkeypatch.setitem(PROVIDERS, 'fake', Provider)
+    rows = [f"SYM{index},fake,crypto,EX{index % 3},0.01,0.001,10" for index in range(500)]
+    rows += ["BAD,fake,crypto,EX,0,0.1,0", "NOPE,unknown,crypto,EX,0.01,1,0", "OOPS,fake,crypto,EX,x,1,0",
+             "btcbybit,tradingview,crypto,BYBIT,0.1,0.001,"]
+    registry = InstrumentRegistry()
+    assert registry.load(_write(tmp_path / 'instruments.csv', rows)) == 501
+
+    assert 'SYM499' in registry and 'BAD' not in registry and 'NOPE' not in registry
+    assert registry.symbols()[-1] == 'BTCBYBIT'
+    # Новая биржа TradingView - отдельный сервис со своим кэшем, повторно не создается
+    assert registry.provider('BTCBYBIT') is tradingview_service('crypto', 'BYBIT')
+    assert registry.get('BTCBYBIT').min_notional == 0
+
+    monkeypatch.setattr(analysis_service, 'instruments', registry)
+    assert asyncio.run(analysis_service.fetch_price('SYM7')) == 'SYM7'
+    assert calls == [('EX1', 'SYM7')]
+
+def test_calculator_uses_lot_step_and_min_notional(tmp_path, monkeypatch):
+    registry = InstrumentRegistry()
+    registry.load(_write(tmp_path / 'instruments.csv', [
+        "BTCUSDT,tradingview,crypto,BINANCE,0.01,0.001,100",
+        "EURUSD,tradingview,forex,FX_IDC,0.00001,1000,0",
+    ]))
+    monkeypatch.setattr(trade_calculator, 'instruments', registry)
+    trade = {'direction': 'long', 'balance': 10000, 'entry_price': 1.1, 'stop_loss': 1.097, 'risk_reward': 2}
+
+    # Без символа - как раньше, 4 знака
+    assert trade_calculator.calculate_trade(trade)['success'].adjusted_volume == 16666.6667
+    forex = trade_calculator.calculate_trade(dict(trade, symbol='EURUSD'))['success']
+    assert forex.adjusted_volume == 17000 and trade_calculator.format_volume(forex.adjusted_volume, 'EURUSD') == '17000'
+
+    btc = {'direction': 'short', 'balance': 100, 'entry_price': 60000, 'stop_loss': 61234, 'risk_reward': 2,
+           'symbol': 'BTCUSDT'}
+    assert 'меньше шага лота' in trade_calculator.calculate_trade(btc)['error']
+    assert 'меньше минимальной' in trade_calculator.calculate_trade(dict(btc, balance=250))['error']
+    assert trade_calculator.calculate_trade(dict(btc, balance=100000))['success'].adjusted_volume == 0.405
+
+    balances = np.array([100, 250, 100000])
+    batch = trade_calculator.calculate_batch('short', balances, 60000, 61234, 2, symbol='BTCUSDT')
+    assert list(batch['valid']) == [False, False, True] and batch['adjusted_volume'][2] == 0.405
@@ -0,0 +1,39 @@
+import math
+import random
+
+from services.interval_index import IntervalIndex
+
+def _brute(intervals, low, high):
+    return sorted(key for key, (start, end) in intervals.items() if start <= high and end >= low)
+
+def test_matches_brute_force_under_incremental_updates():
+    rng = random.Random(3)
+    index = IntervalIndex(buffer_size=8)
+    expected = {}
+    for step in range(3000):
+        key = rng.randrange(400)
+        if rng.random() < 0.3:
+            index.remove(key)
+            expected.pop(key, None)
+        else:
+            start = rng.uniform(0, 1000)
+            end = start + rng.expovariate(1 / 20)
+            if rng.random() < 0.05:
+                start = None  # Открытый снизу диапазон
+            index.add(key, start, end)
+            expected[key] = (-math.inf if start is None else start, end)
+        if step % 50 == 0:
+            point = rng.uniform(0, 1000)
+            assert sorted(index.stab(point)) == _brute(expected, point, point)
+            low = rng.uniform(0, 1000)
+            assert sorted(index.overlap(low, low + 30)) == _brute(expected, low, low + 30)
+    assert len(index) == len(expected)
+
+def test_replacing_interval_moves_key():
+    index = IntervalIndex(buffer_size=1)
+    index.add('a', 10, 20)
+    index.rebuild()
+    index.add('a', 30, 40)
+    assert index.stab(15) == [] and index.stab(35) == ['a']
+    index.add('b', 35)  # Без верхней границы
+    assert sorted(index.stab(1e9)) == ['b']
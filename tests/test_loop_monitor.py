@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from benchmarks.load_test import compare
+from services.loop_monitor import LoopMonitor
+from services.time_utils import get_tz
+
+def blocking_handler():
+    time.sleep(0.3)
+
+def test_watchdog_samples_stack_of_blocking_callback():
+    monitor = LoopMonitor(interval=0.01, threshold=0.1)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+
+    assert max(monitor.lags) >= 0.25
+    assert len(monitor.samples) == 1
+    assert 'blocking_handler' in monitor.samples[0]
+    assert monitor.percentiles()['max'] >= 0.25
+
+def test_compare_flags_loop_lag_regression():
+    def results(lag_p95):
+        return {
+            'handler_latency_ms': {}, 'api_calls': {},
+            'close_to_signal_ms': {'count': 0},
+            'loop_lag_ms': {'count': 100, 'p95': lag_p95},
+        }
+
+    assert compare(results(10.0), results(10.0)) == []
+    assert any(line.startswith('loop_lag_ms') for line in compare(results(30.0), results(10.0)))
+
+def test_timezones_are_cached():
+    assert get_tz('Europe/Moscow') is get_tz('Europe/Moscow')
@@ -0,0 +1,86 @@
+import asyncio
+import socket
+
+import aiohttp
+from aiogram.methods import SendMessage
+
+from services.metrics import MetricsRegistry, MetricsServer, metrics
+from services.price_service import PriceService
+from services.rate_limiter import OutboundMiddleware, RateLimiter
+from services.session_service import session_service
+from services.state_service import state_service
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_render_counters_gauges_and_histograms():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', "Запросы", ('method',))
+    registry.gauge('depth', "Очередь", (), lambda: {(): 3})
+    latency = registry.histogram('latency_seconds', "Задержка", ('provider',))
+
+    requests.inc('sendMessage')
+    requests.inc('sendMessage')
+    latency.observe(0.02, 'crypto')
+
+    text = registry.render()
+    assert 'requests_total{method="sendMessage"} 2' in text
+    assert 'depth 3' in text
+    assert 'latency_seconds_bucket{provider="crypto",le="0.025"} 1' in text
+    assert 'latency_seconds_bucket{provider="crypto",le="+Inf"} 1' in text
+    assert 'latency_seconds_count{provider="crypto"} 1' in text
+
+def test_price_cache_hits_and_provider_errors_are_counted(monkeypatch):
+    service = PriceService('crypto', 'TEST')
+    monkeypatch.setattr(service, '_get_price_from_api', lambda symbol: None if symbol == 'BAD' else {'close': 1})
+    cache = metrics.metrics['price_cache_requests_total'].values
+    errors = metrics.metrics['price_provider_errors_total'].values
+    before = (cache.get(('crypto', 'hit'), 0), cache.get(('crypto', 'miss'), 0), errors.get(('crypto',), 0))
+
+    async def scenario():
+        await service.get_price('OK')
+        await service.get_price('OK')
+        await service.get_price('BAD')
+
+    asyncio.run(scenario())
+    after = (cache[('crypto', 'hit')], cache[('crypto', 'miss')], errors[('crypto',)])
+    assert tuple(a - b for a, b in zip(after, before)) == (1, 2, 1)
+
+def test_middleware_counts_calls_per_method():
+    class FreeLimiter(RateLimiter):
+        async def acquire(self, chat_id=None):
+            pass
+
+    async def make_request(bot, method):
+        return True
+
+    calls = metrics.metrics['bot_api_requests_total'].values
+    before = calls.get(('sendMessage',), 0)
+    asyncio.run(OutboundMiddleware(FreeLimiter())(make_request, None, SendMessage(chat_id=1, text='x')))
+    assert calls[('sendMessage',)] == before + 1
+
+def test_endpoint_serves_registry_on_running_loop(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    state_service.set_navigation_id(1, 10)
+    state_service.set_navigation_id(2, 11)
+    state_service.user_states[2] = {'waiting_for': 'balance'}
+    port = _free_port()
+
+    async def scenario():
+        server = MetricsServer(metrics, '127.0.0.1', port)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                    return response.status, await response.text()
+        finally:
+            await server.stop()
+
+    status, text = asyncio.run(scenario())
+    assert status == 200
+    assert 'users_by_state{state="idle"} 1' in text
+    assert 'users_by_state{state="balance"} 1' in text
+    assert 'bot_api_queue_depth 0' in text
+    assert '# TYPE analysis_tasks gauge' in text
@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import json
+import os
+
+import pytz
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from services.analysis_service import analysis_service
+from services.instrument_registry import instrument_registry
+from services.moex_service import MoexService, moex_service
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'iss')
+PAGE = 5  # У ISS страница свечей - 500 строк, здесь меньше, чтобы проверить листание
+MSK = pytz.timezone('Europe/Moscow')
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+        return json.load(file)
+
+async def _serve(requests):
+    """Локальный ISS: записанные ответы, свечи отдаются страницами по параметру start"""
+    markets = {'index': _fixture('index_marketdata.json'), 'shares': _fixture('shares_marketdata.json')}
+    candles = _fixture('imoex_candles_60.json')['candles']
+
+    async def securities(request):
+        requests.append((request.match_info['market'], dict(request.query)))
+        return web.json_response(markets[request.match_info['market']])
+
+    async def candle_page(request):
+        requests.append(('candles', dict(request.query)))
+        start = int(request.query.get('start', 0))
+        # Как ISS: свечи с началом в [from, till]
+        begin = candles['columns'].index('begin')
+        rows = [row for row in candles['data'] if request.query['from'] <= row[begin] <= request.query.get('till', '9999')]
+        return web.json_response({'candles': {'columns': candles['columns'], 'data': rows[start:start + PAGE]}})
+
+    app = web.Application()
+    app.router.add_get('/iss/engines/stock/markets/{market}/securities.json', securities)
+    app.router.add_get('/iss/engines/stock/markets/index/boards/SNDX/securities/IMOEX/candles.json', candle_page)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+def _service(server, **kwargs):
+    service = MoexService(str(server.make_url('/iss')), **kwargs)
+    for symbol in ('SBER', 'GAZP'):
+        service.register(instrument_registry.get(symbol))
+    return service
+
+def test_concurrent_prices_share_one_request_per_market():
+    async def scenario():
+        requests = []
+        server = await _serve(requests)
+        service = _service(server)
+        try:
+            quotes = await asyncio.gather(*(service.get_price(symbol) for symbol in ('IMOEX', 'SBER', 'GAZP', 'SBER')))
+            cached = await service.get_price('SBER')
+            assert await service.get_price('UNKNOWN') is None
+            single = _service(server, batch_size=1)
+            await asyncio.gather(*(single.get_price(symbol) for symbol in ('SBER', 'GAZP')))
+            await single.close()
+        finally:
+            await service.close()
+            await server.close()
+        return requests, quotes, cached
+
+    requests, (imoex, sber, gazp, again), cached = asyncio.run(scenario())
+    assert [market for market, _ in requests[:2]] == ['index', 'shares']
+    assert requests[1][1]['securities'] == 'SBER,GAZP' and requests[1][1]['iss.only'] == 'marketdata'
+    assert len(requests) == 4  # Две пачки по одной бумаге у второго сервиса
+    assert imoex.indicators == {'open': 2835.40, 'high': 2870.08, 'low': 2830.12, 'close': 2861.55, 'volume': 0.0}
+    # Режим торгов из базы инструментов: TQBR, а не SMAL
+    assert sber.indicators['close'] == 275.51 and sber.indicators['volume'] == 52381140
+    assert gazp.indicators['open'] == 119.5 and again is sber and cached is sber
+
+def test_candles_are_paged_and_rolled_up_to_bot_timeframes():
+    async def scenario():
+        requests = []
+        server = await _serve(requests)
+        service = _service(server)
+        try:
+            start = MSK.localize(datetime.datetime(2025, 1, 9))
+            candles = await service.get_candles('IMOEX', 60, start)
+            pages = len(requests)
+            evening = MSK.localize(datetime.datetime(2025, 1, 10, 18, 30)).timestamp()
+            hourly = await service.get_ohlc('IMOEX', '1h', 2, now=evening)
+            four_hours = await service.get_ohlc('IMOEX', '4h', 1, now=evening + 1800)
+        finally:
+            await service.close()
+            await server.close()
+        return requests, pages, candles, hourly, four_hours
+
+    requests, pages, candles, hourly, four_hours = asyncio.run(scenario())
+    assert len(candles) == 18 and pages == 18 // PAGE + 2  # Последняя страница пустая
+    assert [query['start'] for _, query in requests[:pages]] == ['0', '5', '10', '15', '18']
+    assert requests[0][1]['from'] == '2025-01-09 00:00:00' and requests[0][1]['interval'] == '60'
+    assert candles[0]['begin'] == MSK.localize(datetime.datetime(2025, 1, 9, 10))
+
+    # Свеча 18:00 еще формируется
+    assert [candle['begin'].hour for candle in hourly] == [17, 16]
+    # 4h по московскому времени: 16:00-19:59 еще формируется, последняя закрытая - 12:00-15:59
+    rows = candles[-7:-3]
+    (bar,) = four_hours
+    assert bar['begin'] == MSK.localize(datetime.datetime(2025, 1, 10, 12))
+    assert bar['begin'].utcoffset() == hourly[0]['begin'].utcoffset()  # Одно соглашение для begin
+    assert (bar['open'], bar['close']) == (rows[0]['open'], rows[-1]['close'])
+    assert bar['high'] == max(row['high'] for row in rows) and bar['low'] == min(row['low'] for row in rows)
+
+def test_ohlc_pages_back_over_long_holidays():
+    async def scenario():
+        requests = []
+        server = await _serve(requests)
+        service = _service(server)
+        try:
+            after_holidays = MSK.localize(datetime.datetime(2025, 1, 20, 12)).timestamp()
+            hourly = await service.get_ohlc('IMOEX', '1h', 3, now=after_holidays)
+        finally:
+            await service.close()
+            await server.close()
+        return requests, hourly
+
+    requests, hourly = asyncio.run(scenario())
+    assert [candle['begin'].hour for candle in hourly] == [18, 17, 16]
+    assert hourly[0]['begin'].day == 10
+    # Окна назад: 4 дня, затем вдвое больше, пока не нашлись свечи; каждое следующее кончается перед предыдущим
+    windows = [query for _, query in requests if query.get('start') == '0']
+    assert [query['from'] for query in windows] == ['2025-01-16 08:00:00', '2025-01-12 04:00:00',
+                                                    '2025-01-03 20:00:00']
+    assert [query.get('till') for query in windows] == [None, '2025-01-16 07:59:59', '2025-01-12 03:59:59']
+
+def test_imoex_routes_through_registry(monkeypatch):
+    async def scenario():
+        requests = []
+        server = await _serve(requests)
+        monkeypatch.setattr(moex_service, 'base_url', str(server.make_url('/iss')))
+        monkeypatch.setattr(moex_service, 'cache', {})
+        # Запись ISS - за 10 января 2025
+        monkeypatch.setattr(moex_service, 'now', lambda: MSK.localize(datetime.datetime(2025, 1, 11, 9)).timestamp())
+        try:
+            index = await analysis_service.get_imoex_current_price()
+            candle = await analysis_service.get_candle_data('IMOEX', '1h')
+            data = await analysis_service.fetch_price('IMOEX')
+        finally:
+            await moex_service.close()
+            await server.close()
+        return index, candle, data
+
+    index, candle, data = asyncio.run(scenario())
+    assert instrument_registry.provider('IMOEX') is moex_service
+    assert index == 2861.55 and data.indicators['close'] == index
+    last = _fixture('imoex_candles_60.json')['candles']['data'][-1]
+    assert (candle.open, candle.close) == (last[0], last[1])
+    assert candle.timestamp == int(MSK.localize(datetime.datetime(2025, 1, 10, 18)).timestamp() * 1000)
@@ -0,0 +1,88 @@
+import asyncio
+import sys
+
+import pytest
+
+from services.analysis_service import analysis_service
+from services.models import ScanProfile
+from services.profile_service import ProfileIndex, profile_service
+from services.session_service import session_service
+from services.storage_service import PersistenceService
+from services.time_utils import time_service
+
+analysis_module = sys.modules['services.analysis_service']
+SUPPORTED = ['BTCUSDT', 'ETHUSDT', 'EURUSD']
+
+def test_parse_profile_arguments():
+    profile = profile_service.parse('swing btcusdt,ETHUSDT бычий 100000-110000', SUPPORTED)
+    assert profile == ScanProfile('swing', ['BTCUSDT', 'ETHUSDT'], 'buy', 100000.0, 110000.0)
+    assert profile_service.parse('any EURUSD', SUPPORTED).block_type is None
+    assert profile_service.parse('cap EURUSD sell -1.2', SUPPORTED).price_max == 1.2
+
+    for bad in ('lonely', 'x DOGEUSDT', 'x BTCUSDT maybe', 'x BTCUSDT 5-1'):
+        with pytest.raises(ValueError):
+            profile_service.parse(bad, SUPPORTED)
+
+def test_index_matches_only_the_signal_key():
+    index = ProfileIndex()
+    index.compile(1, [ScanProfile('a', ['BTCUSDT'], 'buy', 100, 200)], '5m')
+    index.compile(2, [ScanProfile('b', ['BTCUSDT', 'ETHUSDT'])], '5m')
+    symbols = index.compile(3, [ScanProfile('c', ['ETHUSDT'], 'sell'), ScanProfile('d', ['BTCUSDT'], 'sell', 300)], '1h')
+    assert symbols == ['ETHUSDT', 'BTCUSDT']
+
+    assert sorted(index.match('BTCUSDT', '5m', 'buy', 150)) == [1, 2]
+    assert index.match('BTCUSDT', '5m', 'buy', 250) == [2]
+    assert index.match('BTCUSDT', '5m', 'sell', 150) == [2]
+    assert index.match('BTCUSDT', '1h', 'sell', 250) == []
+    assert index.match('BTCUSDT', '1h', 'sell', 350) == [3]
+    assert index.match('EURUSD', '5m', 'buy', 1.0) == []
+
+    index.remove(2)
+    assert index.match('BTCUSDT', '5m', 'sell', 150) == []
+    assert ('ETHUSDT', '5m', 'buy') not in index.entries
+
+def test_profiles_persist_and_filter_delivery(monkeypatch, tmp_path):
+    sent = []
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, parse_mode=None):
+            sent.append(chat_id)
+
+    async def no_sleep(seconds):
+        return None
+
+    async def idle_group(symbol, timeframe):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(analysis_module, 'bot', FakeBot())
+    monkeypatch.setattr(time_service, 'sleep', no_sleep)
+    monkeypatch.setattr(analysis_service, 'analyze_group', idle_group)
+    monkeypatch.setattr(session_service, 'sessions', {})
+
+    async def scenario():
+        persistence = PersistenceService()
+        await persistence.start(str(tmp_path / 'state.db'))
+        profile_service.save_profile(1, ScanProfile('bulls', ['BTCUSDT'], 'buy'))
+        profile_service.save_profile(2, ScanProfile('cheap', ['BTCUSDT'], None, None, 100))
+        await persistence.flush()
+        session_service.sessions.clear()
+        await persistence.load(1)
+        loaded = profile_service.get_profiles(1)
+        await persistence.load(2)
+        await persistence.stop()
+
+        for user_id in (1, 2):
+            analysis_service.active_analyses[user_id] = True
+            analysis_service.subscribe(user_id, ['ETHUSDT'], '5m', profile_service.get_profiles(user_id))
+        groups = sorted(analysis_service.group_tasks)
+        await analysis_service.deliver_signal('BTCUSDT', '5m', 'buy', 150.0, 'signal', None)
+        await analysis_service.deliver_signal('BTCUSDT', '5m', 'sell', 90.0, 'signal', None)
+        for user_id in (1, 2):
+            await analysis_service.unsubscribe(user_id)
+        return loaded, groups
+
+    loaded, groups = asyncio.run(scenario())
+    assert loaded == [ScanProfile('bulls', ['BTCUSDT'], 'buy')]
+    assert groups == [('BTCUSDT', '5m')]
+    assert sent == [1, 2]
+    assert analysis_service.profiles.by_user == {}
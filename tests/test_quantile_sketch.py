@@ -0,0 +1,39 @@
+import random
+import sys
+
+from services.analysis_service import analysis_service
+from services.models import Candle
+from services.quantile_sketch import BodySizeStats, P2Quantile
+
+def test_p2_tracks_percentiles_of_long_streams():
+    rng = random.Random(5)
+    values = [rng.lognormvariate(0, 1) for _ in range(20000)]
+    for p in (0.5, 0.8, 0.95):
+        sketch = P2Quantile(p)
+        for value in values:
+            sketch.add(value)
+        exact = sorted(values)[int(p * len(values))]
+        assert abs(sketch.value() - exact) / exact < 0.05
+    # Память не растет с длиной потока
+    assert len(sketch.heights) == 5 and sys.getsizeof(sketch) < 200
+
+def test_threshold_filters_small_impulses():
+    stats = BodySizeStats(percentile=80, warmup=20)
+    assert stats.threshold('BTCUSDT', '5m') is None
+    for index in range(100):
+        stats.observe('BTCUSDT', '5m', float(index % 10 + 1))
+    threshold = stats.threshold('BTCUSDT', '5m')
+    assert 7 <= threshold <= 9.5
+    assert stats.threshold('ETHUSDT', '5m') is None
+
+    doji = Candle(100, 101, 99, 100.2, 0, 0)  # Тело 0.2
+    normal = Candle(100.2, 104, 98, 98.6, 0, 1)  # Тело 1.6 - в 8 раз больше, но мало
+    assert analysis_service.analyze_order_block(doji, normal) == 'sell'
+    assert analysis_service.analyze_order_block(doji, normal, threshold) is None
+    strong = Candle(100.2, 110, 90, 90.0, 0, 1)
+    assert analysis_service.analyze_order_block(doji, strong, threshold) == 'sell'
+
+def test_disabled_stats_keep_no_state():
+    stats = BodySizeStats(percentile=0)
+    stats.observe('BTCUSDT', '5m', 1.0)
+    assert stats.sketches == {} and stats.threshold('BTCUSDT', '5m') is None
@@ -0,0 +1,102 @@
+import asyncio
+import datetime
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import DeleteMessage, SendMessage
+from aiogram.types import Chat, Message
+
+from services.cleanup_service import cleanup_service
+from services.rate_limiter import OutboundMiddleware, RateLimiter
+
+class RecordingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__()
+        self.acquired = []
+        self.paused = []
+
+    async def acquire(self, chat_id=None):
+        self.acquired.append(chat_id)
+
+    def pause(self, seconds, chat_id=None):
+        self.paused.append((seconds, chat_id))
+
+def _sent_message(chat_id: int, message_id: int) -> Message:
+    return Message(
+        message_id=message_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=chat_id, type='private'),
+        text='hi',
+    )
+
+def test_middleware_limits_per_chat_and_tracks_sent_messages():
+    limiter = RecordingLimiter()
+    middleware = OutboundMiddleware(limiter)
+
+    async def make_request(bot, method):
+        if isinstance(method, SendMessage):
+            return _sent_message(method.chat_id, 77)
+        return True
+
+    async def scenario():
+        sent = await middleware(make_request, None, SendMessage(chat_id=5, text='hi'))
+        deleted = await middleware(make_request, None, DeleteMessage(chat_id=5, message_id=77))
+        return sent, deleted
+
+    sent, deleted = asyncio.run(scenario())
+
+    assert sent.message_id == 77 and deleted is True
+    # Лимит на чат только для отправок, удаление - только глобальный
+    assert limiter.acquired == [5, None]
+    assert 77 in cleanup_service.known_messages[5]
+    cleanup_service.forget(5)
+
+def test_per_chat_interval_spaces_sends():
+    limiter = RateLimiter(global_rate=1000, per_chat_interval=0.1)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(3):
+            await limiter.acquire(1)
+        await limiter.acquire(2)
+        return loop.time() - started
+
+    assert 0.18 <= asyncio.run(scenario()) < 0.5
+
+def test_retry_after_pauses_chat_and_retries():
+    limiter = RecordingLimiter()
+    middleware = OutboundMiddleware(limiter, retries=1)
+    attempts = []
+
+    async def make_request(bot, method):
+        attempts.append(method.chat_id)
+        if len(attempts) == 1 or method.chat_id == 9:
+            raise TelegramRetryAfter(method=method, message='Too Many Requests', retry_after=3)
+        return _sent_message(method.chat_id, 78)
+
+    async def scenario():
+        sent = await middleware(make_request, None, SendMessage(chat_id=6, text='hi'))
+        try:
+            await middleware(make_request, None, SendMessage(chat_id=9, text='hi'))
+        except TelegramRetryAfter:
+            return sent, True
+        return sent, False
+
+    sent, raised = asyncio.run(scenario())
+    assert sent.message_id == 78 and raised
+    assert attempts == [6, 6, 9, 9] and limiter.paused == [(3, 6), (3, 9), (3, 9)]
+    cleanup_service.forget(6)
+
+def test_global_budget_is_split_between_workers_and_paused_on_429():
+    limiter = RateLimiter(global_rate=30, per_chat_interval=0)
+    limiter.share(4)
+    assert limiter.global_rate == 7.5
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        limiter.pause(0.2)
+        await limiter.acquire()
+        return loop.time() - started
+
+    assert 0.18 <= asyncio.run(scenario()) < 0.5
@@ -0,0 +1,51 @@
+import asyncio
+import sys
+
+from benchmarks.replay import ReplayEngine, generate_ohlcv
+from services.analysis_service import analysis_service
+from services.clock import VirtualClock
+from services.models import Candle
+from services.time_utils import time_service
+
+analysis_module = sys.modules['services.analysis_service']
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+def test_virtual_clock_wakes_in_deadline_order():
+    async def scenario():
+        clock = VirtualClock(start=100.0)
+        woke = []
+
+        async def sleeper(name, seconds):
+            await clock.sleep(seconds)
+            woke.append((name, clock.time()))
+
+        tasks = [asyncio.create_task(sleeper('b', 20)), asyncio.create_task(sleeper('a', 5))]
+        await clock.run(tasks, until=1000)
+        return woke
+
+    assert asyncio.run(scenario()) == [('a', 105.0), ('b', 120.0)]
+
+def test_replay_delivers_every_offline_signal(monkeypatch):
+    fake_bot = FakeBot()
+    monkeypatch.setattr(analysis_module, 'bot', fake_bot)
+    candles = generate_ohlcv(120, 1440)
+
+    results = asyncio.run(ReplayEngine({'BTCUSDT': candles}, '1d').run())
+
+    as_models = [Candle(c.open, c.high, c.low, c.close, c.volume, c.timestamp) for c in candles]
+    expected = sum(
+        1 for prev, current in zip(as_models, as_models[1:])
+        if analysis_service.analyze_order_block(prev, current)
+    )
+    order_blocks = [text for _, text in fake_bot.sent if 'ретест' not in text]
+    assert len(order_blocks) == expected
+    assert results['signals'] == len(fake_bot.sent)
+    assert results['speedup'] > 1000
+    assert time_service.clock.real
+    assert 'analyze_order_block' not in vars(analysis_service)
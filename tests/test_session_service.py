@@ -0,0 +1,74 @@
+import sys
+
+from services.analysis_service import analysis_service
+from services.session_service import SessionService, UserSession, running_analyses, session_service
+from services.state_service import state_service
+from services.time_utils import timezone_service
+from services.trade_calculator import trade_calculator
+
+def test_field_views_behave_like_dicts():
+    service = SessionService()
+    states = service.view('state')
+    flags = service.flag_view('subscribed')
+
+    states[1] = {'waiting_for': 'balance'}
+    states[1]['waiting_for'] = 'entry_price'
+    flags.add(2)
+
+    assert states[1] == {'waiting_for': 'entry_price'}
+    assert 1 in states and 2 not in states and states.get(2) is None
+    assert list(states) == [1] and len(states) == 1
+    assert 2 in flags and len(flags) == 1
+
+    del states[1]
+    flags.discard(2)
+    # Пустые сессии удаляются сразу
+    assert service.sessions == {}
+
+def test_services_share_one_session_per_user(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    user_id = 5
+
+    state_service.set_navigation_id(user_id, 100)
+    trade_calculator.save_user_data(user_id, {'balance': 1000})
+    timezone_service.set_user_timezone(user_id, 'Asia/Tokyo')
+    analysis_service.active_analyses[user_id] = True
+
+    session = session_service.get(user_id)
+    assert list(session_service.sessions) == [user_id]
+    assert (session.navigation_id, session.trade_data, session.timezone, session.analysis_active) == \
+        (100, {'balance': 1000}, 'Asia/Tokyo', True)
+
+def test_inactivity_teardown_keeps_preferences_and_running_analysis(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    state_service.set_navigation_id(1, 10)
+    state_service.user_states[1] = {'waiting_for': 'balance'}
+    state_service.set_navigation_id(2, 20)
+    timezone_service.set_user_timezone(2, 'UTC')
+    running_analyses[3] = object()
+    state_service.set_navigation_id(3, 30)
+    for session in session_service.sessions.values():
+        session.last_activity = 0.0
+
+    state_service.cleanup_inactive_users()
+
+    assert 1 not in session_service.sessions
+    assert session_service.get(2).timezone == 'UTC' and session_service.get(2).navigation_id is None
+    assert 3 in running_analyses
+
+def test_slotted_session_has_no_instance_dict():
+    session = UserSession(1)
+    assert not hasattr(session, '__dict__')
+    assert sys.getsizeof(session) < 300
+
+def test_clear_navigation_id_keeps_preferences(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    state_service.set_navigation_id(4, 40)
+    state_service.user_states[4] = {'waiting_for': 'balance'}
+    timezone_service.set_user_timezone(4, 'UTC')
+
+    state_service.clear_navigation_id(4)
+
+    session = session_service.get(4)
+    assert (session.navigation_id, session.state, session.last_activity) == (None, None, None)
+    assert session.timezone == 'UTC'
@@ -0,0 +1,113 @@
+import json
+
+from services.models import Candle, Zone
+from services.signal_journal import SignalJournal
+
+START = 1735689600000
+HOUR = 3600000
+
+def _candle(index, low, high, close=None):
+    close = (low + high) / 2 if close is None else close
+    return Candle(close, high, low, close, 1, START + index * HOUR)
+
+def _zone(zone_id, block_type, low, high):
+    return Zone(zone_id, 'BTCUSDT', '1h', block_type, low, high, START)
+
+def test_outcomes_resolve_incrementally_and_survive_restart(tmp_path):
+    path = str(tmp_path / 'signals.jsonl')
+    journal = SignalJournal(risk_reward=2)
+    journal.open(path)
+    # Покупка от 100 со стопом 95: тейк 110. Продажа от 100 со стопом 104: тейк 92
+    buy = journal.record(_zone(1, 'buy', 95, 98), 100, START)
+    sell = journal.record(_zone(2, 'sell', 101, 104), 100, START)
+    assert journal.open_signals[buy]['target'] == 110 and journal.open_signals[sell]['target'] == 92
+
+    assert journal.on_candle('BTCUSDT', _candle(1, 99, 103)) == []
+    assert journal.on_candle('BTCUSDT', _candle(2, 100, 105)) == [(sell, 'sl')]
+    # Гэп: прошлое закрытие 102.5, свеча целиком выше 110 - тейк пройден между свечами
+    assert journal.on_candle('BTCUSDT', _candle(3, 111, 113)) == [(buy, 'tp')]
+    assert journal.levels == {} and journal.open_signals == {}
+
+    third = journal.record(_zone(3, 'buy', 100, 110), 112, START + 3 * HOUR)
+    journal.close()
+
+    lines = [json.loads(line) for line in open(path, encoding='utf-8')]
+    assert [line.get('outcome') for line in lines] == [None, None, 'sl', 'tp', None]
+
+    restored = SignalJournal(risk_reward=2)
+    restored.open(path)
+    assert list(restored.open_signals) == [third] and restored.last_id == 3
+    stats = restored.performance()[('BTCUSDT', '1h')]
+    assert (stats['tp'], stats['sl'], stats['open']) == (1, 1, 1)
+    assert stats['win_rate'] == 0.5 and stats['avg_r'] == 0.5
+    restored.close()
+
+def test_both_levels_in_one_candle_count_as_stop_and_only_touched_are_checked(tmp_path):
+    journal = SignalJournal(risk_reward=1)
+    journal.open(str(tmp_path / 'signals.jsonl'))
+    ids = [journal.record(_zone(index, 'buy', 100 + index - 1, 100 + index), 100 + index + 1, START)
+           for index in range(0, 1000, 10)]
+    # Свеча 95-105 задевает стоп и тейк первого сигнала (стоп 99, тейк 103) и больше ничего
+    resolved = journal.on_candle('BTCUSDT', _candle(2, 95, 105, close=100))
+    assert resolved == [(ids[0], 'sl')]
+    assert len(journal.open_signals) == len(ids) - 1
+    journal.close()
+
+def test_reopen_replays_only_the_tail_after_checkpoint(tmp_path, monkeypatch):
+    path = str(tmp_path / 'signals.jsonl')
+    journal = SignalJournal(risk_reward=2)
+    journal.open(path)
+    for index in range(20):
+        journal.record(_zone(index, 'sell', 101, 104), 100, START)
+    journal.on_candle('BTCUSDT', _candle(1, 100, 105))  # Все 20 - по стопу
+    first = journal.record(_zone(20, 'buy', 95, 98), 100, START)
+    journal.close()
+
+    replayed = []
+    read = SignalJournal.read
+
+    def counting(self, path=None, offset=0):
+        for entry in read(self, path, offset):
+            replayed.append(entry)
+            yield entry
+
+    monkeypatch.setattr(SignalJournal, 'read', counting)
+    restored = SignalJournal(risk_reward=2)
+    restored.open(path)
+    assert replayed == []
+    second = restored.record(_zone(21, 'buy', 95, 98), 100, START)
+    restored._file.close()  # Падение процесса: контрольная точка осталась от открытия
+
+    again = SignalJournal(risk_reward=2)
+    again.open(path)
+    assert [entry['id'] for entry in replayed] == [second]  # Только дописанное после контрольной точки
+    assert sorted(again.open_signals) == [first, second] and again.last_id == second
+    assert again.performance()[('BTCUSDT', '1h')]['sl'] == 20
+    again.close()
+
+    # Журнал заменили - контрольная точка не подходит, читается целиком
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(json.dumps({'id': 1, 'symbol': 'BTCUSDT', 'timeframe': '1h', 'type': 'buy', 'time': START,
+                               'price': 100, 'low': 95, 'high': 98}) + '\n')
+    fresh = SignalJournal()
+    fresh.open(path)
+    assert fresh.open_signals == {} and fresh.last_id == 1 and fresh.results == {}
+    fresh.close()
+
+def test_signals_without_outcome_expire(tmp_path):
+    path = str(tmp_path / 'signals.jsonl')
+    journal = SignalJournal(risk_reward=2, expiry_bars=3)
+    journal.open(path)
+    old = journal.record(_zone(1, 'buy', 95, 98), 100, START)
+    recent = journal.record(_zone(2, 'buy', 95, 98), 100, START + 3 * HOUR)
+
+    assert journal.expire(START + 4 * HOUR) == [old]
+    assert list(journal.open_signals) == [recent] and journal.results == {}
+    journal.close()
+
+    lines = [json.loads(line) for line in open(path, encoding='utf-8')]
+    assert lines[-1]['outcome'] == 'expired' and lines[-1]['price'] is None
+    restored = SignalJournal(risk_reward=2)
+    restored.open(path)
+    assert list(restored.open_signals) == [recent]
+    restored.close()
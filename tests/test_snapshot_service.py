@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from services.analysis_service import analysis_service
+from services.cleanup_service import cleanup_service
+from services.models import Candle
+from services.price_service import crypto_service
+from services.session_service import running_analyses, session_service
+from services.snapshot_service import SnapshotService
+
+def _start_analysis(user_id: int):
+    analysis_service.active_analyses[user_id] = True
+    analysis_service.user_timeframes[user_id] = '5m'
+
+def _candles(age: float):
+    return [Candle(1, 2, 0.5, 1.5, 10, int((time.time() - age) * 1000))]
+
+def test_snapshot_restores_analyses_and_fresh_caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    monkeypatch.setattr(crypto_service, 'cache', {
+        'crypto:BINANCE:BTCUSDT': ({'close': 1.0}, time.time()),
+        'crypto:BINANCE:ETHUSDT': ({'close': 2.0}, time.time() - 3600),
+    })
+    monkeypatch.setattr(analysis_service, 'candle_history', {
+        ('BTCUSDT', '5m'): _candles(60),
+        ('ETHUSDT', '5m'): _candles(3600),  # Буфер старше свечи - не годится
+    })
+    _start_analysis(1)
+    _start_analysis(2)
+    session_service.get(1).progress_message = 55
+
+    path = str(tmp_path / 'snapshot.bin')
+    assert SnapshotService(path).save() > 0
+
+    monkeypatch.setattr(session_service, 'sessions', {})
+    monkeypatch.setattr(crypto_service, 'cache', {})
+    monkeypatch.setattr(analysis_service, 'candle_history', {})
+    resumed = []
+
+    async def fake_analysis(user_id, timeframe=None):
+        resumed.append((user_id, timeframe))
+
+    monkeypatch.setattr(analysis_service, 'analyze_candles_with_progress', fake_analysis)
+
+    async def scenario():
+        started = time.perf_counter()
+        stats = await SnapshotService(path).restore()
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*running_analyses.values())
+        return stats, elapsed
+
+    stats, elapsed = asyncio.run(scenario())
+
+    assert stats == {'analyses': 2, 'cache_entries': 1}
+    assert sorted(resumed) == [(1, '5m'), (2, '5m')]
+    assert len(analysis_service.candle_history[('BTCUSDT', '5m')]) == 1
+    assert analysis_service.candle_history[('ETHUSDT', '5m')] == []
+    assert list(crypto_service.cache) == ['crypto:BINANCE:BTCUSDT']
+    assert 55 in cleanup_service.pending.get(1, set())
+    assert elapsed < 1
+    cleanup_service.forget(1)
+
+def test_restore_of_thousand_analyses_is_fast(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    monkeypatch.setattr(analysis_service, 'candle_history', {('BTCUSDT', '5m'): _candles(60)})
+    for user_id in range(1000):
+        _start_analysis(user_id)
+    path = str(tmp_path / 'snapshot.bin')
+    SnapshotService(path).save()
+    monkeypatch.setattr(session_service, 'sessions', {})
+
+    async def fake_analysis(user_id, timeframe=None):
+        pass
+
+    monkeypatch.setattr(analysis_service, 'analyze_candles_with_progress', fake_analysis)
+
+    async def scenario():
+        started = time.perf_counter()
+        stats = await SnapshotService(path).restore()
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*running_analyses.values())
+        return stats, elapsed
+
+    stats, elapsed = asyncio.run(scenario())
+    assert stats['analyses'] == 1000 and elapsed < 1
+
+def test_missing_or_foreign_snapshot_is_ignored(tmp_path):
+    path = tmp_path / 'snapshot.bin'
+    assert asyncio.run(SnapshotService(str(path)).restore()) == {'analyses': 0, 'cache_entries': 0}
+    path.write_bytes(b'garbage')
+    assert SnapshotService(str(path)).load() is None
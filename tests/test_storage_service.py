@@ -0,0 +1,120 @@
+import asyncio
+import sqlite3
+import sys
+from types import SimpleNamespace
+
+from services.session_service import session_service, subscribed_users
+from services.storage_service import PersistenceService, SessionLoadMiddleware
+from services.time_utils import timezone_service
+from services.trade_calculator import trade_calculator
+
+storage_module = sys.modules['services.storage_service']
+
+def test_settings_survive_restart(tmp_path, monkeypatch):
+    path = str(tmp_path / 'state.db')
+    monkeypatch.setattr(session_service, 'sessions', {})
+
+    async def first_run():
+        persistence = PersistenceService(flush_interval=10)
+        await persistence.start(path)
+        await persistence.load(1)
+        subscribed_users.add(1)
+        timezone_service.set_user_timezone(1, 'Asia/Tokyo')
+        trade_calculator.save_user_data(1, {'balance': 500.0})
+        persistence.mark_dirty(1)  # save_user_data меняет вложенный dict
+        await persistence.stop()
+
+    async def second_run():
+        persistence = PersistenceService(flush_interval=10)
+        await persistence.start(path)
+        assert session_service.get(1) is None  # Ничего не грузится на старте
+        await persistence.load(1)
+        session = session_service.get(1)
+        await persistence.stop()
+        return session
+
+    asyncio.run(first_run())
+    monkeypatch.setattr(session_service, 'sessions', {})
+    session = asyncio.run(second_run())
+
+    assert (session.subscribed, session.timezone, session.trade_data) == (True, 'Asia/Tokyo', {'balance': 500.0})
+    assert sqlite3.connect(path).execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+def test_writes_are_batched_behind_handlers(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    batches = []
+
+    async def scenario():
+        persistence = PersistenceService(flush_interval=0.05)
+        await persistence.start(str(tmp_path / 'state.db'))
+        original = persistence.store.write_batch
+        persistence.store.write_batch = lambda upserts, deletes: (batches.append(len(upserts)),
+                                                                  original(upserts, deletes))
+        for user_id in range(50):
+            timezone_service.set_user_timezone(user_id, 'UTC')
+        # Запись еще не ушла в базу: обработчик не ждет диска
+        assert batches == []
+        await asyncio.sleep(0.15)
+        # Удаленная сессия удаляется из базы
+        del timezone_service.user_timezones[0]
+        await persistence.stop()
+        return persistence
+
+    asyncio.run(scenario())
+    assert batches[0] == 50
+    rows = sqlite3.connect(str(tmp_path / 'state.db')).execute('SELECT COUNT(*) FROM user_sessions').fetchone()[0]
+    assert rows == 49
+
+def test_middleware_loads_before_handler_and_marks_dirty(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    seen = []
+
+    async def scenario():
+        persistence = PersistenceService(flush_interval=10)
+        await persistence.start(str(tmp_path / 'state.db'))
+        middleware = SessionLoadMiddleware(persistence)
+
+        async def handler(event, data):
+            seen.append(7 in persistence._loaded)
+            session_service.get_or_create(7).state = {'waiting_for': 'balance'}
+
+        await middleware(handler, None, {'event_from_user': SimpleNamespace(id=7)})
+        dirty = set(persistence._dirty)
+        await persistence.stop()
+        return dirty
+
+    assert asyncio.run(scenario()) == {7}
+    assert seen == [True]
+
+def test_partial_session_after_unload_merges_into_stored_row(tmp_path, monkeypatch):
+    from services.expiry_service import expiry_service
+    from services.state_service import state_service
+
+    monkeypatch.setattr(session_service, 'sessions', {})
+
+    async def scenario():
+        persistence = PersistenceService(flush_interval=10)
+        monkeypatch.setattr(storage_module, 'persistence_service', persistence)
+        await persistence.start(str(tmp_path / 'state.db'))
+        await persistence.load(1)
+        timezone_service.set_user_timezone(1, 'Asia/Tokyo')
+        trade_calculator.save_user_data(1, {'balance': 500.0})
+        persistence.mark_dirty(1)
+        await persistence.flush()
+
+        expiry_service.expire(session_service.get(1))
+        assert session_service.get(1) is None
+        # Фоновый сервис трогает одно поле, не загружая сессию
+        state_service.user_states[1] = {'waiting_for': 'balance'}
+        await persistence.flush()
+
+        monkeypatch.setattr(session_service, 'sessions', {})
+        persistence._loaded.clear()
+        await persistence.load(1)
+        session = session_service.get(1)
+        await persistence.stop()
+        return session
+
+    session = asyncio.run(scenario())
+    assert (session.timezone, session.trade_data) == ('Asia/Tokyo', {'balance': 500.0})
+    assert session.state == {'waiting_for': 'balance'}
@@ -0,0 +1,92 @@
+import asyncio
+import sys
+
+from services.analysis_service import analysis_service
+from services.session_service import session_service
+from services.subscription_service import SubscriptionIndex
+from services.time_utils import time_service, timeframe_manager
+
+analysis_module = sys.modules['services.analysis_service']
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, text))
+
+def test_index_groups_users_by_symbol_and_timeframe():
+    index = SubscriptionIndex()
+    assert sorted(index.subscribe(1, ['BTCUSDT', 'ETHUSDT'], '5m')) == [('BTCUSDT', '5m'), ('ETHUSDT', '5m')]
+    assert index.subscribe(2, ['BTCUSDT'], '5m') == []
+    assert index.subscribe(3, ['BTCUSDT'], '1h') == [('BTCUSDT', '1h')]
+
+    assert index.recipients('BTCUSDT', '5m') == {1, 2}
+    assert index.users_by_timeframe() == {('5m',): 2, ('1h',): 1}
+
+    # Повторная подписка заменяет старую
+    assert index.subscribe(1, ['BTCUSDT'], '1h') == []
+    assert ('ETHUSDT', '5m') not in index
+    assert index.recipients('BTCUSDT', '1h') == {1, 3}
+
+    assert index.unsubscribe(2) == [('BTCUSDT', '5m')]
+    assert sorted(index.unsubscribe(1) + index.unsubscribe(3)) == [('BTCUSDT', '1h')]
+    assert len(index) == 0 and index.by_user == {}
+
+def test_timeframe_is_per_user(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    monkeypatch.setattr(timeframe_manager, 'current_timeframe', None)
+
+    timeframe_manager.set_timeframe('5m', 1)
+    timeframe_manager.set_timeframe('1h', 2)
+    timeframe_manager.set_timeframe('7m', 2)  # Неверный не перетирает выбор
+
+    assert timeframe_manager.get_timeframe(1) == '5m'
+    assert timeframe_manager.get_timeframe(2) == '1h'
+    assert timeframe_manager.get_timeframe(3) is None
+
+    timeframe_manager.set_timeframe('4h')
+    assert timeframe_manager.get_timeframe(3) == '4h'
+    assert timeframe_manager.get_timeframe(1) == '5m'
+
+def test_one_job_per_group_and_shared_delivery(monkeypatch):
+    fake_bot = FakeBot()
+    monkeypatch.setattr(analysis_module, 'bot', fake_bot)
+    monkeypatch.setattr(session_service, 'sessions', {})
+
+    async def no_sleep(seconds):
+        return None
+
+    monkeypatch.setattr(time_service, 'sleep', no_sleep)
+
+    async def idle_group(symbol, timeframe):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(analysis_service, 'analyze_group', idle_group)
+
+    async def scenario():
+        for user_id in (1, 2, 3):
+            analysis_service.active_analyses[user_id] = True
+        started = analysis_service.subscribe(1, ['BTCUSDT', 'EURUSD'], '5m')
+        started += analysis_service.subscribe(2, ['BTCUSDT'], '5m')
+        started += analysis_service.subscribe(3, ['BTCUSDT'], '1h')
+        jobs = dict(analysis_service.group_tasks)
+
+        await analysis_service.deliver_signal('BTCUSDT', '5m', 'buy', 100.0, 'signal', candle_close=None)
+        counts = analysis_service.tasks_by_timeframe()
+
+        await analysis_service.unsubscribe(2)
+        still_running = not jobs[('BTCUSDT', '5m')].done()
+        for user_id in (1, 3):
+            await analysis_service.unsubscribe(user_id)
+        return started, jobs, counts, still_running
+
+    started, jobs, counts, still_running = asyncio.run(scenario())
+
+    assert len(started) == 3
+    assert sorted(jobs) == [('BTCUSDT', '1h'), ('BTCUSDT', '5m'), ('EURUSD', '5m')]
+    assert sorted(chat_id for chat_id, _ in fake_bot.sent) == [1, 2]
+    assert counts == {('5m',): 2, ('1h',): 1}
+    assert still_running
+    assert all(task.cancelled() for task in jobs.values())
+    assert analysis_service.group_tasks == {} and len(analysis_service.subscriptions) == 0
@@ -0,0 +1,37 @@
+import asyncio
+import sys
+
+from benchmarks.replay import ReplayEngine, generate_ohlcv
+from services.tracing import Histogram, PipelineTracer
+
+analysis_module = sys.modules['services.analysis_service']
+
+class FakeBot:
+    async def send_message(self, chat_id, text, parse_mode=None):
+        pass
+
+def test_histogram_quantiles_and_cumulative_buckets():
+    histogram = Histogram(buckets=(0.01, 0.1, 1))
+    for value in (0.005, 0.05, 0.05, 0.5, 5):
+        histogram.observe(value)
+
+    assert histogram.count == 5
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.99) == float('inf')
+    assert histogram.cumulative() == [(0.01, 1), (0.1, 3), (1, 4), (float('inf'), 5)]
+
+def test_disabled_tracer_records_nothing():
+    tracer = PipelineTracer(enabled=False)
+    with tracer.span('detect', 'BTCUSDT', '5m'):
+        pass
+    assert tracer.summary() == {}
+
+def test_replay_fills_every_pipeline_stage(monkeypatch):
+    monkeypatch.setattr(analysis_module, 'bot', FakeBot())
+    results = asyncio.run(ReplayEngine({'ETHUSDT': generate_ohlcv(60, 1440, seed=3)}, '1d').run())
+
+    stages = {key.split()[0] for key in results['pipeline']}
+    assert stages == {'wait_close', 'fetch', 'detect', 'send', 'close_to_delivered'}
+    assert results['pipeline']['send ETHUSDT 1d']['count'] == results['signals']
+    # Ожидание закрытия считается в виртуальном времени: почти сутки на 1d
+    assert results['pipeline']['wait_close ETHUSDT 1d']['p50'] >= 3600
@@ -0,0 +1,57 @@
+import dataclasses
+import time
+
+import numpy as np
+
+from services.trade_calculator import TradeParameters, trade_calculator
+
+def test_batch_matches_scalar_path():
+    rng = np.random.default_rng(7)
+    count = 2000
+    directions = rng.choice(['long', 'short', 'LONG'], count)
+    entries = rng.uniform(1, 50000, count).round(2)
+    stops = (entries * rng.uniform(0.9, 1.1, count)).round(2)
+    rrs = rng.choice([0.5, 1, 2, 3, -1], count)
+    risks = rng.choice([0.005, 0.01, 0.2], count)
+    balances = rng.uniform(-100, 100000, count)
+
+    batch = trade_calculator.calculate_batch(directions, balances, entries, stops, rrs, risks)
+
+    assert sorted(set(batch) - {'valid'}) == sorted(field.name for field in dataclasses.fields(TradeParameters))
+    for row in range(count):
+        result = trade_calculator.calculate_trade({
+            'direction': str(directions[row]), 'balance': float(balances[row]), 'entry_price': float(entries[row]),
+            'stop_loss': float(stops[row]), 'risk_reward': float(rrs[row]), 'risk_percent': float(risks[row]),
+        })
+        assert batch['valid'][row] == ('success' in result)
+        if 'success' not in result:
+            assert np.isnan(batch['volume'][row])
+            continue
+        trade = result['success']
+        for field in dataclasses.fields(TradeParameters):
+            expected = getattr(trade, field.name)
+            if field.name == 'direction':
+                assert batch['direction'][row] == expected.lower()
+            else:
+                assert np.isclose(batch[field.name][row], expected, rtol=1e-12, atol=0), field.name
+
+def test_sizing_grid_broadcasts_and_scales_to_backtests():
+    grid = trade_calculator.calculate_batch('long', 1000, 100, np.array([95, 90, 101])[:, None],
+                                            np.array([1, 2, 3])[None, :], 0.01)
+    assert grid['take_profit'].shape == (3, 3)
+    assert list(grid['take_profit'][0]) == [105, 110, 115]
+    assert not grid['valid'][2].any()  # Стоп выше входа для LONG
+
+    text = trade_calculator.sizing_grid({'direction': 'short', 'balance': 1000, 'entry_price': 100,
+                                         'stop_loss': 105, 'risk_reward': 2})
+    lines = text.splitlines()
+    assert len(lines) == 7 and 'TP 1:5' in lines[0]
+    assert lines[3].split()[:2] == ['105.00', '1.0000']
+
+    count = 1_000_000
+    rng = np.random.default_rng(1)
+    entries = rng.uniform(100, 200, count)
+    started = time.perf_counter()
+    result = trade_calculator.calculate_batch('long', 10000, entries, entries * 0.98, 2.0, 0.01)
+    assert time.perf_counter() - started < 2
+    assert result['valid'].all()
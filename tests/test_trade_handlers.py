@@ -0,0 +1,46 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+
+from handlers.callback_routers import handle_direction_selection
+from handlers.message_handlers import handle_trade_inputs
+from services.cleanup_service import cleanup_service
+from services.session_service import session_service
+from services.state_service import state_service
+
+message_handlers = sys.modules['handlers.message_handlers']
+callback_routers = sys.modules['handlers.callback_routers']
+
+def _message(user_id, text):
+    return SimpleNamespace(from_user=SimpleNamespace(id=user_id), chat=SimpleNamespace(id=user_id),
+                           message_id=len(text), text=text)
+
+def test_calculator_asks_symbol_before_volume(monkeypatch):
+    monkeypatch.setattr(session_service, 'sessions', {})
+    monkeypatch.setattr(cleanup_service, 'schedule', lambda chat_id, message_ids: None)
+    screens = []
+
+    async def edit(user_id, text, reply_markup=None, parse_mode=None):
+        screens.append(text)
+        return True
+
+    monkeypatch.setattr(message_handlers, 'edit_navigation_message', edit)
+    monkeypatch.setattr(callback_routers, 'edit_navigation_message', edit)
+    callback = SimpleNamespace(from_user=SimpleNamespace(id=11), data='short',
+                               message=SimpleNamespace(message_id=500))
+
+    async def scenario():
+        await handle_direction_selection(callback)
+        assert state_service.user_states[11] == {'waiting_for': 'symbol'}
+        await handle_trade_inputs(_message(11, 'dogeusdt'))
+        assert 'не найден' in screens[-1] and state_service.user_states[11] == {'waiting_for': 'symbol'}
+        for text in ('btcusdt', '100000', '60000', '61234', '2', '1'):
+            await handle_trade_inputs(_message(11, text))
+
+    asyncio.run(scenario())
+    data = state_service.user_calculation_data[11]
+    assert data['symbol'] == 'BTCUSDT'
+    # Шаг лота BTCUSDT в базе инструментов - 0.00001, без инструмента было бы 4 знака (0.8104)
+    trade = data['result']['success']
+    assert trade.adjusted_volume == 0.81037
+    assert 'Объем: 0.81037' in screens[-1] and 11 not in state_service.user_states
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import signal
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import webhook_server
+from webhook_server import UpdateRouter, WorkerPool, extract_user_id, replay_updates, wait_for_stop
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'updates.jsonl')
+
+def _load_updates():
+    with open(FIXTURE, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def test_extract_user_id_message_and_callback():
+    message, callback, _ = _load_updates()
+    assert extract_user_id(message) == 111
+    assert extract_user_id(callback) == 222
+
+def test_extract_user_id_falls_back_to_update_id():
+    assert extract_user_id({'update_id': 7}) == 7
+
+def test_worker_for_is_sticky_per_user():
+    router = UpdateRouter([f"http://w{index}" for index in range(4)])
+    assert router.worker_for(111) == router.worker_for(111)
+    assert {router.worker_for(user_id) for user_id in range(8)} == set(router.worker_urls)
+
+def test_replay_routes_recorded_updates_to_workers():
+    async def scenario():
+        received = {0: [], 1: []}
+
+        def worker_app(index):
+            async def handle(request):
+                received[index].append(extract_user_id(await request.json()))
+                return web.Response()
+            app = web.Application()
+            app.router.add_post('/update', handle)
+            return app
+
+        workers = [TestServer(worker_app(index)) for index in range(2)]
+        for server in workers:
+            await server.start_server()
+
+        router = UpdateRouter([str(server.make_url('/update')) for server in workers], secret='s')
+        front = web.Application()
+        front.router.add_post('/webhook', router.handle)
+        front.on_startup.append(router.on_startup)
+        front.on_cleanup.append(router.on_cleanup)
+        front_server = TestServer(front)
+        await front_server.start_server()
+
+        try:
+            sent = await replay_updates(FIXTURE, str(front_server.make_url('/webhook')), secret='s')
+        finally:
+            await front_server.close()
+            for server in workers:
+                await server.close()
+        return sent, received, router
+
+    sent, received, router = asyncio.run(scenario())
+    assert sent == 3
+    assert sorted(received[0] + received[1]) == [111, 111, 222]
+    # Оба апдейта пользователя 111 попали на один воркер
+    assert received[111 % 2].count(111) == 2
+
+def _marker(name):
+    return os.path.join(os.environ['WORKER_TEST_DIR'], name)
+
+def _graceful_worker(index, port, workers):
+    async def main():
+        stopper = asyncio.create_task(wait_for_stop())
+        await asyncio.sleep(0)  # Обработчики сигналов установлены
+        open(_marker(f"ready{index}"), 'w').close()
+        try:
+            await stopper
+        finally:
+            with open(_marker(f"saved{index}"), 'w') as file:
+                file.write(f"{index}/{workers}")
+    asyncio.run(main())
+
+def _stubborn_worker(index, port, workers):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    open(_marker(f"ready{index}"), 'w').close()
+    time.sleep(60)
+
+def _wait_ready(tmp_path, count):
+    deadline = time.monotonic() + 30
+    while len(list(tmp_path.glob('ready*'))) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+def test_pool_stop_lets_workers_shut_down_then_kills_stuck(tmp_path, monkeypatch):
+    monkeypatch.setenv('WORKER_TEST_DIR', str(tmp_path))
+    pool = WorkerPool(2, 0, target=_graceful_worker)
+    pool.start()
+    _wait_ready(tmp_path, 2)
+    pool.stop()
+    # finally воркера выполнен: сюда в боте попадают снимок, сброс SQLite и закрытие журнала
+    assert sorted(path.read_text() for path in tmp_path.glob('saved*')) == ['0/2', '1/2']
+    assert [process.exitcode for process in pool.processes] == [0, 0]
+
+    for path in tmp_path.glob('ready*'):
+        path.unlink()
+    stuck = WorkerPool(1, 0, target=_stubborn_worker)
+    stuck.start()
+    _wait_ready(tmp_path, 1)
+    started = time.monotonic()
+    stuck.stop(timeout=1)
+    assert time.monotonic() - started < 10
+    assert stuck.processes[0].exitcode == -signal.SIGKILL
+
+def test_orphaned_files_after_worker_count_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(webhook_server, 'SNAPSHOT_PATH', str(tmp_path / 'snapshot.bin'))
+    monkeypatch.setattr(webhook_server, 'SIGNAL_JOURNAL_PATH', str(tmp_path / 'signals.jsonl'))
+    for name in ('snapshot.bin.0-of-4', 'snapshot.bin.1-of-2', 'signals.jsonl.1', 'signals.jsonl.3',
+                 'signals.jsonl.3.checkpoint'):
+        (tmp_path / name).touch()
+    assert webhook_server.snapshot_path(1, 2) == str(tmp_path / 'snapshot.bin.1-of-2')
+    assert webhook_server.orphaned_worker_files(2) == [str(tmp_path / 'snapshot.bin.0-of-4')]
+    assert webhook_server.orphaned_worker_files(3) == [str(tmp_path / 'snapshot.bin.0-of-4'),
+                                                       str(tmp_path / 'snapshot.bin.1-of-2'),
+                                                       str(tmp_path / 'signals.jsonl.3'),
+                                                       str(tmp_path / 'signals.jsonl.3.checkpoint')]
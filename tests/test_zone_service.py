@@ -0,0 +1,48 @@
+import random
+import time
+
+from services.models import Candle
+from services.zone_service import ZoneTracker
+
+PERIOD = 300000
+
+def _candle(low, high, close, timestamp):
+    return Candle(close, high, low, close, 0, timestamp)
+
+def test_retest_invalidation_and_expiry():
+    tracker = ZoneTracker(max_age_candles=10)
+    bull = tracker.add_zone('BTCUSDT', '5m', 'buy', _candle(100, 110, 105, 0))
+    bear = tracker.add_zone('BTCUSDT', '5m', 'sell', _candle(200, 210, 205, 0))
+    tracker.add_zone('BTCUSDT', '5m', 'buy', _candle(50, 60, 55, 0))
+
+    # Свеча над зонами ничего не трогает
+    assert tracker.on_candle('BTCUSDT', '5m', _candle(150, 160, 155, PERIOD), PERIOD) == []
+    # Возврат в бычью зону - ретест, зона снимается
+    assert tracker.on_candle('BTCUSDT', '5m', _candle(108, 120, 115, 2 * PERIOD), PERIOD) == [bull]
+    assert bull.limit_levels == ((110, 105), 100)
+    # Закрытие выше медвежьей зоны ее ломает без алерта
+    assert tracker.on_candle('BTCUSDT', '5m', _candle(190, 220, 215, 3 * PERIOD), PERIOD) == []
+    assert len(tracker) == 1
+    # Последняя зона истекает по возрасту
+    assert tracker.on_candle('BTCUSDT', '5m', _candle(150, 160, 155, 20 * PERIOD), PERIOD) == []
+    assert len(tracker) == 0 and tracker.books == {}
+    assert bear.limit_levels == ((200, 205), 210)
+
+def test_thousands_of_zones_stay_fast():
+    rng = random.Random(1)
+    tracker = ZoneTracker(max_age_candles=10 ** 6)
+    zones = []
+    for _ in range(5000):
+        low = rng.uniform(0, 10000)
+        zones.append(tracker.add_zone('BTCUSDT', '1h', rng.choice(('buy', 'sell')), _candle(low, low + 5, low, 0)))
+
+    started = time.perf_counter()
+    touched = 0
+    for step in range(1, 501):
+        price = 5000 + rng.uniform(-20, 20)
+        touched += len(tracker.on_candle('BTCUSDT', '1h', _candle(price - 1, price + 1, price, step * PERIOD), PERIOD))
+    elapsed = time.perf_counter() - started
+
+    # Бычьи зоны выше цены и медвежьи ниже ее пробиты на первой же свече, остальные ждут
+    assert 2000 < len(tracker) < 3000 and 0 < touched < 100
+    assert elapsed < 0.5
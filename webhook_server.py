@@ -0,0 +1,303 @@
+# webhook_server.py
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from config import (bot, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_WORKERS, METRICS_PORT, SNAPSHOT_PATH,
+                    CANDLE_STORE_PATH, SIGNAL_JOURNAL_PATH)
+
+logger = logging.getLogger(__name__)
+
+WORKER_HOST = '127.0.0.1'
+WORKER_PATH = '/update'
+SHUTDOWN_TIMEOUT = 30  # Сколько ждать штатной остановки воркера (снимок, SQLite, журнал), с
+
+# Поля апдейта, в которых есть отправитель
+UPDATE_USER_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+    'my_chat_member', 'chat_member', 'chat_join_request',
+)
+
+def extract_user_id(update: dict) -> int:
+    """Определяет пользователя апдейта для маршрутизации"""
+    for field in UPDATE_USER_FIELDS:
+        payload = update.get(field)
+        if not payload:
+            continue
+        sender = payload.get('from') or payload.get('user')
+        if sender:
+            return sender['id']
+        chat = payload.get('chat')
+        if chat:
+            return chat['id']
+    return update.get('update_id', 0)
+
+class UpdateRouter:
+    """Фронт-процесс: принимает вебхук и раздает апдейты воркерам по user id"""
+
+    def __init__(self, worker_urls: List[str], secret: Optional[str] = None):
+        self.worker_urls = worker_urls
+        self.secret = secret
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def on_startup(self, app: web.Application):
+        connector = aiohttp.TCPConnector(limit_per_host=100)
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def on_cleanup(self, app: web.Application):
+        await self.session.close()
+
+    def worker_for(self, user_id: int) -> str:
+        """Один пользователь всегда попадает на один воркер"""
+        return self.worker_urls[user_id % len(self.worker_urls)]
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret:
+            return web.Response(status=401)
+
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        url = self.worker_for(extract_user_id(update))
+        try:
+            async with self.session.post(
+                url, data=body, headers={'Content-Type': 'application/json'}
+            ) as response:
+                return web.Response(status=response.status)
+        except aiohttp.ClientError as e:
+            # Telegram повторит доставку, пока воркер перезапускается
+            logger.error(f"Воркер {url} недоступен: {e}")
+            return web.Response(status=503)
+
+async def wait_for_stop():
+    """Ждет SIGTERM/SIGINT, чтобы процесс завершился через finally, а не был убит на месте"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: остается KeyboardInterrupt
+    await stop.wait()
+
+def snapshot_path(index: int, workers: int) -> str:
+    """Снимок шарда user_id % workers == index: при другом числе воркеров это другой файл"""
+    return f"{SNAPSHOT_PATH}.{index}-of-{workers}"
+
+def orphaned_worker_files(workers: int) -> List[str]:
+    """Снимки другого числа воркеров и журналы воркеров с номером >= workers: их никто не загрузит"""
+    orphaned = []
+    if SNAPSHOT_PATH:
+        current = {snapshot_path(index, workers) for index in range(workers)}
+        orphaned += sorted(set(glob.glob(f"{glob.escape(SNAPSHOT_PATH)}.*-of-*")) - current)
+    if SIGNAL_JOURNAL_PATH:
+        index = workers
+        while os.path.exists(f"{SIGNAL_JOURNAL_PATH}.{index}"):
+            orphaned.append(f"{SIGNAL_JOURNAL_PATH}.{index}")
+            if os.path.exists(f"{SIGNAL_JOURNAL_PATH}.{index}.checkpoint"):
+                orphaned.append(f"{SIGNAL_JOURNAL_PATH}.{index}.checkpoint")
+            index += 1
+    return orphaned
+
+def _run_worker(index: int, port: int, workers: int):
+    """Точка входа процесса-воркера"""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_worker_main(index, port, workers))
+    except KeyboardInterrupt:
+        pass
+
+async def _worker_main(index: int, port: int, workers: int):
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+    from run_bot import create_dispatcher, cleanup_task, start_metrics
+    from services.loop_monitor import loop_monitor
+    from services.logging_setup import setup_logging
+    from services.snapshot_service import snapshot_service
+    from services.candle_store import candle_store
+    from services.signal_journal import signal_journal
+    from services.rate_limiter import rate_limiter
+
+    # Лимит Telegram общий на бота: каждому воркеру - своя доля
+    rate_limiter.share(workers)
+    # У воркера свои пользователи, значит и свой снимок
+    if SNAPSHOT_PATH:
+        snapshot_service.path = snapshot_path(index, workers)
+    # Файлы свечей дописывает только один процесс
+    if CANDLE_STORE_PATH:
+        candle_store.open(os.path.join(CANDLE_STORE_PATH, f"worker{index}"))
+    if SIGNAL_JOURNAL_PATH:
+        signal_journal.open(f"{SIGNAL_JOURNAL_PATH}.{index}", worker=index)
+
+    dp = create_dispatcher()
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=True).register(app, path=WORKER_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WORKER_HOST, port).start()
+    logger.info(f"Воркер {index} слушает {WORKER_HOST}:{port}")
+
+    setup_logging()
+    loop_monitor.start()
+    cleanup_task_instance = asyncio.create_task(cleanup_task())
+    # У каждого воркера свои метрики на соседнем порту
+    metrics_server = await start_metrics(METRICS_PORT + 1 + index if METRICS_PORT else 0)
+    try:
+        await wait_for_stop()
+        logger.info(f"Воркер {index} останавливается...")
+    finally:
+        cleanup_task_instance.cancel()
+        await metrics_server.stop()
+        await loop_monitor.stop()
+        # Здесь же dp.shutdown: снимок, сброс SQLite, закрытие журнала и хранилища свечей
+        await runner.cleanup()
+
+class WorkerPool:
+    """Процессы-воркеры с перезапуском упавших"""
+
+    def __init__(self, workers: int, base_port: int, target=None):
+        self.context = multiprocessing.get_context('spawn')
+        self.target = target or _run_worker
+        self.ports = [base_port + 1 + index for index in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+
+    @property
+    def urls(self) -> List[str]:
+        return [f"http://{WORKER_HOST}:{port}{WORKER_PATH}" for port in self.ports]
+
+    def _spawn(self, index: int):
+        process = self.context.Process(
+            target=self.target, args=(index, self.ports[index], len(self.ports)), daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(len(self.ports)):
+            self._spawn(index)
+
+    async def supervise(self, interval: float = 5.0):
+        """Перезапускает упавшие воркеры"""
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.warning(f"Воркер {index} завершился ({process.exitcode}), перезапуск")
+                    self._spawn(index)
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT):
+        """SIGTERM всем воркерам, ожидание штатной остановки, затем kill зависших"""
+        alive = [process for process in self.processes if process is not None and process.is_alive()]
+        for process in alive:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in alive:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+        for process in alive:
+            if process.is_alive():
+                logger.error(f"Воркер {process.pid} не остановился за {timeout:.0f} с, kill")
+                process.kill()
+                process.join()
+
+async def _serve(workers: int, host: str, port: int, set_webhook: bool):
+    for path in orphaned_worker_files(workers):
+        logger.warning(f"Файл воркера вне текущего числа воркеров не будет загружен: {path}")
+    pool = WorkerPool(workers, port)
+    pool.start()
+
+    router = UpdateRouter(pool.urls, WEBHOOK_SECRET)
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, router.handle)
+    app.on_startup.append(router.on_startup)
+    app.on_cleanup.append(router.on_cleanup)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Вебхук слушает {host}:{port}{WEBHOOK_PATH}, воркеров: {workers}")
+
+    if set_webhook:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=True,
+        )
+    await bot.session.close()
+
+    supervisor = asyncio.create_task(pool.supervise())
+    stopper = asyncio.create_task(wait_for_stop())
+    try:
+        await asyncio.wait({supervisor, stopper}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        supervisor.cancel()
+        stopper.cancel()
+        await runner.cleanup()
+        # Воркеры сохраняют состояние до нескольких секунд - ждем их вне event loop
+        await asyncio.get_running_loop().run_in_executor(None, pool.stop)
+
+def serve(workers: int = WEBHOOK_WORKERS, host: str = WEBHOOK_HOST,
+          port: int = WEBHOOK_PORT, set_webhook: bool = True):
+    """Запуск вебхука с несколькими процессами-воркерами"""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(workers, host, port, set_webhook))
+    except KeyboardInterrupt:
+        logger.info("Вебхук остановлен")
+
+async def replay_updates(path: str, url: str, secret: Optional[str] = WEBHOOK_SECRET):
+    """Отправка записанных апдейтов (по одному JSON на строку) в вебхук"""
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret
+
+    sent = 0
+    async with aiohttp.ClientSession() as session:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                async with session.post(url, data=line, headers=headers) as response:
+                    if response.status != 200:
+                        logger.warning(f"Апдейт отклонен: HTTP {response.status}")
+                sent += 1
+    logger.info(f"Отправлено апдейтов: {sent}")
+    return sent
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Вебхук-режим бота")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Запуск вебхука")
+    serve_parser.add_argument('--workers', type=int, default=WEBHOOK_WORKERS)
+    serve_parser.add_argument('--host', default=WEBHOOK_HOST)
+    serve_parser.add_argument('--port', type=int, default=WEBHOOK_PORT)
+    serve_parser.add_argument('--no-set-webhook', action='store_true',
+                              help="Не регистрировать вебхук в Telegram (локальный запуск)")
+
+    replay_parser = commands.add_parser('replay', help="Отправка записанных апдейтов")
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('--url', default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.workers, args.host, args.port, not args.no_set_webhook)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        asyncio.run(replay_updates(args.file, args.url))